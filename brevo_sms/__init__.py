@@ -0,0 +1,26 @@
+"""Headless core of the Brevo bulk SMS sender, used by the Streamlit app and the CLI."""
+from .bulk import run_bulk_campaign
+from .campaign import apply_event, build_result, check_delivery_status, count_unsent, deliver_contact, run_campaign
+from .client import BREVO_API_URL, BrevoClient, fetch_sms_events, send_sms
+from .contact_cache import ContactCache, ValidatedContacts, load_validated_contacts
+from .contacts import (COUNTRIES, NAME_KEYWORDS, PHONE_KEYWORDS, auto_detect_column, format_phone_number,
+                       iter_contact_chunks, iter_formatted_contacts, prepare_contact_chunks, read_contacts_preview,
+                       scan_contacts)
+from .engine import send_concurrently
+from .events import EventStore, StatusReconciler
+from .history import CampaignHistory
+from .journal import CampaignJournal, campaign_fingerprint, idempotency_key
+from .metrics import REGISTRY, serve_metrics, span, stage
+from .numbering import PrefixTrie, normalize_international_column
+from .progress import CampaignProgress
+from .ratelimit import AdaptiveRateController, TokenBucket, parse_retry_after
+from .results import RESULT_COLUMNS, ResultSpool, ResultWriter, SendResult, read_results, results_frame, write_results
+from .retry import RetryPolicy, backoff_delay
+from .schedule import SendWindow, WindowPacer, parse_weekdays, parse_window
+from .segments import TRANSLITERATION_TABLE, count_sms_segments, count_sms_segments_column, transliterate_gsm7
+from .shard import merge_results, parse_shard, shard_mask, shard_of
+from .status import (Status, event_status, get_delivery_status, http_status, is_retryable_http, map_event_status,
+                     map_http_status, status_label)
+from .suppression import SuppressionIndex
+from .templates import MessageTemplate, personalize_message
+from .webhooks import WebhookReceiver, parse_webhook_event, replay_webhooks, webhook_payload
@@ -0,0 +1,154 @@
+"""End-to-end throughput benchmark against the local mock Brevo server.
+
+    python -m brevo_sms.bench --sizes 1000 10000 100000 --paths send retry status --label v2 --output bench.jsonl
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import numpy as np
+import pandas as pd
+
+from .campaign import run_campaign
+from .cli import emit
+from .client import BrevoClient
+from .contacts import COUNTRIES, iter_contact_chunks, iter_formatted_contacts
+from .events import EventStore
+from .journal import CampaignJournal
+from .mockserver import MockBrevoServer, add_mock_arguments, mock_options
+from .retry import RetryPolicy
+from .templates import MessageTemplate
+
+try:
+    import resource  # Unix only
+except ImportError:
+    resource = None
+
+# What each benchmark path adds on top of the mock server options
+PATHS = {
+    "send": {},
+    "retry": {"error_rate": 0.05, "burst_every": 10.0, "burst_seconds": 1.0},
+    "status": {"soft_bounce_rate": 0.02},
+}
+
+# Backoff scaled down so retry runs measure the sender, not the waiting
+BENCH_RETRY_POLICY = {"max_attempts": 3, "base_delay": 0.1, "max_delay": 1.0}
+BENCH_POLL_INTERVAL = 1.0
+
+# Function to write a contact file for a benchmark size
+def write_contacts(path, size):
+    """CSV of `size` unique US numbers with names"""
+    pd.DataFrame({
+        "name": [f"User {i}" for i in range(size)],
+        "phone": [f"{2000000000 + i}" for i in range(size)],
+    }).to_csv(path, index=False)
+
+# Function to run one benchmark in a fresh process
+def run_path(base_url, contacts_path, path, rate, workers, work_dir, settle_seconds):
+    """
+    Send every contact of contacts_path through run_campaign() against the mock
+    server at base_url (runs in its own process, so peak memory is per run).
+    Returns: dict of measurements
+    """
+    latencies = []
+
+    def record_latency(endpoint, response):
+        if endpoint == "transactionalSMS/send":
+            latencies.append(response.elapsed.total_seconds())
+
+    client = BrevoClient("benchmark", base_url=base_url, pool_size=workers)
+    client.add_response_observer(record_latency)
+    event_store = EventStore(os.path.join(work_dir, "events.db")) if path == "status" else None
+    journal = CampaignJournal(os.path.join(work_dir, "campaigns.db"))
+    campaign_id = journal.start_campaign(f"bench-{path}-{time.time()}", name=path, sender="Bench")
+    country = COUNTRIES["US"]
+    template = MessageTemplate("Benchmark message for {name}")
+    counts = {"status": 0}
+    done = {}
+    started = time.perf_counter()
+    with open(contacts_path, "rb") as contact_file:
+        contacts = iter_formatted_contacts(iter_contact_chunks(contact_file, "phone"), "phone", country["code"],
+                                           country["length"], name_column="name", template=template)
+        for event in run_campaign(client, contacts, "Bench", rate, max_workers=workers, tag="bench",
+                                  event_store=event_store, poll_interval=BENCH_POLL_INTERVAL,
+                                  settle_seconds=settle_seconds, journal=journal, campaign_id=campaign_id,
+                                  retry_policy=RetryPolicy(**BENCH_RETRY_POLICY)):
+            if event["type"] == "settling" and "send_seconds" not in counts:
+                counts["send_seconds"] = time.perf_counter() - started
+            elif event["type"] == "status":
+                counts["status"] += 1
+            elif event["type"] == "done":
+                done = event
+    seconds = time.perf_counter() - started
+    send_seconds = counts.get("send_seconds", seconds)
+    client.close()
+
+    return {
+        "messages": done.get("sent", 0),
+        "dead_letters": done.get("dead_letters", 0),
+        "retries": done.get("retries", 0),
+        "status_updates": counts["status"],
+        "send_seconds": round(send_seconds, 3),
+        "total_seconds": round(seconds, 3),
+        "msg_per_s": round(done.get("sent", 0) / send_seconds, 1) if send_seconds else None,
+        "p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 2) if latencies else None,
+        "p99_ms": round(float(np.percentile(latencies, 99)) * 1000, 2) if latencies else None,
+        # ru_maxrss is in KiB on Linux
+        "peak_mem_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1) if resource else None,
+    }
+
+# Function to run the benchmark matrix
+def run_benchmarks(sizes, paths, rate, workers, label=None, mock=None):
+    """
+    Run every path at every size, each against a fresh mock server and in a fresh process.
+    Yields: one result dict per (size, path)
+    """
+    mock = mock or {}
+    # "spawn" so every run starts from an empty process and measures its own peak memory
+    context = get_context("spawn")
+    with tempfile.TemporaryDirectory(prefix="brevo-bench-") as work_dir:
+        for size in sizes:
+            contacts_path = os.path.join(work_dir, f"contacts-{size}.csv")
+            write_contacts(contacts_path, size)
+            for path in paths:
+                server = MockBrevoServer(**{**mock, **PATHS[path]}).start()
+                run_dir = tempfile.mkdtemp(dir=work_dir)
+                settle_seconds = mock.get("event_delay", 0) + 3 * BENCH_POLL_INTERVAL
+                try:
+                    with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                        result = executor.submit(run_path, server.url, contacts_path, path, rate, workers,
+                                                 run_dir, settle_seconds).result()
+                    stats = server.stats()
+                finally:
+                    server.stop()
+                yield {"label": label, "path": path, "contacts": size, **result,
+                       "throttled": stats.get("throttled", 0), "server_errors": stats.get("errors", 0)}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="brevo-sms-bench",
+                                     description="Benchmark the send, retry and status paths against a local mock Brevo API.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000], help="Contact counts (default: 1000 10000 100000)")
+    parser.add_argument("--paths", nargs="+", choices=sorted(PATHS), default=list(PATHS), help="Paths to run (default: all)")
+    parser.add_argument("--rate", type=float, default=2000.0, help="Send rate ceiling in SMS per second (default: 2000)")
+    parser.add_argument("--workers", type=int, default=32, help="Concurrent requests (default: 32)")
+    parser.add_argument("--label", help="Name of this run, e.g. a version, to compare results later")
+    parser.add_argument("--output", help="Append the results to this JSON lines file")
+    add_mock_arguments(parser)
+    args = parser.parse_args(argv)
+
+    results = []
+    for result in run_benchmarks(args.sizes, args.paths, args.rate, args.workers, label=args.label,
+                                 mock=mock_options(args)):
+        results.append(result)
+        emit({"type": "benchmark", **result})
+        if args.output:
+            with open(args.output, "a", encoding="utf-8") as output:
+                emit({"type": "benchmark", **result}, output)
+    print(pd.DataFrame(results).drop(columns="label").to_string(index=False), file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
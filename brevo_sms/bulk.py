@@ -0,0 +1,310 @@
+"""Broadcasts of one identical message as a Brevo SMS campaign, instead of one API call per number."""
+import time
+from datetime import datetime
+
+from .journal import SEND_UNCONFIRMED, idempotency_key
+from .metrics import SENDS, stage
+
+# Numbers per /contacts/import call: ~7 MB of fileBody, under Brevo's 10 MB limit
+IMPORT_BATCH_NUMBERS = 500_000
+# Contact folder the broadcast lists are created in
+BULK_FOLDER_NAME = "SMS broadcasts"
+PROCESS_POLL_INTERVAL = 2.0
+PROCESS_TIMEOUT = 30 * 60.0
+CAMPAIGN_POLL_INTERVAL = 10.0
+FOLDER_PAGE_SIZE = 50
+
+# Function to call the API without raising on network errors
+def _call(client, method, path, **kwargs):
+    """Returns: (response, None), or (None, error message) if Brevo could not be reached"""
+    try:
+        return client.request(method, path, **kwargs), None
+    except Exception as e:
+        return None, str(e)
+
+# Function to read the error message of a Brevo response
+def _error(response):
+    try:
+        return response.json().get("message", response.text)
+    except ValueError:
+        return response.text or f"HTTP {response.status_code}"
+
+# Function to find (or create) the contact folder for broadcast lists
+def get_bulk_folder(client, name=BULK_FOLDER_NAME):
+    """Returns: (folder_id, error, status_code); folder_id is None on failure"""
+    offset = 0
+    while True:
+        response, network_error = _call(client, "GET", "contacts/folders",
+                                        params={"limit": FOLDER_PAGE_SIZE, "offset": offset})
+        if response is None:
+            return None, network_error, 0
+        if response.status_code != 200:
+            return None, _error(response), response.status_code
+        folders = response.json().get("folders") or []
+        for folder in folders:
+            if folder.get("name") == name:
+                return folder["id"], None, 200
+        if len(folders) < FOLDER_PAGE_SIZE:
+            break
+        offset += FOLDER_PAGE_SIZE
+    response, network_error = _call(client, "POST", "contacts/folders", json={"name": name})
+    if response is None:
+        return None, network_error, 0
+    if response.status_code != 201:
+        return None, _error(response), response.status_code
+    return response.json()["id"], None, 201
+
+# Function to create an empty contact list
+def create_contact_list(client, name, folder_id):
+    """Returns: (list_id, error, status_code); list_id is None on failure"""
+    response, network_error = _call(client, "POST", "contacts/lists", json={"name": name, "folderId": folder_id})
+    if response is None:
+        return None, network_error, 0
+    if response.status_code != 201:
+        return None, _error(response), response.status_code
+    return response.json()["id"], None, 201
+
+# Function to import phone numbers into a contact list
+def import_numbers(client, list_id, numbers):
+    """
+    Start an import of `numbers` (digits with the country code) as contacts
+    identified by their SMS attribute.
+    Returns: (process_id, error, status_code); process_id is None on failure
+    """
+    payload = {
+        "fileBody": "SMS\n" + "\n".join(numbers),
+        "listIds": [list_id],
+        "updateExistingContacts": True,
+        "emptyContactsAttributes": False
+    }
+    response, network_error = _call(client, "POST", "contacts/import", json=payload)
+    if response is None:
+        return None, network_error, 0
+    if response.status_code not in (200, 202):
+        return None, _error(response), response.status_code
+    return response.json()["processId"], None, response.status_code
+
+# Function to wait for background processes such as imports
+def wait_for_processes(client, process_ids, interval=PROCESS_POLL_INTERVAL, timeout=PROCESS_TIMEOUT):
+    """
+    Poll GET /processes/{id} until every process is completed.
+    Returns: (error, status_code); error is None once all are completed
+    """
+    pending = list(process_ids)
+    deadline = time.monotonic() + timeout
+    while pending:
+        response, network_error = _call(client, "GET", f"processes/{pending[0]}")
+        if response is None:
+            return network_error, 0
+        if response.status_code != 200:
+            return _error(response), response.status_code
+        status = response.json().get("status")
+        if status == "completed":
+            pending.pop(0)
+            continue
+        if status not in ("queued", "in_process"):
+            return f"Import process {pending[0]} ended as {status}", 200
+        if time.monotonic() >= deadline:
+            return f"Import process {pending[0]} still {status} after {timeout:.0f} seconds", 200
+        time.sleep(interval)
+    return None, 200
+
+# Function to create an SMS campaign for contact lists
+def create_sms_campaign(client, name, sender, content, list_ids, unicode_enabled=True, org_prefix=None):
+    """Returns: (campaign_id, error, status_code); campaign_id is None on failure"""
+    payload = {
+        "name": name,
+        "sender": sender,
+        "content": content,
+        "recipients": {"listIds": list(list_ids)},
+        "unicodeEnabled": unicode_enabled
+    }
+    if org_prefix:
+        payload["organisationPrefix"] = org_prefix
+    response, network_error = _call(client, "POST", "smsCampaigns", json=payload)
+    if response is None:
+        return None, network_error, 0
+    if response.status_code != 201:
+        return None, _error(response), response.status_code
+    return response.json()["id"], None, 201
+
+# Function to start sending an SMS campaign
+def send_campaign_now(client, campaign_id):
+    """
+    Returns: (error, status_code); error is None once Brevo has queued the campaign.
+    status_code 0 (no answer) means Brevo may or may not have queued it.
+    """
+    response, network_error = _call(client, "POST", f"smsCampaigns/{campaign_id}/sendNow")
+    if response is None:
+        return network_error, 0
+    if response.status_code != 204:
+        return _error(response), response.status_code
+    return None, 204
+
+# Function to read the progress of an SMS campaign
+def get_campaign_report(client, campaign_id):
+    """
+    Returns: dict with status (draft, queued, inProcess, sent...) and the campaign
+    statistics (sent, delivered, processing, softBounced, hardBounced, unsubscribed,
+    answered), or None if Brevo could not be reached
+    """
+    response, _ = _call(client, "GET", f"smsCampaigns/{campaign_id}")
+    if response is None or response.status_code != 200:
+        return None
+    data = response.json()
+    return {"status": data.get("status"), **(data.get("statistics") or {})}
+
+# Function to send one identical message to every contact as a Brevo SMS campaign
+def run_bulk_campaign(client, contacts, sender, org_prefix=None, name=None, folder_id=None,
+                      journal=None, campaign_id=None, poll_interval=CAMPAIGN_POLL_INTERVAL, settle_seconds=60.0,
+                      process_timeout=PROCESS_TIMEOUT):
+    """
+    Broadcast path for contacts that all get the same message (e.g. a TXT file
+    or a template without fields): the numbers are imported into a new contact
+    list IMPORT_BATCH_NUMBERS at a time, then one SMS campaign is created for
+    the list and sent. 100k recipients cost about five API calls plus polling,
+    instead of 100k sends.
+    With a journal and campaign_id, the sendNow call is checkpointed like a
+    single send: a broadcast that Brevo accepted, or may have accepted before a
+    crash, is never started again by a resumed run.
+    Yields progress events:
+        {"type": "list", "list_id": n}                       once the contact list exists
+        {"type": "import", "process_id": n, "numbers": n}    per import batch started
+        {"type": "imported", "numbers": n}                   once Brevo has processed every batch
+        {"type": "sms_campaign", "sms_campaign_id": n}       once the SMS campaign is created
+        {"type": "sending", "sms_campaign_id": n}            once Brevo has queued it
+        {"type": "already_sent", "state": s}                 if an earlier run already started the broadcast
+        {"type": "report", "status": s, "sent": n, ...}      campaign statistics, until sent or settle_seconds pass
+        {"type": "error", "step": s, "error": e, "status_code": n}  when a step fails (nothing more is sent)
+        {"type": "done", "recipients": n, "api_calls": n, "sms_campaign_id": n}  at the end
+    """
+    calls = {"count": 0}
+
+    def counted(path, response):
+        calls["count"] += 1
+
+    client.add_response_observer(counted)
+    try:
+        name = name or f"Broadcast {datetime.now():%Y-%m-%d %H:%M:%S}"
+        send_key = idempotency_key(campaign_id, "bulk", sender) if journal is not None else None
+        if journal is not None and send_key in journal.resume(campaign_id):
+            state, data = journal.get(send_key)
+            yield {"type": "already_sent", "state": "unconfirmed" if state == SEND_UNCONFIRMED else "sent",
+                   "sms_campaign_id": (data or {}).get("sms_campaign_id")}
+            journal.finish_campaign(campaign_id)
+            yield {"type": "done", "recipients": 0, "api_calls": calls["count"],
+                   "sms_campaign_id": (data or {}).get("sms_campaign_id")}
+            return
+
+        # Import the numbers a batch at a time, checking every message is the same
+        content = None
+        unicode_enabled = False
+        list_id = None
+        process_ids = []
+        recipients = 0
+        batch = []
+
+        def start_import(numbers):
+            process_id, error, status_code = import_numbers(client, list_id, numbers)
+            if process_id is None:
+                return {"type": "error", "step": "import", "error": error, "status_code": status_code}
+            process_ids.append(process_id)
+            return {"type": "import", "process_id": process_id, "numbers": len(numbers)}
+
+        for contact in contacts:
+            if content is None:
+                content = contact['message']
+            elif contact['message'] != content:
+                yield {"type": "error", "step": "content", "status_code": None,
+                       "error": f"The message to {contact['formatted']} differs from the others; "
+                                f"send personalized messages one by one instead"}
+                return
+            unicode_enabled = unicode_enabled or bool(contact['unicode'])
+            batch.append(contact['formatted'])
+            if len(batch) < IMPORT_BATCH_NUMBERS:
+                continue
+            if list_id is None:
+                list_id, error, status_code = yield from _create_list(client, name, folder_id)
+                if list_id is None:
+                    return
+            event = start_import(batch)
+            yield event
+            if event["type"] == "error":
+                return
+            recipients += len(batch)
+            batch = []
+
+        if batch:
+            if list_id is None:
+                list_id, error, status_code = yield from _create_list(client, name, folder_id)
+                if list_id is None:
+                    return
+            event = start_import(batch)
+            yield event
+            if event["type"] == "error":
+                return
+            recipients += len(batch)
+        if not recipients:
+            yield {"type": "done", "recipients": 0, "api_calls": calls["count"], "sms_campaign_id": None}
+            return
+
+        with stage("bulk_import", numbers=recipients):
+            error, status_code = wait_for_processes(client, process_ids, timeout=process_timeout)
+        if error:
+            yield {"type": "error", "step": "import", "error": error, "status_code": status_code}
+            return
+        yield {"type": "imported", "numbers": recipients}
+
+        sms_campaign_id, error, status_code = create_sms_campaign(client, name, sender, content, [list_id],
+                                                                  unicode_enabled=unicode_enabled,
+                                                                  org_prefix=org_prefix)
+        if sms_campaign_id is None:
+            yield {"type": "error", "step": "campaign", "error": error, "status_code": status_code}
+            return
+        yield {"type": "sms_campaign", "sms_campaign_id": sms_campaign_id}
+
+        if journal is not None:
+            journal.begin(campaign_id, send_key, f"list:{list_id}",
+                          {"sms_campaign_id": sms_campaign_id, "list_id": list_id, "recipients": recipients})
+        error, status_code = send_campaign_now(client, sms_campaign_id)
+        # Without an answer the checkpoint stays pending: a resumed run treats it as unconfirmed, never re-sends
+        if journal is not None and status_code:
+            journal.finish(send_key, error is None, {"sms_campaign_id": sms_campaign_id, "list_id": list_id,
+                                                     "recipients": recipients, "status_code": status_code})
+            journal.finish_campaign(campaign_id)
+        if error:
+            yield {"type": "error", "step": "send", "error": error, "status_code": status_code}
+            return
+        SENDS.inc(recipients, outcome="sent")
+        yield {"type": "sending", "sms_campaign_id": sms_campaign_id}
+
+        # Report delivery progress until Brevo has sent everything or the settle time runs out
+        settle_deadline = time.monotonic() + settle_seconds
+        while True:
+            report = get_campaign_report(client, sms_campaign_id)
+            if report is not None:
+                yield {"type": "report", **report}
+                if report["status"] == "sent" and not report.get("processing"):
+                    break
+            if time.monotonic() >= settle_deadline:
+                break
+            time.sleep(min(poll_interval, max(0.0, settle_deadline - time.monotonic())))
+
+        yield {"type": "done", "recipients": recipients, "api_calls": calls["count"],
+               "sms_campaign_id": sms_campaign_id}
+    finally:
+        client.remove_response_observer(counted)
+
+def _create_list(client, name, folder_id):
+    # Yields an error event on failure. Returns: (list_id, error, status_code)
+    if folder_id is None:
+        folder_id, error, status_code = get_bulk_folder(client)
+        if folder_id is None:
+            yield {"type": "error", "step": "folder", "error": error, "status_code": status_code}
+            return None, error, status_code
+    list_id, error, status_code = create_contact_list(client, name, folder_id)
+    if list_id is None:
+        yield {"type": "error", "step": "list", "error": error, "status_code": status_code}
+    else:
+        yield {"type": "list", "list_id": list_id}
+    return list_id, error, status_code
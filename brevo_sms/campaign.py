@@ -0,0 +1,351 @@
+"""Campaign runner shared by the Streamlit app and the command line."""
+import time
+
+from .client import send_sms
+from .engine import send_concurrently
+from .events import StatusReconciler, STATUS_POLL_INTERVAL, STATUS_SETTLE_SECONDS
+from .journal import SEND_UNCONFIRMED, idempotency_key
+from .metrics import SEND_RATE, SENDS, stage
+from .ratelimit import AdaptiveRateController, TokenBucket
+from .results import SendResult
+from .retry import RetryPolicy
+from .schedule import WindowPacer
+from .status import Status, event_status, get_delivery_status, http_status, is_retryable_http
+
+# Function to build a result row
+def build_result(name, original_number, formatted_number, content, success, message_id, error, status_code):
+    """
+    Build the result for one send attempt.
+    Returns: SendResult
+    """
+    if success:
+        # Delivery status is filled in later by the reconciler
+        return SendResult(name, original_number, formatted_number, content, Status.ACCEPTED,
+                          message_id=message_id, status_code=status_code)
+    return SendResult(name, original_number, formatted_number, content, http_status(status_code),
+                      status_code=status_code, error=error or "", can_retry=is_retryable_http(status_code))
+
+# Function to apply a delivery event to a result row
+def apply_event(result, event):
+    """Update a SendResult in place from a delivery event"""
+    result.status, result.can_retry, result.error = event_status(event.get("event", ""), event.get("reason", ""))
+
+# Function to build the row of a send interrupted before Brevo answered
+def unconfirmed_result(contact):
+    """
+    Result for a journaled send that was in flight during a crash. Brevo may
+    have accepted it, so it is reported but never sent again automatically.
+    """
+    return SendResult(contact['name'], contact['original'], contact['formatted'], contact['message'],
+                      Status.UNCONFIRMED, error="Interrupted before Brevo answered; not re-sent")
+
+# Function to send one prepared contact
+def deliver_contact(client, contact, sender, tag=None, org_prefix=None, sms_type="marketing"):
+    """
+    Send one contact from iter_formatted_contacts() (runs on a worker thread).
+    Returns: SendResult
+    """
+    success, message_id, error, status_code = send_sms(
+        client=client,
+        sender=sender,
+        recipient=contact['formatted'],
+        content=contact['message'],
+        sms_type=sms_type,
+        tag=tag,
+        unicode_enabled=bool(contact['unicode']),
+        org_prefix=org_prefix
+    )
+    result = build_result(contact['name'], contact['original'], contact['formatted'], contact['message'],
+                          success, message_id, error, status_code)
+    result.attempts = contact.get('attempt', 1)
+    return result
+
+# Function to run a whole campaign
+def run_campaign(client, contacts, sender, rate, max_workers=8, tag=None, org_prefix=None, sms_type="marketing",
+                 event_store=None, poll_interval=STATUS_POLL_INTERVAL, settle_seconds=STATUS_SETTLE_SECONDS,
+                 journal=None, campaign_id=None, adaptive=True, retry_policy=None, lane_rates=None,
+                 webhook_receiver=None, send_window=None, expected=None, deadline=None):
+    """
+    Send every contact concurrently, paced to `rate` messages per second.
+    With lane_rates ({country: SMS per second or None}), contacts carrying a
+    'country' (see the numbering option of prepare_contact_chunks()) go through
+    one send lane per country found in the contacts, each with its own pace (if
+    lane_rates gives one) and share of the workers, all within the overall `rate`.
+    With send_window (a SendWindow, or {country: SendWindow} with lane_rates),
+    sends only go out while the window is open in the recipients' time zones,
+    at the rate that fits the `expected` contacts (a count, or {country: count})
+    in before `deadline` (an aware datetime; default: the end of the current or
+    next opening); see WindowPacer.
+    With `adaptive`, `rate` is a ceiling: the pace backs off when Brevo throttles
+    (429, Retry-After, rate-limit headers) and ramps back up on clean responses.
+    When an event store is given, delivery statuses are reconciled in the background
+    and rows (SendResult objects) are updated in place; with a running
+    webhook_receiver (WebhookReceiver on the same store), statuses come from the
+    events Brevo pushes instead of polling the events API.
+    When a journal and campaign_id are given, every send is checkpointed and
+    contacts already sent by an earlier run of the campaign are skipped.
+    Failed sends that may succeed later (429, 5xx, network errors) are re-queued
+    with backoff alongside new sends; rows that become retryable through a delivery
+    event (soft bounce, rejected) are re-sent after the first pass and updated in
+    place. Rows still retryable after retry_policy.max_attempts are dead letters.
+    Yields progress events:
+        {"type": "sent", "index": n, "row": row}       after each contact's final send attempt
+        {"type": "skipped", "index": n, "row": row}    for contacts done by an earlier run
+        {"type": "retry", "row": row, "delay": s}      when a failed attempt is re-queued or a row is re-sent after a delivery event
+        {"type": "status", "row": row, "previous": s}  when a delivery event or a re-send updates a row (s: old Status)
+        {"type": "dead_letter", "row": row}            when a row runs out of attempts
+        {"type": "rate", "rate": r, "throttled": n}    when the adaptive send rate changes (n: 429s so far)
+        {"type": "window", "lane": c, "open": b, "rate": r, "opens_at": t, "closes_at": t, ...}
+                                                       when a send window opens, closes or is re-paced (c: country or None)
+        {"type": "settling"}                           once all sends are done, while waiting for reports
+        {"type": "done", "sent": n, "skipped": n, "retries": n, "dead_letters": n}  at the end
+    """
+    if retry_policy is None:
+        retry_policy = RetryPolicy()
+    rate_limiter = TokenBucket(rate=rate)
+    lanes = {}
+    if lane_rates is not None:
+        lanes = {
+            "lane_of": lambda contact: contact.get('country'),
+            "lane_limiters": {country: TokenBucket(rate=lane_rate)
+                              for country, lane_rate in lane_rates.items() if lane_rate}
+        }
+    controller = None
+    if adaptive:
+        controller = AdaptiveRateController(rate_limiter, max_rate=rate)
+        client.add_response_observer(controller.on_response)
+    pacers = {}  # Lane (None without lanes) -> WindowPacer
+    if isinstance(send_window, dict):
+        lane_limiters = lanes["lane_limiters"]
+        for country, window in send_window.items():
+            if isinstance(expected, dict) and not expected.get(country):
+                continue  # No contacts in this country, so no lane to pace
+            if lane_limiters.get(country) is None:
+                lane_limiters[country] = TokenBucket(rate=rate)
+            pacers[country] = WindowPacer(lane_limiters[country], window, (expected or {}).get(country),
+                                          lane_rates.get(country) or rate, deadline=deadline)
+    elif send_window is not None:
+        pacers[None] = WindowPacer(rate_limiter, send_window, expected, rate, deadline=deadline, controller=controller)
+    reported_rate = {"rate": rate_limiter.rate, "throttled": 0}
+    SEND_RATE.set(rate_limiter.rate)
+    completed_keys = journal.resume(campaign_id) if journal is not None else set()
+    reconciler = None
+    if event_store is not None:
+        reconciler = StatusReconciler(client, event_store, interval=poll_interval,
+                                      receiver=webhook_receiver).start()
+    rows_by_message_id = {}
+    contacts_by_message_id = {}
+    retry_events = []  # Filled by schedule_retry() inside the engine, yielded after each result
+    resend_queue = []  # (contact, row) made retryable by a delivery event
+    counts = {"retries": 0, "dead_letters": 0}
+
+    def track(contact, row):
+        if reconciler is not None and row.message_id is not None:
+            rows_by_message_id[str(row.message_id)] = row
+            contacts_by_message_id[str(row.message_id)] = contact
+            reconciler.track(row.message_id)
+
+    def status_updates():
+        if reconciler is None:
+            return
+        for message_id, event in reconciler.drain():
+            row = rows_by_message_id.get(message_id)
+            if row is not None:
+                previous = row.status
+                apply_event(row, event)
+                yield {"type": "status", "row": row, "previous": previous}
+                if row.can_retry:
+                    contact = contacts_by_message_id[message_id]
+                    if contact.get('attempt', 1) < retry_policy.max_attempts:
+                        # Later events of the old message no longer describe this row
+                        del rows_by_message_id[message_id]
+                        resend_queue.append((contact, row))
+                    else:
+                        yield dead_letter(row)
+
+    def dead_letter(row):
+        counts["dead_letters"] += 1
+        SENDS.inc(outcome="dead_letter")
+        return {"type": "dead_letter", "row": row}
+
+    def rate_changes():
+        if controller is None:
+            return
+        current = round(controller.rate, 1)
+        if current != round(reported_rate["rate"], 1) or controller.throttled != reported_rate["throttled"]:
+            reported_rate.update(rate=controller.rate, throttled=controller.throttled)
+            SEND_RATE.set(controller.rate)
+            yield {"type": "rate", "rate": current, "throttled": controller.throttled}
+
+    def window_changes():
+        for lane, pacer in pacers.items():
+            for state in pacer.changes():
+                yield {"type": "window", "lane": lane, **state, "rate": round(state["rate"], 2)}
+
+    def keyed(contacts):
+        for contact in contacts:
+            contact['key'] = idempotency_key(campaign_id, contact['formatted'], contact['message'])
+            yield contact
+
+    def deliver(contact):
+        if journal is not None:
+            journal.begin(campaign_id, contact['key'], contact['formatted'], contact)
+        row = deliver_contact(client, contact, sender, tag=tag, org_prefix=org_prefix, sms_type=sms_type)
+        SENDS.inc(outcome="sent" if row.status_code == 201 else "failed")
+        if journal is not None:
+            journal.finish(contact['key'], row.status_code == 201, row.row())
+        return row
+
+    def already_done(contact):
+        if contact['key'] not in completed_keys:
+            return None
+        state, data = journal.get(contact['key'])
+        return unconfirmed_result(data) if state == SEND_UNCONFIRMED else SendResult.from_row(data)
+
+    def schedule_retry(contact, row):
+        attempt = contact.get('attempt', 1)
+        if not row.can_retry:
+            return None
+        delay = retry_policy.next_delay(attempt)
+        if delay is not None:
+            contact['attempt'] = attempt + 1
+            counts["retries"] += 1
+            SENDS.inc(outcome="retry")
+            retry_events.append({"type": "retry", "row": row, "delay": delay})
+        return delay
+
+    def after_result():
+        while retry_events:
+            yield retry_events.pop(0)
+        yield from status_updates()
+        yield from rate_changes()
+        yield from window_changes()
+
+    if journal is not None:
+        contacts = keyed(contacts)
+        skip = already_done
+    else:
+        skip = None
+
+    processed = 0
+    skipped = 0
+    for pacer in pacers.values():
+        pacer.start()
+    try:
+        yield from window_changes()
+        for contact, row in send_concurrently(contacts, deliver, rate_limiter, max_workers=max_workers,
+                                              skip=skip, retry=schedule_retry, **lanes):
+            processed += 1
+            track(contact, row)
+            pacer = pacers.get(contact.get('country') if isinstance(send_window, dict) else None)
+            if pacer is not None:
+                pacer.record()
+            if contact.get('key') in completed_keys:
+                skipped += 1
+                SENDS.inc(outcome="skipped")
+                yield {"type": "skipped", "index": processed, "row": row}
+            else:
+                yield {"type": "sent", "index": processed, "row": row}
+                if row.can_retry:
+                    yield dead_letter(row)
+            yield from after_result()
+
+        # Every contact has an outcome now; the same inputs will start a fresh campaign
+        if journal is not None:
+            journal.finish_campaign(campaign_id)
+
+        # Give delivery reports a short window to arrive, re-sending rows that
+        # bounced softly or were rejected, until nothing is left to retry
+        while True:
+            if reconciler is not None:
+                yield {"type": "settling"}
+                settle_deadline = time.monotonic() + settle_seconds
+                while reconciler.pending_count() > 0 and time.monotonic() < settle_deadline:
+                    time.sleep(1)
+                    yield from status_updates()
+                yield from status_updates()
+            if not resend_queue:
+                break
+
+            resends = {id(contact): row for contact, row in resend_queue}
+            for contact, row in resend_queue:
+                contact['attempt'] = contact.get('attempt', 1) + 1
+                counts["retries"] += 1
+                SENDS.inc(outcome="retry")
+                yield {"type": "retry", "row": row, "delay": 0}
+            jobs = [contact for contact, _ in resend_queue]
+            resend_queue.clear()
+            for contact, new_row in send_concurrently(jobs, deliver, rate_limiter, max_workers=max_workers,
+                                                      retry=schedule_retry, **lanes):
+                row = resends[id(contact)]
+                previous = row.status
+                row.replace_with(new_row)
+                track(contact, row)
+                yield {"type": "status", "row": row, "previous": previous}
+                if row.can_retry:
+                    yield dead_letter(row)
+                yield from after_result()
+    finally:
+        if controller is not None:
+            client.remove_response_observer(controller.on_response)
+        if reconciler is not None:
+            reconciler.stop()
+        for pacer in pacers.values():
+            pacer.stop()
+
+    yield {"type": "done", "sent": processed - skipped, "skipped": skipped,
+           "retries": counts["retries"], "dead_letters": counts["dead_letters"]}
+
+# Function to count what a resumed campaign still has to send
+def count_unsent(contacts, campaign_id, completed_keys):
+    """
+    Count the contacts whose send is not in completed_keys (see CampaignJournal.resume()),
+    e.g. so a resumed campaign's window pace only covers the messages still to send.
+    Returns: (messages, {country: messages}) (the dict is empty for contacts without a country)
+    """
+    messages = 0
+    countries = {}
+    for contact in contacts:
+        if idempotency_key(campaign_id, contact['formatted'], contact['message']) in completed_keys:
+            continue
+        messages += 1
+        if contact.get('country') is not None:
+            countries[contact['country']] = countries.get(contact['country'], 0) + 1
+    return messages, countries
+
+# Function to look up delivery status for sent rows
+def check_delivery_status(client, event_store, rows, sync=True):
+    """
+    Sync the event store once (skipped with sync=False, e.g. when a webhook
+    receiver keeps it current), then look up the latest event of every sent
+    result (SendResult objects) locally.
+    Returns: (status_rows: list of dicts, synced: bool)
+    """
+    sent_rows = [r for r in rows if r.message_id is not None]
+    if not sent_rows:
+        return [], True
+    with stage("status_check", messages=len(sent_rows)):
+        synced = not sync or event_store.sync(client) is not None
+        latest_events = event_store.latest_events(r.message_id for r in sent_rows)
+
+    status_rows = []
+    for row in sent_rows:
+        latest_event = latest_events.get(str(row.message_id))
+        if latest_event:
+            delivery_status = get_delivery_status(latest_event.get("event", "unknown"))
+            event_date = latest_event.get("date", "N/A")
+            reason = latest_event.get("reason", "")
+        else:
+            delivery_status = "⏳ Pending"
+            event_date = "N/A"
+            reason = ""
+
+        status_rows.append({
+            "Name": row.name,
+            "Phone": row.formatted,
+            "Message ID": row.message_id,
+            "Delivery Status": delivery_status,
+            "Event Date": event_date,
+            "Reason": reason
+        })
+    return status_rows, synced
@@ -0,0 +1,475 @@
+"""Command-line runner: python -m brevo_sms send contacts.csv --template ... --rate 20"""
+import argparse
+import contextlib
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import pandas as pd
+
+from .bulk import run_bulk_campaign
+from .campaign import check_delivery_status, count_unsent, run_campaign
+from .client import BREVO_API_URL, BrevoClient
+from .contacts import (COUNTRIES, NAME_KEYWORDS, PHONE_KEYWORDS, auto_detect_column, contact_columns,
+                       contact_file_format, iter_contact_chunks, iter_formatted_contacts, read_contacts_preview,
+                       scan_contacts)
+from .events import EventStore, STATUS_SETTLE_SECONDS
+from .history import HISTORY_PAGE_SIZE, CampaignHistory
+from .journal import CampaignJournal, campaign_fingerprint
+from .metrics import METRICS_HOST, serve_metrics
+from .numbering import PrefixTrie
+from .results import ResultSpool, SendResult, write_results
+from .retry import MAX_ATTEMPTS, RetryPolicy
+from .schedule import SendWindow, parse_weekdays, parse_window
+from .shard import merge_results, parse_shard
+from .status import Status
+from .suppression import SuppressionIndex
+from .storage import data_path
+from .templates import MessageTemplate
+from .webhooks import WEBHOOK_HOST, WEBHOOK_PATH, WebhookReceiver
+
+# Function to print one JSON line
+def emit(record, stream=None):
+    """Write a progress record as one JSON line on `stream` (default: stdout)"""
+    stream = stream or sys.stdout
+    stream.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+    stream.flush()
+
+# Function to flatten a campaign event for output
+def event_record(event):
+    """JSON-ready record of a run_campaign() event: its fields plus the result row, if any"""
+    record = {key: value for key, value in event.items() if key != "row"}
+    if "previous" in record:
+        record["previous"] = record["previous"].label
+    if "row" in event:
+        record.update(event["row"].row())
+    return record
+
+# Function to resolve the columns and message options for a contact file
+def contact_options(args, contact_file):
+    """
+    Work out the phone column, the columns to read and the prepare_contact_chunks() options from the CLI arguments.
+    Returns: (phone_column: str, columns: list or None for all, options: dict)
+    """
+    template_text = args.template
+    if args.template_file:
+        with open(args.template_file, encoding="utf-8") as template_file:
+            template_text = template_file.read().strip()
+    if not template_text:
+        raise SystemExit("error: a message is required (--template or --template-file)")
+
+    if contact_file_format(contact_file.name)[0] == 'txt':
+        phone_column = 'phone'
+        name_column = None
+        template = None
+        read_columns = None
+    else:
+        columns = read_contacts_preview(contact_file).columns
+        phone_column = args.phone_column or auto_detect_column(columns, PHONE_KEYWORDS)
+        if phone_column is None or phone_column not in columns:
+            raise SystemExit(f"error: phone column not found, pick one of: {', '.join(map(str, columns))}")
+        if args.name_column == "none":
+            name_column = None
+        else:
+            name_column = args.name_column or auto_detect_column(columns, NAME_KEYWORDS)
+        template = MessageTemplate(template_text)
+        missing_fields = template.missing_fields(list(columns) + (['name', 'username'] if name_column else []))
+        if missing_fields:
+            print(f"warning: unknown variables will be sent as typed: {', '.join(missing_fields)}", file=sys.stderr)
+        read_columns = contact_columns(columns, phone_column, name_column, template)
+
+    options = {
+        'name_column': name_column,
+        'template': template,
+        'default_message': template_text,
+        'stop_text': args.opt_out,
+        'org_prefix': args.org_prefix,
+        'transliterate': args.transliterate,
+        'remove_duplicates': not args.keep_duplicates
+    }
+    if args.mixed:
+        options['numbering'] = PrefixTrie(COUNTRIES)
+        options['stop_texts'] = dict(args.lane_opt_out or [])
+    return phone_column, read_columns, options
+
+# Function to read a COUNTRY=VALUE argument
+def lane_value(text):
+    """argparse type for per-country lane settings. Returns: (country, value)"""
+    country, separator, value = text.partition("=")
+    country = country.strip().upper()
+    if not separator or country not in COUNTRIES:
+        raise argparse.ArgumentTypeError(f"expected COUNTRY=VALUE with COUNTRY one of {', '.join(sorted(COUNTRIES))}")
+    return country, value.strip()
+
+# Function to work out the send lanes from the arguments
+def lane_rates(args):
+    """{country: SMS per second} of the --lane-rate lanes for --mixed (every country found gets a lane), else None"""
+    if not args.mixed:
+        return None
+    try:
+        rates = {country: float(rate) for country, rate in (args.lane_rate or [])}
+    except ValueError:
+        raise SystemExit("error: --lane-rate expects COUNTRY=RATE with a number of SMS per second")
+    return rates
+
+# Function to work out the sending window from the arguments
+def send_windows(args):
+    """
+    SendWindow for --window in the recipients' time zones (--window-tz, else the
+    country's), {country: SendWindow} with --mixed, or None without --window
+    """
+    if not args.window:
+        return None
+    try:
+        start, end = parse_window(args.window)
+        weekdays = parse_weekdays(args.window_days) if args.window_days else range(7)
+        if args.mixed:
+            return {key: SendWindow(start, end, country["timezones"], weekdays) for key, country in COUNTRIES.items()}
+        return SendWindow(start, end, args.window_tz or COUNTRIES[args.country]["timezones"], weekdays)
+    except (ValueError, KeyError) as e:
+        raise SystemExit(f"error: {e}")
+
+# Function to read a --deadline argument
+def deadline_value(text):
+    """argparse type: ISO date and time, in this machine's time zone unless it has an offset"""
+    try:
+        return datetime.fromisoformat(text).astimezone()
+    except ValueError:
+        raise argparse.ArgumentTypeError("expected a date and time like 2026-10-18 21:00")
+
+# Function to list the API keys from the arguments
+def api_keys(args):
+    """
+    Keys from --api-key (repeatable), else the comma-separated BREVO_API_KEYS,
+    else BREVO_API_KEY. Several keys (e.g. one per sub-account) are shared out
+    between shards.
+    """
+    if args.api_key:
+        return args.api_key
+    keys = [key.strip() for key in os.environ.get("BREVO_API_KEYS", "").split(",") if key.strip()]
+    if not keys and os.environ.get("BREVO_API_KEY"):
+        keys = [os.environ["BREVO_API_KEY"]]
+    if not keys:
+        raise SystemExit("error: set BREVO_API_KEY or pass --api-key")
+    return keys
+
+# Function to load the suppression list
+def load_suppressions(args, *event_stores):
+    """SuppressionIndex from the local event store(s), or None with --no-suppression"""
+    if args.no_suppression:
+        return None
+    return SuppressionIndex.from_event_stores(EventStore(), *event_stores)
+
+# Function to get an API client from the arguments
+def make_client(args):
+    return BrevoClient(api_keys(args)[0], base_url=args.base_url, pool_size=args.workers, timeout=args.timeout)
+
+def cmd_scan(args):
+    country = COUNTRIES[args.country]
+    with open(args.contacts, 'rb') as contact_file:
+        phone_column, columns, options = contact_options(args, contact_file)
+        options['suppressed'] = load_suppressions(args)
+        stats = scan_contacts(iter_contact_chunks(contact_file, phone_column, columns=columns), phone_column,
+                              country["code"], country["length"], **options)
+    emit({"type": "scan", **stats})
+
+def cmd_send(args):
+    """Send one campaign, or one shard of it with --shard. Returns: the final "done" event"""
+    if args.bulk and (args.processes > 1 or args.window):
+        raise SystemExit("error: --bulk sends one Brevo SMS campaign at once; it can't be combined with --processes or --window")
+    if args.processes > 1:
+        return send_sharded(args)
+    if args.metrics_port:
+        serve_metrics(args.metrics_port, args.metrics_host)
+    country = COUNTRIES[args.country]
+    try:
+        shard = parse_shard(args.shard) if args.shard else None
+    except ValueError as e:
+        raise SystemExit(f"error: {e}")
+    client = make_client(args)
+    event_store = None
+    if not args.no_status and not args.bulk:
+        # Shards may run on different sub-accounts, so each keeps its own copy of the events
+        event_store = EventStore(data_path(f"sms_events_shard{shard[0] + 1}of{shard[1]}.db") if shard else None)
+    webhook_receiver = None
+    if args.webhook_port and event_store is not None:
+        try:
+            webhook_receiver = WebhookReceiver(event_store, host=args.webhook_host, port=args.webhook_port,
+                                               path=args.webhook_path, token=args.webhook_token).start()
+        except ValueError as e:
+            raise SystemExit(f"error: {e}")
+        print(f"Receiving delivery webhooks on {webhook_receiver.url}", file=sys.stderr)
+    journal = CampaignJournal()
+    dead_letters = []
+    # Results go to disk as they arrive; a broadcast has no per-message results to keep
+    results = None if args.bulk else ResultSpool(args.results)
+    output = open(args.output, 'a', encoding="utf-8") if args.output else None
+    done = None
+    with open(args.contacts, 'rb') as contact_file, (output or contextlib.nullcontext()):
+        phone_column, columns, options = contact_options(args, contact_file)
+        if args.bulk and options['template'] is not None and options['template'].fields:
+            raise SystemExit("error: --bulk sends the same message to everyone; the template uses "
+                             + ", ".join(f"{{{field}}}" for field in options['template'].fields))
+        if shard:
+            options['shard'] = shard
+
+        # Same file and settings as an interrupted run: resume it instead of re-sending
+        fingerprint = campaign_fingerprint(
+            contact_file,
+            sender=args.sender,
+            country_code=country["code"],
+            tag=args.tag,
+            **{key: value.signature if key == 'numbering' else value
+               for key, value in options.items() if key != 'template'},
+            # A broadcast keeps one journal entry, not one per number: it never resumes a per-message run
+            **({'bulk': True} if args.bulk else {})
+        )
+        unfinished = journal.find_unfinished(fingerprint)
+        if unfinished and args.new_campaign:
+            journal.finish_campaign(unfinished['campaign_id'], status="abandoned")
+            unfinished = None
+        if unfinished:
+            campaign_id = unfinished['campaign_id']
+        else:
+            campaign_id = journal.start_campaign(fingerprint, name=os.path.basename(args.contacts), sender=args.sender)
+        emit({"type": "campaign", "campaign_id": campaign_id, "resumed": unfinished is not None,
+              "shard": args.shard}, output)
+
+        # Not part of the fingerprint: numbers suppressed since an interrupted run are skipped on resume
+        options['suppressed'] = load_suppressions(args, *([event_store] if shard and event_store else []))
+        send_window, expected = send_windows(args), None
+        if send_window is not None:
+            # The pace is planned from the number of messages still to send
+            completed_keys = journal.resume(campaign_id) if unfinished else set()
+            if completed_keys:
+                messages, countries = count_unsent(
+                    iter_formatted_contacts(iter_contact_chunks(contact_file, phone_column, columns=columns),
+                                            phone_column, country["code"], country["length"], **options),
+                    campaign_id, completed_keys)
+            else:
+                stats = scan_contacts(iter_contact_chunks(contact_file, phone_column, columns=columns), phone_column,
+                                      country["code"], country["length"], **options)
+                messages, countries = stats['messages'], stats['countries']
+            expected = countries if args.mixed else messages
+        contact_stats = {'total': 0, 'invalid': 0, 'duplicates': 0, 'suppressed': 0, 'invalid_sample': []}
+        chunks = iter_contact_chunks(contact_file, phone_column, columns=columns)
+        contacts = iter_formatted_contacts(chunks, phone_column,
+                                           country["code"], country["length"], stats=contact_stats, **options)
+        if args.bulk:
+            events = run_bulk_campaign(client, contacts, args.sender, org_prefix=args.org_prefix,
+                                       name=f"{os.path.basename(args.contacts)} {datetime.now():%Y-%m-%d %H:%M}",
+                                       journal=journal, campaign_id=campaign_id, settle_seconds=args.settle)
+        else:
+            events = run_campaign(client, contacts, args.sender, args.rate, max_workers=args.workers,
+                                  tag=args.tag, org_prefix=args.org_prefix, event_store=event_store,
+                                  settle_seconds=args.settle, journal=journal, campaign_id=campaign_id,
+                                  adaptive=not args.fixed_rate, lane_rates=lane_rates(args),
+                                  webhook_receiver=webhook_receiver, send_window=send_window, expected=expected,
+                                  deadline=args.deadline, retry_policy=RetryPolicy(max_attempts=args.max_attempts))
+        for event in events:
+            if event["type"] == "dead_letter":
+                dead_letters.append(event["row"])
+            elif event["type"] in ("sent", "skipped"):
+                results.add(event["row"])
+            elif event["type"] == "status":
+                results.update(event["row"])
+            elif event["type"] == "done":
+                event = {**event, "suppressed": contact_stats['suppressed']}
+            emit(event_record(event), output)
+            if event["type"] == "done":
+                done = event
+    if webhook_receiver is not None:
+        webhook_receiver.stop()
+
+    if args.dead_letters and dead_letters:
+        write_results(dead_letters, args.dead_letters, drop_message=False)
+        print(f"{len(dead_letters)} dead letter(s) written to {args.dead_letters}", file=sys.stderr)
+    if results is not None:
+        # One pass over the spooled results writes --results and the history
+        CampaignHistory().add_campaign(campaign_id, results.finish(), name=os.path.basename(args.contacts),
+                                       sender=args.sender)
+        if args.results:
+            print(f"{results.count} result(s) written to {args.results}", file=sys.stderr)
+    return done
+
+# Function to run one shard in a worker process
+def _send_shard(args):
+    """Process pool entry point; quiet on stdout so the coordinator's output stays parseable"""
+    return cmd_send(args)
+
+# Function to split a campaign over worker processes
+def send_sharded(args):
+    """
+    Coordinator for --processes N: send shard i/N of the contacts in worker
+    process i, each with its own JSON-lines output, journal campaign and API key
+    (keys are dealt out round-robin; shards sharing a key share its rate).
+    Emits a shard_done event per shard, then merges all outputs into one report.
+    Returns: the combined "done" event
+    """
+    keys = api_keys(args)
+    shard_count = args.processes
+    os.makedirs(args.shard_dir, exist_ok=True)
+    shards = []
+    for shard_index in range(shard_count):
+        key_index = shard_index % len(keys)
+        key_shards = len(range(key_index, shard_count, len(keys)))
+        name = f"shard-{shard_index + 1}-of-{shard_count}"
+        shards.append(argparse.Namespace(**{
+            **vars(args),
+            'processes': 1,
+            'shard': f"{shard_index + 1}/{shard_count}",
+            'api_key': [keys[key_index]],
+            'metrics_port': args.metrics_port + shard_index if args.metrics_port else None,
+            'webhook_port': args.webhook_port + shard_index if args.webhook_port else None,
+            'results': None,  # The merged report covers every shard
+            'rate': args.rate / key_shards,
+            'lane_rate': [(country, rate / key_shards) for country, rate in (lane_rates(args) or {}).items() if rate],
+            'output': os.path.join(args.shard_dir, f"{name}.jsonl"),
+            'dead_letters': os.path.join(args.shard_dir, f"{name}-dead-letters.csv") if args.dead_letters else None,
+        }))
+
+    totals = {"type": "done", "sent": 0, "skipped": 0, "retries": 0, "dead_letters": 0, "suppressed": 0}
+    with ProcessPoolExecutor(max_workers=shard_count) as executor:
+        for shard_args, done in zip(shards, executor.map(_send_shard, shards)):
+            emit({**(done or {}), "type": "shard_done", "shard": shard_args.shard, "output": shard_args.output})
+            for key in ("sent", "skipped", "retries", "dead_letters", "suppressed"):
+                totals[key] += (done or {}).get(key, 0)
+
+    report_path = args.report or os.path.join(args.shard_dir, "report.csv")
+    report = merge_results([shard_args.output for shard_args in shards])
+    report.to_csv(report_path, index=False)
+    emit({"type": "report", "path": report_path, "rows": len(report)})
+    if args.dead_letters:
+        frames = [pd.read_csv(shard_args.dead_letters) for shard_args in shards
+                  if os.path.exists(shard_args.dead_letters)]
+        if frames:
+            pd.concat(frames, ignore_index=True).to_csv(args.dead_letters, index=False)
+            print(f"{sum(map(len, frames))} dead letter(s) written to {args.dead_letters}", file=sys.stderr)
+    emit(totals)
+    return totals
+
+def cmd_status(args):
+    client = make_client(args)
+    rows = {}
+    with open(args.results, encoding="utf-8") as results_file:
+        for line in results_file:
+            record = json.loads(line)
+            if record.get("Message ID") not in (None, "N/A"):
+                rows[str(record["Message ID"])] = SendResult.from_row(record)  # Keep the latest record per message
+    status_rows, synced = check_delivery_status(client, EventStore(), rows.values())
+    if not synced:
+        print("warning: could not reach Brevo, showing locally stored statuses", file=sys.stderr)
+    for status_row in status_rows:
+        emit({"type": "delivery_status", **status_row})
+
+def cmd_history(args):
+    history = CampaignHistory()
+    if args.campaigns:
+        for campaign in history.campaigns(limit=args.limit, offset=args.offset):
+            emit({"type": "campaign", **campaign})
+        return
+    emit({"type": "page", "total": history.count(args.campaign, args.status, args.since, args.until),
+          "offset": args.offset, "limit": args.limit})
+    for result in history.results(args.campaign, args.status, args.since, args.until, limit=args.limit, offset=args.offset):
+        emit({"type": "result", **result.row()})
+
+def cmd_merge(args):
+    report = merge_results(args.results)
+    report.to_csv(args.output, index=False)
+    emit({"type": "report", "path": args.output, "rows": len(report)})
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="brevo-sms", description="Send bulk SMS through Brevo without the web UI.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    def add_contact_arguments(subparser):
+        subparser.add_argument("contacts", help="CSV (optionally .gz/.zip), Excel, Parquet, Feather or TXT contact file")
+        subparser.add_argument("--template", help="Message text, may use {column} variables")
+        subparser.add_argument("--template-file", help="Read the message text from a file")
+        subparser.add_argument("--country", choices=sorted(COUNTRIES), default="US", help="Country of the phone numbers (default: US)")
+        subparser.add_argument("--mixed", action="store_true",
+                               help="Detect each number's country from its calling code (+44..., 0044... or 44...); "
+                                    "numbers in national format are taken as --country")
+        subparser.add_argument("--lane-opt-out", type=lane_value, action="append", metavar="COUNTRY=TEXT",
+                               help="With --mixed, opt-out text for one country instead of --opt-out (repeatable; empty for none)")
+        subparser.add_argument("--phone-column", help="Phone number column (auto-detected if omitted)")
+        subparser.add_argument("--name-column", help="Name column for {name}/{username}, or 'none' (auto-detected if omitted)")
+        subparser.add_argument("--opt-out", help="Opt-out text appended to every message, e.g. 'Reply STOP to opt-out'")
+        subparser.add_argument("--org-prefix", help="Organisation prefix Brevo adds before the message")
+        subparser.add_argument("--transliterate", action="store_true", help="Replace characters that force Unicode with GSM-7 look-alikes")
+        subparser.add_argument("--keep-duplicates", action="store_true", help="Send to repeated numbers more than once")
+        subparser.add_argument("--no-suppression", action="store_true",
+                               help="Also send to numbers that hard-bounced, were blocked or unsubscribed before")
+
+    def add_client_arguments(subparser):
+        subparser.add_argument("--api-key", action="append",
+                               help="Brevo API key, repeat to share shards between keys (default: BREVO_API_KEYS or BREVO_API_KEY)")
+        subparser.add_argument("--workers", type=int, default=8, help="Concurrent requests (default: 8)")
+        subparser.add_argument("--timeout", type=float, default=30.0, help="Request timeout in seconds (default: 30)")
+        subparser.add_argument("--base-url", default=os.environ.get("BREVO_API_URL", BREVO_API_URL),
+                               help="API base URL, e.g. a local mock server (default: BREVO_API_URL or the Brevo API)")
+
+    scan_parser = subparsers.add_parser("scan", help="Validate a contact file and forecast parts, without sending")
+    add_contact_arguments(scan_parser)
+    scan_parser.set_defaults(func=cmd_scan)
+
+    send_parser = subparsers.add_parser("send", help="Send a campaign, streaming progress as JSON lines")
+    add_contact_arguments(send_parser)
+    add_client_arguments(send_parser)
+    send_parser.add_argument("--sender", required=True, help="Sender name (max 11 characters)")
+    send_parser.add_argument("--rate", type=float, default=1.0, help="Maximum send rate in SMS per second (default: 1)")
+    send_parser.add_argument("--lane-rate", type=lane_value, action="append", metavar="COUNTRY=RATE",
+                             help="With --mixed, maximum SMS per second for one country's send lane (repeatable; within --rate)")
+    send_parser.add_argument("--bulk", action="store_true", help="Same message for everyone: import the numbers as a Brevo contact list and send one SMS campaign (a few API calls instead of one per number)")
+    send_parser.add_argument("--fixed-rate", action="store_true", help="Do not slow down or speed up when Brevo throttles")
+    send_parser.add_argument("--window", metavar="HH:MM-HH:MM", help="Only send between these local times of the recipients, e.g. 09:00-21:00, paced to finish inside the window")
+    send_parser.add_argument("--window-days", metavar="DAYS", help="Days the window opens, e.g. mon-sat (default: every day)")
+    send_parser.add_argument("--window-tz", action="append", metavar="ZONE", help="Recipients' time zone, e.g. Asia/Kolkata (repeatable; default: the country's zones; --mixed uses each country's)")
+    send_parser.add_argument("--deadline", type=deadline_value, help="With --window, spread the campaign over the open hours until this date and time (default: the end of the current or next opening)")
+    send_parser.add_argument("--tag", help="Tag for tracking messages")
+    send_parser.add_argument("--no-status", action="store_true", help="Do not reconcile delivery statuses")
+    send_parser.add_argument("--webhook-port", type=int, help="Receive Brevo's delivery webhooks on this port instead of polling the events API (with --processes, shard N uses port + N - 1)")
+    send_parser.add_argument("--webhook-host", default=WEBHOOK_HOST, help=f"Address the webhook receiver listens on (default: {WEBHOOK_HOST}, e.g. behind a reverse proxy; any other needs --webhook-token)")
+    send_parser.add_argument("--webhook-path", default=WEBHOOK_PATH, help=f"URL path of the webhook (default: {WEBHOOK_PATH})")
+    send_parser.add_argument("--webhook-token", default=os.environ.get("BREVO_WEBHOOK_TOKEN"), help="Shared secret the webhook URL must carry as ?token= (default: $BREVO_WEBHOOK_TOKEN)")
+    send_parser.add_argument("--settle", type=float, default=STATUS_SETTLE_SECONDS, help="Seconds to wait for delivery reports after the last send")
+    send_parser.add_argument("--max-attempts", type=int, default=MAX_ATTEMPTS, help=f"Attempts per message before it becomes a dead letter (default: {MAX_ATTEMPTS})")
+    send_parser.add_argument("--dead-letters", help="Write messages that ran out of attempts to this CSV file")
+    send_parser.add_argument("--new-campaign", action="store_true", help="Discard an interrupted run of the same campaign instead of resuming it")
+    send_parser.add_argument("--results", help="Write the final result table to this file (.csv, .csv.gz or .parquet)")
+    send_parser.add_argument("--metrics-port", type=int, help="Serve Prometheus metrics on this port at /metrics while sending (with --processes, shard N uses port + N - 1)")
+    send_parser.add_argument("--metrics-host", default=METRICS_HOST, help=f"Address the metrics endpoint listens on (default: {METRICS_HOST}; it has no authentication, e.g. 0.0.0.0 only on a private network)")
+    send_parser.add_argument("--output", help="Append the JSON lines to this file instead of stdout")
+    send_parser.add_argument("--shard", help="Only send shard I/N of the contacts, e.g. 2/4 (to split a campaign between machines)")
+    send_parser.add_argument("--processes", type=int, default=1, help="Split the campaign into this many shards sent by parallel worker processes")
+    send_parser.add_argument("--shard-dir", default="shards", help="Where --processes writes per-shard output and the merged report (default: shards)")
+    send_parser.add_argument("--report", help="Merged report CSV for --processes (default: SHARD_DIR/report.csv)")
+    send_parser.set_defaults(func=cmd_send)
+
+    status_parser = subparsers.add_parser("status", help="Look up delivery status for the output of 'send'")
+    status_parser.add_argument("results", help="JSON lines written by 'send'")
+    add_client_arguments(status_parser)
+    status_parser.set_defaults(func=cmd_status)
+
+    history_parser = subparsers.add_parser("history", help="Page through the results of past campaigns")
+    history_parser.add_argument("--campaigns", action="store_true", help="List stored campaigns instead of results")
+    history_parser.add_argument("--campaign", help="Only results of this campaign ID")
+    history_parser.add_argument("--status", nargs="+", choices=[status.name for status in Status], help="Only results with these statuses")
+    history_parser.add_argument("--since", help="Only results from this date on (YYYY-MM-DD)")
+    history_parser.add_argument("--until", help="Only results before this date (YYYY-MM-DD)")
+    history_parser.add_argument("--limit", type=int, default=HISTORY_PAGE_SIZE, help=f"Page size (default: {HISTORY_PAGE_SIZE})")
+    history_parser.add_argument("--offset", type=int, default=0, help="Rows to skip (default: 0)")
+    history_parser.set_defaults(func=cmd_history)
+
+    merge_parser = subparsers.add_parser("merge", help="Merge the output of several 'send' runs (e.g. shards) into one CSV report")
+    merge_parser.add_argument("results", nargs="+", help="JSON lines written by 'send'")
+    merge_parser.add_argument("--output", required=True, help="Report CSV to write")
+    merge_parser.set_defaults(func=cmd_merge)
+
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.func(args)
@@ -0,0 +1,151 @@
+"""Brevo API client and the SMS endpoints used by the sender."""
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .metrics import API_LATENCY, API_RESPONSES, span
+
+try:
+    import httpx  # Optional: only needed for HTTP/2
+except ImportError:
+    httpx = None
+
+# Reusable Brevo API client
+BREVO_API_URL = "https://api.brevo.com/v3"
+
+class BrevoClient:
+    """
+    Pooled, keep-alive HTTP client for the Brevo API.
+    Headers are built once and connections are reused across calls, so each
+    request costs a single round-trip instead of a fresh TCP+TLS handshake.
+    All Brevo endpoints should go through get()/post().
+    """
+    def __init__(self, api_key, base_url=BREVO_API_URL, pool_size=10, timeout=30.0, connect_timeout=5.0, http2=False):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = (connect_timeout, timeout)
+        headers = {
+            "accept": "application/json",
+            "api-key": api_key
+        }
+
+        self.http2 = False
+        if http2 and httpx is not None:
+            try:
+                self._session = httpx.Client(
+                    http2=True,
+                    headers=headers,
+                    timeout=httpx.Timeout(timeout, connect=connect_timeout),
+                    limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+                )
+                self.http2 = True
+            except ImportError:
+                pass  # httpx installed without the h2 extra, fall back to HTTP/1.1
+
+        if not self.http2:
+            self._session = requests.Session()
+            self._session.headers.update(headers)
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+            self._session.mount("https://", adapter)
+            self._session.mount("http://", adapter)
+
+        self._observers = []
+
+    def add_response_observer(self, observer):
+        """Call observer(path, response) after every response, e.g. to read rate-limit headers"""
+        self._observers.append(observer)
+
+    def remove_response_observer(self, observer):
+        if observer in self._observers:
+            self._observers.remove(observer)
+
+    def request(self, method, path, **kwargs):
+        """Send a request to a Brevo endpoint path such as 'transactionalSMS/send'"""
+        endpoint = path.lstrip('/')
+        url = f"{self.base_url}/{endpoint}"
+        started = time.perf_counter()
+        status = 0
+        try:
+            with span("brevo.api", **{"http.method": method, "brevo.endpoint": endpoint}) as current:
+                if self.http2:
+                    response = self._session.request(method, url, **kwargs)
+                else:
+                    response = self._session.request(method, url, timeout=self.timeout, **kwargs)
+                status = response.status_code
+                if current is not None:
+                    current.set_attribute("http.status_code", status)
+        finally:
+            API_LATENCY.observe(time.perf_counter() - started, endpoint=endpoint)
+            API_RESPONSES.inc(endpoint=endpoint, status=status)
+        for observer in list(self._observers):
+            observer(endpoint, response)
+        return response
+
+    def get(self, path, params=None):
+        return self.request("GET", path, params=params)
+
+    def post(self, path, payload=None):
+        return self.request("POST", path, json=payload)
+
+    def close(self):
+        self._session.close()
+
+# Function to send SMS via Brevo API
+def send_sms(client, sender, recipient, content, sms_type="marketing", tag=None, unicode_enabled=True, org_prefix=None):
+    """
+    Send SMS using Brevo API
+    Returns: (success: bool, message_id: str, error: str, status_code: int)
+    """
+    payload = {
+        "sender": sender,
+        "recipient": recipient,
+        "content": content,
+        "type": sms_type,
+        "unicodeEnabled": unicode_enabled
+    }
+    
+    if tag:
+        payload["tag"] = tag
+    
+    if org_prefix:
+        payload["organisationPrefix"] = org_prefix
+    
+    try:
+        response = client.post("transactionalSMS/send", payload)
+        
+        if response.status_code == 201:
+            data = response.json()
+            return True, data.get("messageId", "N/A"), None, 201
+        else:
+            error_msg = response.json().get("message", response.text) if response.text else f"HTTP {response.status_code}"
+            return False, None, error_msg, response.status_code
+    except Exception as e:
+        return False, None, str(e), 0
+
+# Function to fetch one page of SMS delivery events
+def fetch_sms_events(client, limit=100, offset=0, start_date=None, end_date=None, phone_number=None, sort="asc"):
+    """
+    Fetch a page of delivery events from the Brevo events API
+    Returns: list of events or None if error
+    """
+    params = {
+        "limit": limit,
+        "offset": offset,
+        "sort": sort
+    }
+    
+    if start_date and end_date:
+        params["startDate"] = start_date
+        params["endDate"] = end_date
+    
+    if phone_number:
+        params["phoneNumber"] = phone_number
+    
+    try:
+        response = client.get("transactionalSMS/statistics/events", params=params)
+        if response.status_code == 200:
+            return response.json().get("events", [])
+        else:
+            return None
+    except Exception as e:
+        return None
@@ -0,0 +1,230 @@
+"""Memory-capped LRU cache of parsed and validated contact files, spilling large ones to disk."""
+import os
+import shutil
+import tempfile
+import threading
+import weakref
+from collections import OrderedDict, deque
+
+import pandas as pd
+
+from .contacts import (COUNTRY_COLUMN, iter_contact_chunks, new_contact_stats, render_contact_chunks,
+                       summarize_contact_frames, validate_contact_chunks)
+from .journal import file_digest
+from .storage import data_path
+
+# Default memory budget for cached contact sets
+CONTACT_CACHE_MAX_BYTES = 256 * 1024 * 1024
+# Default disk budget for contact sets too large for memory
+CONTACT_CACHE_MAX_DISK_BYTES = 4 * 1024 * 1024 * 1024
+
+# Options applied when validating, so they are part of the cache key rather than of each render
+VALIDATION_OPTIONS = ('name_column', 'remove_duplicates', 'numbering')
+
+# Function to measure a chunk in memory
+def _chunk_nbytes(chunk):
+    return int(chunk.memory_usage(index=True, deep=True).sum())
+
+# Validated chunks kept on disk and read back one at a time
+class SpilledChunks:
+    """
+    One pickle file per chunk (per chunk and country for chunks validated with
+    a numbering plan, so a send lane only reads its own rows) in a private
+    directory, removed once the object is garbage collected.
+    """
+    def __init__(self, parent_dir):
+        os.makedirs(parent_dir, exist_ok=True)
+        self.directory = tempfile.mkdtemp(prefix="contacts-", dir=parent_dir)
+        self.parts = []  # (country or None, path)
+        self.rows = 0
+        self.disk_bytes = 0
+        weakref.finalize(self, shutil.rmtree, self.directory, ignore_errors=True)
+
+    def append(self, chunk):
+        if COUNTRY_COLUMN in chunk:
+            parts = chunk.groupby(COUNTRY_COLUMN, sort=False)
+        else:
+            parts = [(None, chunk)]
+        for country, part in parts:
+            path = os.path.join(self.directory, f"{len(self.parts)}.pkl")
+            part.to_pickle(path)
+            self.parts.append((country, path))
+            self.rows += len(part)
+            self.disk_bytes += os.path.getsize(path)
+
+    def __len__(self):
+        return len(self.parts)
+
+    def __iter__(self):
+        return self.iter_country()
+
+    def iter_country(self, country=None):
+        """Chunks read back from disk, only those of `country` if given"""
+        for part_country, path in self.parts:
+            if country is None or part_country == country:
+                yield pd.read_pickle(path)
+
+# A contact file after parsing, validation and deduplication
+class ValidatedContacts:
+    """
+    The validated chunks of one contact file with their validation stats, in
+    memory (a list of DataFrames) or on disk (SpilledChunks), read back a chunk
+    at a time. Personalization, suppression and sharding still run on every
+    scan() or iter_contacts(), so message settings can change without
+    re-reading the file. `countries` lists the detected destinations in order of
+    appearance (None without a numbering plan).
+    """
+    def __init__(self, chunks, stats, phone_column, name_column=None, countries=None):
+        self.chunks = chunks
+        self.stats = stats
+        self.phone_column = phone_column
+        self.name_column = name_column
+        self.countries = countries
+        if isinstance(chunks, SpilledChunks):
+            self.nbytes, self.disk_bytes = 0, chunks.disk_bytes
+        else:
+            self.nbytes, self.disk_bytes = sum(_chunk_nbytes(chunk) for chunk in chunks), 0
+
+    def __len__(self):
+        if isinstance(self.chunks, SpilledChunks):
+            return self.chunks.rows
+        return sum(len(chunk) for chunk in self.chunks)
+
+    def _frames(self, stats, options, chunks=None):
+        options = {key: value for key, value in options.items() if key not in VALIDATION_OPTIONS}
+        return render_contact_chunks(self.chunks if chunks is None else chunks, self.phone_column,
+                                     name_column=self.name_column, stats=stats, **options)
+
+    def _country_records(self, country, options):
+        if isinstance(self.chunks, SpilledChunks):
+            chunks = self.chunks.iter_country(country)
+        else:
+            chunks = (chunk[chunk[COUNTRY_COLUMN] == country] for chunk in self.chunks
+                      if (chunk[COUNTRY_COLUMN] == country).any())
+        for frame in self._frames(None, options, chunks):
+            yield from frame.to_dict('records')
+
+    def scan(self, **options):
+        """Same totals as scan_contacts() (name_column and remove_duplicates are ignored, they were applied when validating)"""
+        stats = new_contact_stats()
+        stats.update(self.stats, invalid_sample=list(self.stats['invalid_sample']))
+        return summarize_contact_frames(self._frames(stats, options), stats, options)
+
+    def iter_contacts(self, **options):
+        """
+        Same records as iter_formatted_contacts(). Contacts validated with a numbering
+        plan come country by country in turn, so every send lane has work from the start.
+        """
+        if not self.countries:
+            for frame in self._frames(None, options):
+                yield from frame.to_dict('records')
+            return
+        lanes = deque(self._country_records(country, options) for country in self.countries)
+        while lanes:
+            lane = lanes.popleft()
+            contact = next(lane, None)
+            if contact is not None:
+                yield contact
+                lanes.append(lane)
+
+# Function to parse and validate a whole contact file
+def load_validated_contacts(contact_file, phone_column, country_code, expected_length, name_column=None,
+                            remove_duplicates=True, columns=None, numbering=None, max_bytes=None, spill_dir=None):
+    """
+    Returns: ValidatedContacts for contact_file (no caching); `columns` limits what is read,
+    `numbering` detects each number's country (see validate_contact_chunks()). Once the
+    chunks held in memory pass max_bytes, they and the rest of the file go to disk
+    under spill_dir (default: the data directory), so memory stays flat.
+    """
+    stats = {'total': 0, 'invalid': 0, 'duplicates': 0, 'invalid_sample': []}
+    chunks = iter_contact_chunks(contact_file, phone_column, columns=columns)
+    validated = []
+    nbytes = 0
+    countries = {}  # Ordered set of detected destinations
+    for chunk in validate_contact_chunks(chunks, phone_column, country_code, expected_length, name_column=name_column,
+                                         remove_duplicates=remove_duplicates, stats=stats, numbering=numbering):
+        if numbering is not None:
+            countries.update(dict.fromkeys(pd.unique(chunk[COUNTRY_COLUMN])))
+        if max_bytes is not None and not isinstance(validated, SpilledChunks):
+            nbytes += _chunk_nbytes(chunk)
+            if nbytes > max_bytes:
+                spilled = SpilledChunks(spill_dir or data_path("contact_cache"))
+                for held in validated:
+                    spilled.append(held)
+                validated = spilled
+        validated.append(chunk)
+    return ValidatedContacts(validated, stats, phone_column, name_column,
+                             countries=list(countries) if numbering is not None else None)
+
+# Validated contact sets shared across reruns and sessions
+class ContactCache:
+    """
+    LRU cache of ValidatedContacts keyed by the file's content hash, the
+    column mapping and the country. A set larger than max_bytes on its own is
+    spilled to disk while it is validated (see load_validated_contacts()).
+    Least recently used sets are evicted once the combined (deep) DataFrame
+    size of those in memory exceeds max_bytes or the files of those on disk
+    exceed max_disk_bytes; a set larger than max_disk_bytes is returned but not kept.
+    """
+    def __init__(self, max_bytes=CONTACT_CACHE_MAX_BYTES, max_disk_bytes=CONTACT_CACHE_MAX_DISK_BYTES, spill_dir=None):
+        self.max_bytes = max_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.spill_dir = spill_dir
+        self._entries = OrderedDict()
+        self._nbytes = 0
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def nbytes(self):
+        return self._nbytes
+
+    @property
+    def disk_bytes(self):
+        return self._disk_bytes
+
+    def get(self, contact_file, phone_column, country_code, expected_length, name_column=None, remove_duplicates=True,
+            columns=None, numbering=None):
+        """
+        Returns: ValidatedContacts for contact_file, parsing and validating it only on a cache miss.
+        `columns` (see contact_columns()) is part of the key: a template using another column reloads.
+        """
+        # The extension is part of the key: the same bytes parse differently as .csv and .txt
+        key = (file_digest(contact_file), contact_file.name.rsplit('.', 1)[-1].lower(), phone_column, name_column,
+               country_code, expected_length, bool(remove_duplicates), None if columns is None else tuple(columns),
+               None if numbering is None else numbering.signature)
+        with self._lock:
+            validated = self._entries.get(key)
+            if validated is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return validated
+            self.misses += 1
+
+        validated = load_validated_contacts(contact_file, phone_column, country_code, expected_length,
+                                            name_column=name_column, remove_duplicates=remove_duplicates,
+                                            columns=columns, numbering=numbering, max_bytes=self.max_bytes,
+                                            spill_dir=self.spill_dir)
+        if validated.disk_bytes <= self.max_disk_bytes:
+            with self._lock:
+                if key not in self._entries:
+                    self._entries[key] = validated
+                    self._nbytes += validated.nbytes
+                    self._disk_bytes += validated.disk_bytes
+                # Evicted spilled sets delete their files once no running send reads them
+                while self._nbytes > self.max_bytes or self._disk_bytes > self.max_disk_bytes:
+                    _, evicted = self._entries.popitem(last=False)
+                    self._nbytes -= evicted.nbytes
+                    self._disk_bytes -= evicted.disk_bytes
+        return validated
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._nbytes = 0
+            self._disk_bytes = 0
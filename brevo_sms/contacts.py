@@ -0,0 +1,434 @@
+"""Contact file ingestion, phone number validation and message preparation."""
+import re
+
+import openpyxl
+import pandas as pd
+
+try:
+    import python_calamine  # Optional: Rust Excel reader, much faster and lighter than openpyxl
+except ImportError:
+    python_calamine = None
+
+try:
+    import pyarrow as pa  # Optional: Parquet and Feather uploads
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+from .metrics import stage
+from .numbering import normalize_international_column
+from .segments import count_sms_segments_column, transliterate_gsm7
+from .shard import shard_mask
+
+# Supported destinations: national number length without the country code, and the local time zones
+COUNTRIES = {
+    "US": {"label": "🇺🇸 United States/Canada (+1)", "code": "1", "length": 10,
+           "timezones": ("America/New_York", "America/Chicago", "America/Denver", "America/Los_Angeles")},
+    "IN": {"label": "🇮🇳 India (+91)", "code": "91", "length": 10, "timezones": ("Asia/Kolkata",)},
+    "GB": {"label": "🇬🇧 United Kingdom (+44)", "code": "44", "length": 10, "timezones": ("Europe/London",)},
+    "AU": {"label": "🇦🇺 Australia (+61)", "code": "61", "length": 9,
+           "timezones": ("Australia/Sydney", "Australia/Adelaide", "Australia/Brisbane", "Australia/Perth")},
+    "SG": {"label": "🇸🇬 Singapore (+65)", "code": "65", "length": 8, "timezones": ("Asia/Singapore",)},
+    "AE": {"label": "🇦🇪 UAE (+971)", "code": "971", "length": 9, "timezones": ("Asia/Dubai",)},
+    "SA": {"label": "🇸🇦 Saudi Arabia (+966)", "code": "966", "length": 9, "timezones": ("Asia/Riyadh",)},
+}
+
+# Keywords used to auto-detect the phone and name columns
+PHONE_KEYWORDS = ['phone', 'mobile', 'number', 'contact', 'cell', 'tel']
+NAME_KEYWORDS = ['name', 'customer', 'client', 'user', 'recipient', 'contact']
+
+# Function to validate and format phone number
+def format_phone_number(phone, country_code, expected_length):
+    """
+    Format phone number based on length and country code.
+    Returns formatted number with country code or None if invalid.
+    """
+    # Remove any non-digit characters
+    phone = re.sub(r'\D', '', str(phone))
+    
+    # Check if it already has the country code
+    if phone.startswith(country_code) and len(phone) == len(country_code) + expected_length:
+        return phone  # Already formatted correctly
+    
+    # Check if it's the expected length (without country code)
+    elif len(phone) == expected_length:
+        return country_code + phone  # Add country code
+    
+    # Check if it might be the full number with country code
+    elif len(phone) == len(country_code) + expected_length:
+        return phone  # Assume it's already complete
+    
+    else:
+        return None  # Invalid format
+
+# Function to auto-detect a column from keywords
+def auto_detect_column(columns, keywords):
+    """Auto-detect column based on keywords (case-insensitive)"""
+    for col in columns:
+        col_lower = str(col).lower()
+        for keyword in keywords:
+            if keyword in col_lower:
+                return col
+    return None
+
+# Contacts are read, validated and sent in fixed-size batches so memory stays flat
+CHUNK_SIZE = 5000
+PREVIEW_ROWS = 5
+INVALID_SAMPLE_SIZE = 100
+
+# Upload extensions accepted by the app (.gz and .zip hold a single CSV)
+CONTACT_FILE_TYPES = ["csv", "gz", "zip", "xlsx", "xls", "parquet", "feather", "arrow", "txt"]
+
+# Function to tell how a contact file is stored from its name
+def contact_file_format(file_name):
+    """
+    Returns: (format, compression) with format one of 'csv', 'excel', 'parquet',
+    'feather' or 'txt' and compression 'gzip', 'zip' or None (CSV only)
+    """
+    name = file_name.lower()
+    if name.endswith(('.gz', '.zip')):
+        return 'csv', 'gzip' if name.endswith('.gz') else 'zip'
+    if name.endswith('.csv'):
+        return 'csv', None
+    if name.endswith(('.xlsx', '.xls')):
+        return 'excel', None
+    if name.endswith('.parquet'):
+        return 'parquet', None
+    if name.endswith(('.feather', '.arrow')):
+        return 'feather', None
+    return 'txt', None
+
+# Function to list the columns a send actually needs
+def contact_columns(columns, phone_column, name_column=None, template=None):
+    """
+    The phone and name columns plus those the template uses, in file order,
+    so wide files can be read without their unused columns.
+    """
+    needed = {phone_column, name_column} | set(template.fields if template is not None else ())
+    return [col for col in columns if col in needed or str(col) in needed]
+
+# Function to open a columnar file without copying it
+def _arrow_source(contact_file):
+    # Uploads are already in memory: wrap their bytes; files on disk are memory-mapped
+    if hasattr(contact_file, 'getvalue'):
+        return pa.py_buffer(contact_file.getvalue())
+    return pa.memory_map(contact_file.name)
+
+# Function to iterate the record batches of a Parquet or Feather file
+def _iter_arrow_batches(contact_file, file_format, columns=None, chunk_size=CHUNK_SIZE):
+    if pa is None:
+        raise ImportError("Parquet and Feather files need pyarrow (pip install pyarrow)")
+    source = _arrow_source(contact_file)
+    if file_format == 'parquet':
+        yield from pq.ParquetFile(source).iter_batches(batch_size=chunk_size, columns=columns)
+        return
+    reader = pa.ipc.open_file(source)
+    for index in range(reader.num_record_batches):
+        batch = reader.get_batch(index)
+        if columns is not None:
+            batch = batch.select(columns)
+        yield from pa.Table.from_batches([batch]).to_batches(max_chunksize=chunk_size)
+
+# Function to turn a record batch into an Arrow-backed DataFrame
+def _arrow_frame(batch, phone_column=None):
+    if phone_column is not None and phone_column in batch.schema.names:
+        # Numbers stored as integers are read as text, like the CSV and Excel readers do
+        index = batch.schema.get_field_index(phone_column)
+        if not pa.types.is_string(batch.schema.field(index).type):
+            batch = batch.set_column(index, phone_column, batch.column(index).cast(pa.string()))
+    return batch.to_pandas(types_mapper=pd.ArrowDtype)
+
+# Function to read the first rows of a contact file
+def read_contacts_preview(contact_file, nrows=PREVIEW_ROWS):
+    """
+    Read only the first rows of a CSV/Excel/Parquet/Feather file, for preview and column mapping.
+    """
+    contact_file.seek(0)
+    file_format, compression = contact_file_format(contact_file.name)
+    if file_format == 'csv':
+        return pd.read_csv(contact_file, nrows=nrows, compression=compression)
+    if file_format in ('parquet', 'feather'):
+        batch = next(_iter_arrow_batches(contact_file, file_format, chunk_size=nrows), None)
+        if batch is None:
+            return pd.DataFrame()
+        return _arrow_frame(batch.slice(0, nrows))
+    return pd.read_excel(contact_file, nrows=nrows, engine='calamine' if python_calamine else None)
+
+# Function to stream a contact file in chunks
+def iter_contact_chunks(contact_file, phone_column=None, chunk_size=CHUNK_SIZE, columns=None):
+    """
+    Stream a contact file (any binary file object with a .name) as DataFrames of at most chunk_size rows.
+    The phone column is kept as text so numbers are never turned into floats.
+    With `columns`, only those columns are read (see contact_columns()).
+    Parquet and Feather files come as Arrow-backed frames sharing the file's buffers.
+    TXT files yield a single 'phone' column (one number per line).
+    """
+    contact_file.seek(0)
+    file_format, compression = contact_file_format(contact_file.name)
+
+    if file_format == 'csv':
+        dtype = {phone_column: str} if phone_column else None
+        yield from pd.read_csv(contact_file, chunksize=chunk_size, dtype=dtype, usecols=columns,
+                               compression=compression)
+
+    elif file_format in ('parquet', 'feather'):
+        for batch in _iter_arrow_batches(contact_file, file_format, columns=columns, chunk_size=chunk_size):
+            yield _arrow_frame(batch, phone_column)
+
+    elif file_format == 'excel' and python_calamine is not None:
+        # calamine parses the whole sheet natively in a fraction of openpyxl's time and memory;
+        # only the needed columns become pandas objects
+        contacts_df = pd.read_excel(contact_file, engine='calamine', usecols=columns,
+                                    dtype={phone_column: str} if phone_column else None)
+        for start in range(0, len(contacts_df), chunk_size):
+            yield contacts_df.iloc[start:start + chunk_size].copy()
+
+    elif contact_file.name.endswith('.xlsx'):
+        workbook = openpyxl.load_workbook(contact_file, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                return
+            # Match the column names pandas gives when previewing the same file
+            names = [col if col is not None else f"Unnamed: {i}" for i, col in enumerate(header)]
+            positions = [i for i, name in enumerate(names) if columns is None or name in columns]
+            names = [names[i] for i in positions]
+            batch = []
+            for row in rows:
+                if all(value is None for value in row):
+                    continue  # pandas skips blank rows too
+                batch.append([row[i] if i < len(row) else None for i in positions])
+                if len(batch) == chunk_size:
+                    yield pd.DataFrame(batch, columns=names)
+                    batch = []
+            if batch:
+                yield pd.DataFrame(batch, columns=names)
+        finally:
+            workbook.close()
+
+    elif file_format == 'excel':
+        # Legacy .xls has no streaming reader, so read it once and hand out slices
+        contacts_df = pd.read_excel(contact_file, usecols=columns, dtype={phone_column: str} if phone_column else None)
+        for start in range(0, len(contacts_df), chunk_size):
+            yield contacts_df.iloc[start:start + chunk_size].copy()
+
+    else:
+        # TXT: one number per line, decoded line by line
+        batch = []
+        for raw_line in contact_file:
+            line = raw_line.decode('utf-8').strip()
+            if line:
+                batch.append(line)
+                if len(batch) == chunk_size:
+                    yield pd.DataFrame({'phone': batch})
+                    batch = []
+        if batch:
+            yield pd.DataFrame({'phone': batch})
+
+# Function to add first-name variables to a chunk
+def add_first_name_columns(chunk, name_column):
+    """
+    Add {name} and {username} columns holding the first name from name_column.
+    """
+    chunk['name'] = chunk[name_column].apply(
+        lambda x: str(x).split()[0] if pd.notna(x) and str(x).strip() and ' ' in str(x) else str(x)
+    )
+    chunk['username'] = chunk['name']
+    return chunk
+
+# Function to validate a whole column of phone numbers at once
+def normalize_phone_column(phones, country_code, expected_length):
+    """
+    Vectorized version of format_phone_number() for a pandas Series.
+    Returns: (normalized: Series with country code added, invalid_mask: Series)
+    """
+    digits = phones.astype(str).str.replace(r'\D', '', regex=True)
+    lengths = digits.str.len()
+    has_code = lengths == len(country_code) + expected_length
+    needs_code = lengths == expected_length
+    normalized = digits.where(has_code, country_code + digits)
+    invalid_mask = ~(has_code | needs_code)
+    return normalized.where(~invalid_mask), invalid_mask
+
+# Function to flag repeated numbers across chunks
+def duplicate_mask(normalized, invalid_mask, seen):
+    """
+    Flag valid numbers already seen earlier in this chunk or in previous chunks.
+    `seen` is a set of normalized numbers, updated in place.
+    """
+    valid = normalized[~invalid_mask]
+    numbers = valid.tolist()
+    # Plain set lookups; Series.isin() re-hashes the whole set on every call
+    already_seen = pd.Series([number in seen for number in numbers], index=valid.index, dtype=bool)
+    duplicates = valid.duplicated() | already_seen
+    seen.update(numbers)
+    return duplicates.reindex(normalized.index, fill_value=False)
+
+# Column holding the normalized number in validated chunks
+FORMATTED_COLUMN = "__formatted_number__"
+COUNTRY_COLUMN = "__country__"
+
+# Function to validate and dedupe contacts chunk by chunk
+def validate_contact_chunks(chunks, phone_column, country_code, expected_length, name_column=None,
+                            remove_duplicates=True, stats=None, numbering=None):
+    """
+    First half of prepare_contact_chunks(): the work that only depends on the
+    file, the column mapping and the country, so its output can be cached.
+    Yields: the rows to send of each chunk, with FORMATTED_COLUMN (and name/username) added
+    If a `stats` dict is given, its total/invalid/duplicates/invalid_sample entries are updated.
+    With a `numbering` PrefixTrie, every number's destination is detected on its own
+    (see normalize_international_column(); country_code may then be None) and
+    stored in COUNTRY_COLUMN.
+    """
+    seen = set()
+    for chunk in chunks:
+        if numbering is not None:
+            normalized, countries, invalid_mask = normalize_international_column(
+                chunk[phone_column], numbering, country_code, expected_length)
+        else:
+            normalized, invalid_mask = normalize_phone_column(chunk[phone_column], country_code, expected_length)
+        duplicates = duplicate_mask(normalized, invalid_mask, seen)
+        if stats is not None:
+            stats['total'] += len(chunk)
+            stats['invalid'] += int(invalid_mask.sum())
+            stats['duplicates'] += int(duplicates.sum())
+            room = INVALID_SAMPLE_SIZE - len(stats['invalid_sample'])
+            if room > 0:
+                stats['invalid_sample'].extend(chunk[phone_column][invalid_mask].head(room).tolist())
+
+        keep = ~invalid_mask & ~duplicates if remove_duplicates else ~invalid_mask
+        chunk = chunk[keep].copy()
+        chunk[FORMATTED_COLUMN] = normalized[keep]
+        if numbering is not None:
+            chunk[COUNTRY_COLUMN] = countries[keep]
+        if name_column:
+            add_first_name_columns(chunk, name_column)
+        yield chunk
+
+# Function to personalize and size validated contacts chunk by chunk
+def render_contact_chunks(validated_chunks, phone_column, name_column=None, template=None, default_message="",
+                          stop_text=None, org_prefix=None, transliterate=False, stats=None, shard=None,
+                          suppressed=None, stop_texts=None):
+    """
+    Second half of prepare_contact_chunks(): filter validated chunks by shard and
+    suppression, then render and size the messages. Chunks are not modified.
+    Yields: one DataFrame per chunk with columns original, formatted, name, message, unicode, segments
+    (and country, for chunks validated with a numbering plan)
+    stop_texts maps a country key to its own opt-out text ("" for none), overriding stop_text.
+    """
+    for chunk in validated_chunks:
+        normalized = chunk[FORMATTED_COLUMN]
+        keep = pd.Series(True, index=chunk.index, dtype=bool)
+        if shard is not None:
+            keep &= shard_mask(normalized, *shard)
+        if suppressed is not None:
+            suppressed_mask = keep & suppressed.mask(normalized)
+            keep &= ~suppressed_mask
+            if stats is not None:
+                stats['suppressed'] = stats.get('suppressed', 0) + int(suppressed_mask.sum())
+        if not keep.all():
+            chunk = chunk[keep]
+
+        with stage("personalize", rows=len(chunk)):
+            if template is not None:
+                messages = template.render_column(chunk)
+            else:
+                messages = pd.Series(default_message, index=chunk.index, dtype=object)
+            if stop_texts and COUNTRY_COLUMN in chunk:
+                texts = chunk[COUNTRY_COLUMN].map(lambda country: stop_texts.get(country, stop_text) or "")
+                messages = messages + texts.where(texts == "", " " + texts)
+            elif stop_text:
+                messages = messages + " " + stop_text
+            if transliterate:
+                messages = transliterate_gsm7(messages)
+
+            # Brevo puts the organisation prefix in front, so it counts towards the length
+            is_unicode, segments = count_sms_segments_column(f"{org_prefix}: " + messages if org_prefix else messages)
+
+        # Display name: first name if known, else the number (or N/A for plain number lists)
+        if name_column:
+            names = chunk['name']
+        elif template is not None:
+            names = chunk[phone_column]
+        else:
+            names = "N/A"
+
+        frame = pd.DataFrame({
+            'original': chunk[phone_column],
+            'formatted': chunk[FORMATTED_COLUMN],
+            'name': names,
+            'message': messages,
+            'unicode': is_unicode,
+            'segments': segments
+        })
+        if COUNTRY_COLUMN in chunk:
+            frame['country'] = chunk[COUNTRY_COLUMN]
+        yield frame
+
+# Function to run validation, personalization and sizing chunk by chunk
+def prepare_contact_chunks(chunks, phone_column, country_code, expected_length, name_column=None, template=None, default_message="", stop_text=None, org_prefix=None, transliterate=False, remove_duplicates=True, stats=None, shard=None, suppressed=None, numbering=None, stop_texts=None):
+    """
+    Validate, dedupe, personalize and size contacts as chunks stream in.
+    Messages are rendered a whole chunk at a time and each one gets its own
+    encoding (GSM-7 or UCS-2) and SMS part count.
+    Yields: one DataFrame per chunk with columns original, formatted, name, message, unicode, segments
+    If a `stats` dict is given, its total/invalid/duplicates/invalid_sample entries are updated
+    (for the whole file, not just the shard).
+    With shard=(shard_index, shard_count) only numbers hashing to that shard are kept;
+    a number always lands in the same shard, so duplicates never cross shards.
+    Numbers in a `suppressed` SuppressionIndex are dropped and counted in stats['suppressed'].
+    With a `numbering` PrefixTrie each number's country is detected and added as a
+    country column, and `stop_texts` can give each country its own opt-out text.
+    """
+    validated = validate_contact_chunks(chunks, phone_column, country_code, expected_length, name_column=name_column,
+                                        remove_duplicates=remove_duplicates, stats=stats, numbering=numbering)
+    yield from render_contact_chunks(validated, phone_column, name_column=name_column, template=template,
+                                     default_message=default_message, stop_text=stop_text, org_prefix=org_prefix,
+                                     transliterate=transliterate, stats=stats, shard=shard, suppressed=suppressed,
+                                     stop_texts=stop_texts)
+
+# Function to validate contacts chunk by chunk
+def iter_formatted_contacts(chunks, phone_column, country_code, expected_length, **options):
+    """
+    Stream ready-to-send contacts one at a time (see prepare_contact_chunks for options).
+    Yields: {'original', 'formatted', 'name', 'message', 'unicode', 'segments'} for every valid contact
+    """
+    for frame in prepare_contact_chunks(chunks, phone_column, country_code, expected_length, **options):
+        yield from frame.to_dict('records')
+
+# Function to count and size contacts without holding them in memory
+def scan_contacts(chunks, phone_column, country_code, expected_length, **options):
+    """
+    Run a whole contact file through prepare_contact_chunks() keeping only totals.
+    Returns: dict with total, valid, invalid, duplicates, suppressed, invalid_sample, messages,
+    segments, unicode_messages, transliterable (UCS-2 messages that would
+    fit GSM-7 after transliteration) and countries (messages per detected country)
+    """
+    stats = new_contact_stats()
+    frames = prepare_contact_chunks(chunks, phone_column, country_code, expected_length, stats=stats, **options)
+    return summarize_contact_frames(frames, stats, options)
+
+# Function to start an empty stats dict for scan_contacts()
+def new_contact_stats():
+    return {'total': 0, 'invalid': 0, 'duplicates': 0, 'suppressed': 0, 'invalid_sample': [],
+            'messages': 0, 'segments': 0, 'unicode_messages': 0, 'transliterable': 0, 'countries': {}}
+
+# Function to add up prepared contact frames
+def summarize_contact_frames(frames, stats, options):
+    """Add message, part and encoding totals of prepared frames to `stats`. Returns: stats"""
+    org_prefix = options.get('org_prefix')
+    for frame in frames:
+        stats['messages'] += len(frame)
+        stats['segments'] += int(frame['segments'].sum())
+        if 'country' in frame:
+            for country, count in frame['country'].value_counts().items():
+                stats['countries'][country] = stats['countries'].get(country, 0) + int(count)
+        unicode_messages = frame['message'][frame['unicode']]
+        stats['unicode_messages'] += len(unicode_messages)
+        if len(unicode_messages) and not options.get('transliterate'):
+            transliterated = transliterate_gsm7(unicode_messages)
+            still_unicode, _ = count_sms_segments_column(f"{org_prefix}: " + transliterated if org_prefix else transliterated)
+            stats['transliterable'] += int((~still_unicode).sum())
+    stats['valid'] = stats['total'] - stats['invalid']
+    return stats
@@ -0,0 +1,112 @@
+"""Concurrent send engine."""
+import heapq
+import itertools
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from .metrics import QUEUE_DEPTH
+
+# Jobs read ahead of the workers so every lane has work while one lane is at capacity
+LANE_READ_AHEAD = 10000
+
+# Function to run sends on a worker pool
+def send_concurrently(jobs, send_func, rate_limiter, max_workers=8, skip=None, retry=None, lane_of=None,
+                      lane_limiters=None):
+    """
+    Call send_func(job) for every job on a pool of worker threads, paced by rate_limiter.
+    Yields (job, result) in completion order. At most max_workers * 2 jobs are
+    queued at a time, so large contact lists are pulled from `jobs` lazily.
+    If skip(job) returns a result, that job is yielded straight away without
+    using a worker or a rate limiter token (e.g. sends already done).
+    If retry(job, result) returns a delay in seconds, the job is sent again once
+    the delay has passed instead of being yielded; due retries go ahead of new jobs.
+    With lane_of(job) (e.g. the destination country), each lane is also paced by its
+    own limiter from lane_limiters (if it has one) and may only hold an equal share
+    of the workers among the lanes that have work, so a slow lane never ties up the
+    others while a lone lane gets them all; up to LANE_READ_AHEAD jobs are read
+    ahead to keep every lane busy.
+    """
+    lane_limiters = lane_limiters or {}
+
+    def run(job, lane):
+        limiter = lane_limiters.get(lane)
+        if limiter is not None:
+            limiter.acquire()
+        rate_limiter.acquire()
+        return send_func(job)
+
+    capacity = max_workers * 2
+    if lane_of is None:
+        lane_of = lambda job: None
+        read_ahead = 0
+    else:
+        read_ahead = LANE_READ_AHEAD
+
+    job_iter = iter(jobs)
+    pending = {}  # future -> (lane, job)
+    in_flight = {}  # lane -> jobs pending
+    ready = {}  # lane -> deque of jobs waiting for a free slot in their lane
+    buffered = 0
+    delayed = []  # Heap of (due time, sequence, job)
+    sequence = itertools.count()
+    exhausted = False
+
+    def share(lane):
+        # Lanes with nothing queued or in flight leave their slots to the busy ones
+        if not read_ahead:
+            return capacity
+        busy = {other for other, count in in_flight.items() if count} | {other for other, queue in ready.items() if queue}
+        busy.add(lane)
+        return max(1, max_workers // len(busy))
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        def submit(lane, job):
+            pending[executor.submit(run, job, lane)] = (lane, job)
+            in_flight[lane] = in_flight.get(lane, 0) + 1
+
+        while True:
+            now = time.monotonic()
+            while delayed and delayed[0][0] <= now:
+                job = heapq.heappop(delayed)[2]
+                ready.setdefault(lane_of(job), deque()).appendleft(job)
+                buffered += 1
+            # Read ahead before handing out worker slots, so every lane with work gets its share
+            while not exhausted and len(pending) + buffered < capacity + read_ahead:
+                try:
+                    job = next(job_iter)
+                except StopIteration:
+                    exhausted = True
+                    break
+                if skip is not None:
+                    result = skip(job)
+                    if result is not None:
+                        yield job, result
+                        continue
+                ready.setdefault(lane_of(job), deque()).append(job)
+                buffered += 1
+
+            for lane, queue in ready.items():
+                while queue and in_flight.get(lane, 0) < share(lane) and len(pending) < capacity:
+                    submit(lane, queue.popleft())
+                    buffered -= 1
+
+            QUEUE_DEPTH.set(len(pending) + len(delayed) + buffered)
+            if not pending and not delayed:
+                break
+
+            # Wake up for whichever comes first: a finished send or a due retry
+            timeout = max(0.0, delayed[0][0] - time.monotonic()) if delayed else None
+            if not pending:
+                time.sleep(timeout)
+                continue
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                lane, job = pending.pop(future)
+                in_flight[lane] -= 1
+                result = future.result()
+                delay = retry(job, result) if retry is not None else None
+                if delay is not None:
+                    heapq.heappush(delayed, (time.monotonic() + delay, next(sequence), job))
+                else:
+                    yield job, result
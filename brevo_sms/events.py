@@ -0,0 +1,379 @@
+"""Local delivery-event store and the background status reconciler."""
+import queue
+import re
+import sqlite3
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, timedelta, timezone
+
+from .client import fetch_sms_events
+from .metrics import STATUS_PENDING, stage
+from .status import FINAL_EVENTS, SUPPRESSION_EVENTS
+from .storage import data_path
+
+# Event sources, stored with each event so the sync offset only counts events the API returned
+SOURCE_API = "api"
+SOURCE_WEBHOOK = "webhook"
+
+# Function to write event dates from the API and from webhooks the same way
+def normalize_event_date(value, utc_offset=None):
+    """
+    Rewrite an event date as ISO 8601 with milliseconds and a UTC offset
+    ("2026-10-17T10:15:02.000+05:30"), the events API's format, so the same
+    event from both sources has the same date. A date without an offset is
+    taken in `utc_offset` (a datetime.timezone; default: this computer's), and
+    with utc_offset an aware date is moved to it. Unparseable dates are kept as given.
+    """
+    try:
+        parsed = datetime.fromisoformat(str(value).strip())
+    except ValueError:
+        return value
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=utc_offset) if utc_offset is not None else parsed.astimezone()
+    elif utc_offset is not None:
+        parsed = parsed.astimezone(utc_offset)
+    return parsed.isoformat(timespec="milliseconds")
+
+# Local, incrementally synced delivery event store
+class EventStore:
+    """
+    SQLite copy of Brevo SMS delivery events, indexed by messageId and phone number.
+    sync() pages through the events API starting from the last seen event, so
+    status checks become local lookups instead of one API call per message.
+    Webhook events are dated in the UTC offset of the latest API event, so an
+    event arriving both ways is stored once.
+    """
+    PAGE_SIZE = 100
+    INITIAL_DAYS = 7  # How far back the first sync reaches
+    OVERLAP = 100  # Events re-read on each sync to cover late arrivals; duplicates are ignored
+
+    def __init__(self, path=None):
+        if path is None:
+            path = data_path("sms_events.db")
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS sms_events (
+                    message_id TEXT NOT NULL,
+                    phone_number TEXT,
+                    event TEXT NOT NULL,
+                    reason TEXT,
+                    date TEXT NOT NULL,
+                    tag TEXT,
+                    source TEXT,
+                    UNIQUE (message_id, event, date)
+                );
+                CREATE INDEX IF NOT EXISTS idx_sms_events_message_id ON sms_events (message_id);
+                CREATE INDEX IF NOT EXISTS idx_sms_events_phone_number ON sms_events (phone_number);
+                CREATE INDEX IF NOT EXISTS idx_sms_events_date ON sms_events (date);
+                CREATE TABLE IF NOT EXISTS sync_state (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                );
+                CREATE TABLE IF NOT EXISTS suppressions (
+                    phone_number TEXT PRIMARY KEY,
+                    event TEXT NOT NULL,
+                    reason TEXT,
+                    date TEXT NOT NULL
+                );
+            """)
+            # Stores created before events had a source: webhook dates were stored without an offset
+            if "source" not in [row[1] for row in self._conn.execute("PRAGMA table_info(sms_events)")]:
+                self._conn.execute("ALTER TABLE sms_events ADD COLUMN source TEXT")
+                self._conn.execute("UPDATE sms_events SET source = CASE WHEN length(date) = 19 THEN ? ELSE ? END",
+                                   (SOURCE_WEBHOOK, SOURCE_API))
+            utc_offset = self._get_state("utc_offset")
+            self._utc_offset = _parse_utc_offset(utc_offset) if utc_offset else None
+            # Stores created before suppressions existed: index the events already stored
+            if self._get_state("suppressions_indexed") is None:
+                rows = self._conn.execute(
+                    f"SELECT phone_number, event, reason, date FROM sms_events "
+                    f"WHERE event IN ({','.join('?' * len(SUPPRESSION_EVENTS))})",
+                    sorted(SUPPRESSION_EVENTS)
+                ).fetchall()
+                self._add_suppressions(rows)
+                self._conn.execute("INSERT OR REPLACE INTO sync_state (key, value) VALUES ('suppressions_indexed', '1')")
+
+    def _get_state(self, key):
+        row = self._conn.execute("SELECT value FROM sync_state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def add_events(self, events, source=SOURCE_API):
+        """
+        Insert events (their dates are normalized in place, see normalize_event_date()),
+        ignoring ones already stored. An API event already received by webhook is
+        marked as API-sourced. Returns number of new rows
+        """
+        utc_offset = self._utc_offset if source == SOURCE_WEBHOOK else None
+        for e in events:
+            if e.get("date"):
+                e["date"] = normalize_event_date(e["date"], utc_offset)
+        rows = [
+            (
+                str(e.get("messageId")),
+                e.get("phoneNumber"),
+                e.get("event", ""),
+                e.get("reason", ""),
+                e.get("date", ""),
+                e.get("tag", ""),
+                source
+            )
+            for e in events
+        ]
+        with self._lock, self._conn:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO sms_events (message_id, phone_number, event, reason, date, tag, source) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            added = self._conn.total_changes - before
+            if source == SOURCE_API and added < len(rows):
+                self._conn.executemany(
+                    "UPDATE sms_events SET source = ? WHERE message_id = ? AND event = ? AND date = ? AND source != ?",
+                    ((SOURCE_API, message_id, event, event_date, SOURCE_API)
+                     for message_id, _, event, _, event_date, _, _ in rows)
+                )
+            self._add_suppressions((phone, event, reason, event_date) for _, phone, event, reason, event_date, _, _ in rows
+                                   if event in SUPPRESSION_EVENTS)
+            return added
+
+    def _add_suppressions(self, rows):
+        """Record (phone_number, event, reason, date) suppression events, keeping the latest per number"""
+        self._conn.executemany(
+            "INSERT INTO suppressions (phone_number, event, reason, date) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (phone_number) DO UPDATE SET event = excluded.event, reason = excluded.reason, date = excluded.date "
+            "WHERE excluded.date > suppressions.date",
+            # Numbers are stored as digits only, the way contact files are normalized
+            ((re.sub(r'\D', '', str(phone)), event, reason, event_date) for phone, event, reason, event_date in rows if phone)
+        )
+
+    def suppressed_numbers(self):
+        """Returns: list of numbers (digits only) that hard-bounced, were blocked or unsubscribed"""
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT phone_number FROM suppressions")]
+
+    def suppression_version(self):
+        """Changes whenever the suppression list does, e.g. to refresh a cached SuppressionIndex"""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*), MAX(date) FROM suppressions").fetchone()
+
+    def sync(self, client):
+        """
+        Pull events newer than the last sync, paging with offset and date cursors.
+        Returns the number of new events stored, or None if the API call failed.
+        """
+        with self._lock:
+            cursor_day = self._get_state("cursor_day")
+            if cursor_day is None:
+                cursor_day = (date.today() - timedelta(days=self.INITIAL_DAYS)).isoformat()
+            # Events are returned oldest first, so everything the API already returned
+            # for the cursor day can be skipped with the offset (webhook events don't count)
+            stored = self._conn.execute(
+                "SELECT COUNT(*) FROM sms_events WHERE date >= ? AND date < ? AND source = ?",
+                (cursor_day, (date.fromisoformat(cursor_day) + timedelta(days=1)).isoformat(), SOURCE_API)
+            ).fetchone()[0]
+        offset = max(0, stored - self.OVERLAP)
+        end_day = date.today().isoformat()
+
+        new_count = 0
+        last_day = cursor_day
+        while True:
+            events = fetch_sms_events(
+                client,
+                limit=self.PAGE_SIZE,
+                offset=offset,
+                start_date=cursor_day,
+                end_date=end_day,
+                sort="asc"
+            )
+            if events is None:
+                return None if new_count == 0 else new_count
+            new_count += self.add_events(events)
+            for event in events:
+                last_day = max(last_day, event.get("date", "")[:10])
+            if events:
+                self._learn_utc_offset(events[-1].get("date"))
+            if len(events) < self.PAGE_SIZE:
+                break
+            offset += self.PAGE_SIZE
+
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sync_state (key, value) VALUES ('cursor_day', ?)",
+                (last_day,)
+            )
+        return new_count
+
+    def _learn_utc_offset(self, event_date):
+        """Keep the UTC offset of an API event date, used to date webhook events the same way"""
+        try:
+            utc_offset = datetime.fromisoformat(str(event_date)).utcoffset()
+        except ValueError:
+            return
+        if utc_offset is None or (self._utc_offset is not None and self._utc_offset.utcoffset(None) == utc_offset):
+            return
+        self._utc_offset = timezone(utc_offset)
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO sync_state (key, value) VALUES ('utc_offset', ?)",
+                               (str(utc_offset.total_seconds()),))
+
+    def latest_events(self, message_ids):
+        """
+        Look up the most recent event for each message ID.
+        Returns: dict of message_id -> event dict (IDs without events are omitted)
+        """
+        ids = [str(m) for m in message_ids]
+        latest = {}
+        with self._lock:
+            for start in range(0, len(ids), 500):
+                batch = ids[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT message_id, phone_number, event, reason, date, tag FROM sms_events "
+                    f"WHERE message_id IN ({placeholders}) ORDER BY date, rowid",
+                    batch
+                ).fetchall()
+                for message_id, phone_number, event, reason, event_date, event_tag in rows:
+                    latest[message_id] = {
+                        "messageId": message_id,
+                        "phoneNumber": phone_number,
+                        "event": event,
+                        "reason": reason,
+                        "date": event_date,
+                        "tag": event_tag
+                    }
+        return latest
+
+    def events_for_phone(self, phone_number):
+        """All stored events for a phone number, newest first"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT message_id, event, reason, date FROM sms_events WHERE phone_number = ? ORDER BY date DESC, rowid DESC",
+                (str(phone_number),)
+            ).fetchall()
+        return [{"messageId": m, "event": e, "reason": r, "date": d} for m, e, r, d in rows]
+
+# Function to read a UTC offset saved by EventStore._learn_utc_offset()
+def _parse_utc_offset(seconds):
+    try:
+        return timezone(timedelta(seconds=float(seconds)))
+    except (TypeError, ValueError):
+        return None
+
+# How often the reconciler pulls events, and how long to wait for them after sending
+STATUS_POLL_INTERVAL = 5.0
+STATUS_SETTLE_SECONDS = 30.0
+
+
+# Events kept for messages not tracked yet: a webhook can arrive before the send returns
+EARLY_EVENTS_SIZE = 10000
+
+# Background delivery-status reconciler
+class StatusReconciler:
+    """
+    Syncs the event store on a background thread, once per interval, and
+    matches new events to tracked messages by messageId. The send loop never
+    waits on status checks; call drain() from the UI thread to collect updates.
+    With a WebhookReceiver, events pushed by Brevo are matched as they arrive
+    instead, and the events API is never polled.
+    """
+    def __init__(self, client, event_store, interval=10.0, receiver=None):
+        self.client = client
+        self.event_store = event_store
+        self.interval = interval
+        self.receiver = receiver
+        self._tracked = {}  # messageId -> last event type seen
+        self._early = OrderedDict()  # messageId -> webhook events that came before track()
+        self._subscription = None
+        self._updates = queue.Queue()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        if self.receiver is not None:
+            self._subscription = self.receiver.subscribe()
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._subscription is not None:
+            self.receiver.unsubscribe(self._subscription)
+
+    def track(self, message_id):
+        """Start watching a message accepted by the send API"""
+        message_id = str(message_id)
+        with self._lock:
+            self._tracked[message_id] = None
+            for event in self._early.pop(message_id, []):
+                if message_id in self._tracked:
+                    self._apply(message_id, event)
+
+    def pending_count(self):
+        """Number of tracked messages that have not reached a final event"""
+        with self._lock:
+            return len(self._tracked)
+
+    def drain(self):
+        """Return all (message_id, event) updates found since the last call"""
+        updates = []
+        while True:
+            try:
+                updates.append(self._updates.get_nowait())
+            except queue.Empty:
+                return updates
+
+    def _apply(self, message_id, event):
+        # Called with the lock held, for a tracked message
+        event_type = event.get("event", "")
+        if self._tracked[message_id] != event_type:
+            self._tracked[message_id] = event_type
+            self._updates.put((message_id, event))
+        if event_type in FINAL_EVENTS:
+            del self._tracked[message_id]
+
+    def poll_once(self):
+        """Sync new events and queue an update for every tracked message whose status changed"""
+        with self._lock:
+            if not self._tracked:
+                return
+            tracked_ids = list(self._tracked)
+        STATUS_PENDING.set(len(tracked_ids))
+        with stage("status_sync", tracked=len(tracked_ids)):
+            synced = self.event_store.sync(self.client)
+        if synced is None:
+            return
+        latest = self.event_store.latest_events(tracked_ids)
+
+        with self._lock:
+            for message_id, event in latest.items():
+                if message_id in self._tracked:
+                    self._apply(message_id, event)
+
+    def push_events(self, events):
+        """Match events received by webhook (already stored) to tracked messages"""
+        with self._lock:
+            for event in events:
+                message_id = str(event.get("messageId"))
+                if message_id in self._tracked:
+                    self._apply(message_id, event)
+                else:
+                    self._early.setdefault(message_id, []).append(event)
+                    self._early.move_to_end(message_id)
+                    while len(self._early) > EARLY_EVENTS_SIZE:
+                        self._early.popitem(last=False)
+            STATUS_PENDING.set(len(self._tracked))
+
+    def _run(self):
+        if self._subscription is None:
+            while not self._stop.wait(self.interval):
+                self.poll_once()
+            return
+        while not self._stop.is_set():
+            try:
+                events = self._subscription.get(timeout=1.0)
+            except queue.Empty:
+                continue
+            self.push_events(events)
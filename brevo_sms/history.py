@@ -0,0 +1,187 @@
+"""Persistent, size- and age-bounded history of campaign results."""
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+from .results import SendResult
+from .status import Status
+from .storage import data_path
+
+# Retention limits: oldest results go first once either is exceeded
+HISTORY_MAX_ROWS = 1_000_000
+HISTORY_MAX_AGE_DAYS = 90
+HISTORY_PAGE_SIZE = 100
+INSERT_BATCH_ROWS = 5000
+
+RESULT_FIELDS = ("name", "original", "formatted", "message", "status", "message_id", "status_code", "error",
+                 "can_retry", "timestamp", "attempts")
+
+# SQLite store of past campaigns and their results
+class CampaignHistory:
+    """
+    Finished campaigns and their final results, kept on disk across sessions
+    and queried a page at a time, so the app only holds what it displays.
+    After each campaign is added, results older than max_age_days are dropped,
+    then the oldest results beyond max_rows.
+    """
+    def __init__(self, path=None, max_rows=HISTORY_MAX_ROWS, max_age_days=HISTORY_MAX_AGE_DAYS):
+        if path is None:
+            path = data_path("history.db")
+        self.max_rows = max_rows
+        self.max_age_days = max_age_days
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS history_campaigns (
+                    campaign_id TEXT PRIMARY KEY,
+                    name TEXT,
+                    sender TEXT,
+                    created_at TEXT NOT NULL,
+                    total INTEGER NOT NULL DEFAULT 0
+                );
+                CREATE INDEX IF NOT EXISTS idx_history_campaigns_created ON history_campaigns (created_at);
+                CREATE TABLE IF NOT EXISTS history_results (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    campaign_id TEXT NOT NULL,
+                    name TEXT,
+                    original TEXT,
+                    formatted TEXT,
+                    message TEXT,
+                    status TEXT NOT NULL,
+                    message_id TEXT,
+                    status_code INTEGER,
+                    error TEXT,
+                    can_retry INTEGER NOT NULL,
+                    timestamp TEXT NOT NULL,
+                    attempts INTEGER NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_history_results_campaign ON history_results (campaign_id, status);
+                CREATE INDEX IF NOT EXISTS idx_history_results_status ON history_results (status, timestamp);
+                CREATE INDEX IF NOT EXISTS idx_history_results_timestamp ON history_results (timestamp);
+            """)
+
+    def add_campaign(self, campaign_id, results, name=None, sender=None):
+        """
+        Store the final results of a campaign (replacing any earlier copy of it),
+        then apply the retention limits.
+        Returns: number of results stored
+        """
+        count = 0
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM history_results WHERE campaign_id = ?", (campaign_id,))
+            batch = []
+            for result in results:
+                batch.append((campaign_id, result.name, result.original, result.formatted, result.message,
+                              result.status.name, None if result.message_id is None else str(result.message_id),
+                              result.status_code, result.error, int(bool(result.can_retry)), result.timestamp,
+                              result.attempts))
+                if len(batch) >= INSERT_BATCH_ROWS:
+                    count += self._insert(batch)
+            count += self._insert(batch)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO history_campaigns (campaign_id, name, sender, created_at, total) VALUES (?, ?, ?, ?, ?)",
+                (campaign_id, name, sender, _now(), count)
+            )
+        self.prune()
+        return count
+
+    def _insert(self, batch):
+        self._conn.executemany(
+            f"INSERT INTO history_results (campaign_id, {', '.join(RESULT_FIELDS)}) VALUES ({', '.join('?' * 12)})",
+            batch
+        )
+        count = len(batch)
+        batch.clear()
+        return count
+
+    def prune(self):
+        """Drop results past the age limit, then the oldest beyond the row limit. Returns rows deleted"""
+        with self._lock, self._conn:
+            before = self._conn.total_changes
+            if self.max_age_days is not None:
+                cutoff = (datetime.now() - timedelta(days=self.max_age_days)).strftime("%Y-%m-%d %H:%M:%S")
+                self._conn.execute("DELETE FROM history_results WHERE timestamp < ?", (cutoff,))
+            if self.max_rows is not None:
+                excess = self._conn.execute("SELECT COUNT(*) FROM history_results").fetchone()[0] - self.max_rows
+                if excess > 0:
+                    self._conn.execute(
+                        "DELETE FROM history_results WHERE id IN (SELECT id FROM history_results ORDER BY id LIMIT ?)",
+                        (excess,)
+                    )
+            deleted = self._conn.total_changes - before
+            if deleted:
+                self._conn.execute(
+                    "DELETE FROM history_campaigns WHERE campaign_id NOT IN (SELECT DISTINCT campaign_id FROM history_results)"
+                )
+        return deleted
+
+    def campaigns(self, limit=HISTORY_PAGE_SIZE, offset=0):
+        """
+        Stored campaigns, newest first.
+        Returns: list of dicts with campaign_id, name, sender, created_at, total
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT campaign_id, name, sender, created_at, total FROM history_campaigns "
+                "ORDER BY created_at DESC LIMIT ? OFFSET ?",
+                (limit, offset)
+            ).fetchall()
+        return [dict(zip(("campaign_id", "name", "sender", "created_at", "total"), row)) for row in rows]
+
+    def _where(self, campaign_id, status, since, until):
+        clauses, params = [], []
+        if campaign_id:
+            clauses.append("campaign_id = ?")
+            params.append(campaign_id)
+        if status:
+            statuses = [status] if isinstance(status, (str, Status)) else list(status)
+            names = [value.name if isinstance(value, Status) else value for value in statuses]
+            clauses.append(f"status IN ({','.join('?' * len(names))})")
+            params.extend(names)
+        if since:
+            clauses.append("timestamp >= ?")
+            params.append(str(since))
+        if until:
+            clauses.append("timestamp < ?")
+            params.append(str(until))
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def count(self, campaign_id=None, status=None, since=None, until=None):
+        """Number of stored results matching the filters (see results())"""
+        where, params = self._where(campaign_id, status, since, until)
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM history_results{where}", params).fetchone()[0]
+
+    def status_counts(self, campaign_id=None, since=None, until=None):
+        """Returns: dict of Status -> number of results"""
+        where, params = self._where(campaign_id, None, since, until)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT status, COUNT(*) FROM history_results{where} GROUP BY status", params
+            ).fetchall()
+        return {Status[status]: count for status, count in rows}
+
+    def results(self, campaign_id=None, status=None, since=None, until=None, limit=HISTORY_PAGE_SIZE, offset=0):
+        """
+        One page of stored results, oldest first.
+        status: a Status (or its name) or a list of them; since/until: 'YYYY-MM-DD[ HH:MM:SS]'
+        Returns: list of SendResult
+        """
+        where, params = self._where(campaign_id, status, since, until)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(RESULT_FIELDS)} FROM history_results{where} ORDER BY id LIMIT ? OFFSET ?",
+                (*params, limit, offset)
+            ).fetchall()
+        results = []
+        for row in rows:
+            fields = dict(zip(RESULT_FIELDS, row))
+            fields["status"] = Status[fields["status"]]
+            fields["can_retry"] = bool(fields["can_retry"])
+            results.append(SendResult(**fields))
+        return results
+
+def _now():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -0,0 +1,167 @@
+"""Durable campaign journal: checkpoints every send so interrupted campaigns resume without double-sending."""
+import hashlib
+import json
+import sqlite3
+import threading
+import uuid
+from datetime import datetime
+
+from .storage import data_path
+
+# Send states. "pending" is written before the API call and replaced once Brevo answers;
+# a send still pending when a campaign resumes may or may not have gone out
+SEND_PENDING = "pending"
+SEND_SENT = "sent"
+SEND_FAILED = "failed"
+SEND_UNCONFIRMED = "unconfirmed"
+
+# States that are never sent again when a campaign resumes
+COMPLETED_STATES = (SEND_SENT, SEND_UNCONFIRMED)
+
+# Function to hash an uploaded file without reading it into memory at once
+def file_digest(contact_file, block_size=1 << 20):
+    """SHA-256 of a file-like object's contents"""
+    contact_file.seek(0)
+    digest = hashlib.sha256()
+    for block in iter(lambda: contact_file.read(block_size), b""):
+        digest.update(block)
+    contact_file.seek(0)
+    return digest.hexdigest()
+
+# Function to identify a campaign by its inputs
+def campaign_fingerprint(contact_file, **settings):
+    """
+    Hash of the contact file and the settings that shape the messages (sender,
+    country, template, opt-out text...). Re-uploading the same file with the
+    same settings finds the interrupted campaign again.
+    """
+    digest = hashlib.sha256(file_digest(contact_file).encode())
+    digest.update(json.dumps(settings, sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+# Function to build the idempotency key of one send
+def idempotency_key(campaign_id, recipient, content):
+    """Key for one message: campaign + recipient + content hash"""
+    content_hash = hashlib.sha256(str(content).encode()).hexdigest()
+    return hashlib.sha256(f"{campaign_id}\n{recipient}\n{content_hash}".encode()).hexdigest()
+
+# Checkpointed record of campaign sends
+class CampaignJournal:
+    """
+    SQLite job table with one row per send, keyed by idempotency key.
+    Each send is checkpointed twice: as pending before the API call and as
+    sent/failed once Brevo answers, each in its own committed transaction.
+    """
+    def __init__(self, path=None):
+        if path is None:
+            path = data_path("campaigns.db")
+        # Shard worker processes share the file, so wait out each other's write locks
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            # WAL keeps per-send commits cheap while staying crash-safe
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS campaigns (
+                    campaign_id TEXT PRIMARY KEY,
+                    fingerprint TEXT NOT NULL,
+                    name TEXT,
+                    sender TEXT,
+                    status TEXT NOT NULL,
+                    created_at TEXT NOT NULL,
+                    finished_at TEXT
+                );
+                CREATE INDEX IF NOT EXISTS idx_campaigns_fingerprint ON campaigns (fingerprint, status);
+                CREATE TABLE IF NOT EXISTS sends (
+                    idempotency_key TEXT PRIMARY KEY,
+                    campaign_id TEXT NOT NULL,
+                    recipient TEXT NOT NULL,
+                    state TEXT NOT NULL,
+                    data TEXT NOT NULL,
+                    updated_at TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_sends_campaign ON sends (campaign_id, state);
+            """)
+
+    def find_unfinished(self, fingerprint):
+        """
+        Look up an interrupted campaign with this fingerprint.
+        Returns: dict with campaign_id, name, created_at and completed (messages not to be re-sent), or None
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT campaign_id, name, created_at FROM campaigns WHERE fingerprint = ? AND status = 'running' "
+                "ORDER BY created_at DESC LIMIT 1",
+                (fingerprint,)
+            ).fetchone()
+            if row is None:
+                return None
+            # Pending sends count too: they become unconfirmed on resume
+            completed = self._conn.execute(
+                "SELECT COUNT(*) FROM sends WHERE campaign_id = ? AND state != ?",
+                (row[0], SEND_FAILED)
+            ).fetchone()[0]
+        return {"campaign_id": row[0], "name": row[1], "created_at": row[2], "completed": completed}
+
+    def start_campaign(self, fingerprint, name=None, sender=None):
+        """Create a new campaign. Returns its campaign_id"""
+        campaign_id = uuid.uuid4().hex
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO campaigns (campaign_id, fingerprint, name, sender, status, created_at) VALUES (?, ?, ?, ?, 'running', ?)",
+                (campaign_id, fingerprint, name, sender, _now())
+            )
+        return campaign_id
+
+    def finish_campaign(self, campaign_id, status="finished"):
+        """Mark a campaign finished (or 'abandoned'), so the same inputs start a new one"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE campaigns SET status = ?, finished_at = ? WHERE campaign_id = ?",
+                (status, _now(), campaign_id)
+            )
+
+    def resume(self, campaign_id):
+        """
+        Prepare a campaign for (re)starting: sends left pending by a crash are marked
+        unconfirmed, since Brevo may have accepted them.
+        Returns: set of idempotency keys that must not be sent again
+        """
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE sends SET state = ?, updated_at = ? WHERE campaign_id = ? AND state = ?",
+                (SEND_UNCONFIRMED, _now(), campaign_id, SEND_PENDING)
+            )
+            rows = self._conn.execute(
+                f"SELECT idempotency_key FROM sends WHERE campaign_id = ? AND state IN ({','.join('?' * len(COMPLETED_STATES))})",
+                (campaign_id, *COMPLETED_STATES)
+            ).fetchall()
+        return {key for (key,) in rows}
+
+    def begin(self, campaign_id, key, recipient, data):
+        """Checkpoint a send as pending, right before the API call"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sends (idempotency_key, campaign_id, recipient, state, data, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, campaign_id, str(recipient), SEND_PENDING, json.dumps(data, default=str), _now())
+            )
+
+    def finish(self, key, success, row):
+        """Checkpoint the outcome of a send with its result row"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE sends SET state = ?, data = ?, updated_at = ? WHERE idempotency_key = ?",
+                (SEND_SENT if success else SEND_FAILED, json.dumps(row, default=str), _now(), key)
+            )
+
+    def get(self, key):
+        """Returns: (state, data dict) of a journaled send, or (None, None)"""
+        with self._lock:
+            row = self._conn.execute("SELECT state, data FROM sends WHERE idempotency_key = ?", (key,)).fetchone()
+        if row is None:
+            return None, None
+        return row[0], json.loads(row[1])
+
+def _now():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -0,0 +1,184 @@
+"""In-process metrics (Prometheus text format) and optional OpenTelemetry spans for the send pipeline."""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    from opentelemetry import trace  # Optional: spans are only recorded when installed and configured
+except ImportError:
+    trace = None
+
+# Latency buckets in seconds, from a fast local call to a slow API timeout
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Address the metrics endpoint listens on unless told otherwise: it has no authentication
+METRICS_HOST = "127.0.0.1"
+
+# One named metric with a value per label combination
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(label, "")) for label in self.labels)
+
+    def _label_text(self, key, extra=()):
+        pairs = list(zip(self.labels, key)) + list(extra)
+        if not pairs:
+            return ""
+        escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+        return "{" + ",".join(f'{label}="{value}"' for (label, _), value in zip(pairs, escaped)) + "}"
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{self._label_text(key)} {value:g}")
+        return lines
+
+class Counter(_Metric):
+    """Monotonic count, e.g. responses per status code"""
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(_Metric):
+    """Value that goes up and down, e.g. the current send rate"""
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Histogram(_Metric):
+    """Distribution of durations in fixed buckets, e.g. API latency per endpoint"""
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[index] += 1
+            self._values[key] = (counts, total + value)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            for key, (counts, total) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                    lines.append(f"{self.name}_bucket{self._label_text(key, [('le', le)])} {cumulative}")
+                lines.append(f"{self.name}_sum{self._label_text(key)} {total:g}")
+                lines.append(f"{self.name}_count{self._label_text(key)} {cumulative}")
+        return lines
+
+# Collection of metrics rendered together
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labels=()):
+        return self._add(Counter(name, documentation, labels))
+
+    def gauge(self, name, documentation, labels=()):
+        return self._add(Gauge(name, documentation, labels))
+
+    def histogram(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, documentation, labels, buckets))
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+REGISTRY = MetricsRegistry()
+
+API_LATENCY = REGISTRY.histogram("brevo_api_request_duration_seconds", "Brevo API request latency", ("endpoint",))
+API_RESPONSES = REGISTRY.counter("brevo_api_responses_total", "Brevo API responses by HTTP status (0: network error)",
+                                 ("endpoint", "status"))
+SENDS = REGISTRY.counter("brevo_sms_sends_total", "Send outcomes: sent, failed, retry, dead_letter, skipped",
+                         ("outcome",))
+SEND_RATE = REGISTRY.gauge("brevo_sms_send_rate", "Current send rate limit in SMS per second")
+QUEUE_DEPTH = REGISTRY.gauge("brevo_sms_queue_depth", "Sends in flight or waiting for a worker or a retry")
+STATUS_PENDING = REGISTRY.gauge("brevo_sms_status_pending", "Sent messages still waiting for a final delivery event")
+WEBHOOK_EVENTS = REGISTRY.counter("brevo_sms_webhook_events_total", "Delivery events received by webhook", ("event",))
+STAGE_LATENCY = REGISTRY.histogram("brevo_sms_stage_duration_seconds",
+                                   "Time spent per pipeline stage (personalize, status_sync, status_check, render)",
+                                   ("stage",))
+
+# Function to open an OpenTelemetry span if tracing is available
+@contextmanager
+def span(name, **attributes):
+    """OpenTelemetry span around a block; does nothing unless opentelemetry is installed"""
+    if trace is None:
+        yield None
+        return
+    with trace.get_tracer("brevo_sms").start_as_current_span(name, attributes=attributes) as current:
+        yield current
+
+# Function to time one pipeline stage
+@contextmanager
+def stage(name, **attributes):
+    """Record a block's duration in STAGE_LATENCY and trace it as a span"""
+    started = time.perf_counter()
+    try:
+        with span(name, **attributes) as current:
+            yield current
+    finally:
+        STAGE_LATENCY.observe(time.perf_counter() - started, stage=name)
+
+# Function to serve the metrics over HTTP
+def serve_metrics(port, host=METRICS_HOST, registry=REGISTRY):
+    """
+    Serve GET /metrics from a background thread for Prometheus to scrape.
+    Anyone who can reach the port can read it, so it listens on loopback by default.
+    Returns: the running ThreadingHTTPServer (call shutdown() to stop it)
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # One line per scrape would drown the app's own output
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,355 @@
+"""Local stand-in for the Brevo SMS API, for load tests and benchmarks without spending credits.
+
+    python -m brevo_sms.mockserver --port 8025 --latency 0.05 --error-rate 0.01 --rate-limit 100
+    python -m brevo_sms send contacts.csv ... --base-url http://127.0.0.1:8025/v3
+    python -m brevo_sms.mockserver --webhook-url http://127.0.0.1:8030/brevo/sms  # and send with --webhook-port 8030
+"""
+import argparse
+import bisect
+import collections
+import heapq
+import itertools
+import json
+import random
+import threading
+import time
+from datetime import date, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import requests
+
+from .webhooks import webhook_payload
+
+# Mock Brevo API served from a background thread
+class MockBrevoServer:
+    """
+    Serves POST /v3/transactionalSMS/send and GET /v3/transactionalSMS/statistics/events,
+    plus the broadcast endpoints (contact folders, lists and imports, /processes,
+    /smsCampaigns and sendNow); a campaign reports every number sent once
+    event_delay has passed, with the same bounce rates.
+    - latency: seconds added to every request, with up to `jitter` more at random
+    - error_rate: share of sends answered with a 5xx
+    - rate_limit: sends allowed per second before answering 429 with Retry-After
+      and x-sib-ratelimit-* headers (0: unlimited)
+    - burst_every / burst_seconds: every burst_every seconds, answer all sends
+      with 429 for burst_seconds (0: no bursts)
+    - event_delay: seconds before an accepted message's delivery event is listed
+    - soft_bounce_rate / hard_bounce_rate: share of accepted messages that bounce
+    - webhook_url: also POST each delivery event there, like a Brevo webhook, once it is due
+    """
+    WEBHOOK_TICK = 0.05  # Seconds between checks for due events to post
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, jitter=0.0, error_rate=0.0, rate_limit=0,
+                 burst_every=0.0, burst_seconds=0.0, event_delay=0.0, soft_bounce_rate=0.0, hard_bounce_rate=0.0,
+                 webhook_url=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.burst_every = burst_every
+        self.burst_seconds = burst_seconds
+        self.event_delay = event_delay
+        self.soft_bounce_rate = soft_bounce_rate
+        self.hard_bounce_rate = hard_bounce_rate
+        self.webhook_url = webhook_url
+        self.counts = collections.Counter()
+        self._message_ids = itertools.count(1)
+        self._recent_sends = collections.deque()  # Accepted send times within the last second
+        self._scheduled = []  # Heap of (visible at, sequence, event) not listed yet
+        self._events = []  # Listed events, oldest first
+        self._event_dates = []  # Their dates, for bisecting date ranges
+        self._object_ids = itertools.count(1)
+        self._folders = {}  # id -> name
+        self._lists = {}  # id -> set of numbers
+        self._processes = {}  # id -> time the import completes
+        self._campaigns = {}  # id -> campaign payload, plus sent_at once sent
+        self._started = time.monotonic()
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), _make_handler(self))
+        self._httpd.daemon_threads = True
+        self._thread = None
+        self._webhook_thread = None
+        self._stopped = threading.Event()
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v3"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        if self.webhook_url:
+            self._webhook_thread = threading.Thread(target=self._post_webhooks, daemon=True)
+            self._webhook_thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def stats(self):
+        """Counters: requests, accepted, throttled, errors, events_listed"""
+        with self._lock:
+            return {**self.counts, "events_listed": len(self._events)}
+
+    def send(self, payload):
+        """
+        Handle one send request.
+        Returns: (status_code, body dict, headers dict)
+        """
+        now = time.monotonic()
+        with self._lock:
+            self.counts["requests"] += 1
+            while self._recent_sends and now - self._recent_sends[0] >= 1:
+                self._recent_sends.popleft()
+            headers = {}
+            if self.rate_limit:
+                reset = 1 - (now - self._recent_sends[0]) if self._recent_sends else 1
+                headers = {"x-sib-ratelimit-limit": str(self.rate_limit),
+                           "x-sib-ratelimit-remaining": str(max(0, self.rate_limit - len(self._recent_sends) - 1)),
+                           "x-sib-ratelimit-reset": f"{reset:.3f}"}
+            in_burst = self.burst_every and (now - self._started) % self.burst_every < self.burst_seconds
+            if in_burst or (self.rate_limit and len(self._recent_sends) >= self.rate_limit):
+                self.counts["throttled"] += 1
+                wait = self.burst_seconds - (now - self._started) % self.burst_every if in_burst else reset
+                return 429, {"code": "too_many_requests", "message": "Too many requests"}, {
+                    **headers, "Retry-After": str(max(1, round(wait)))}
+            if random.random() < self.error_rate:
+                self.counts["errors"] += 1
+                return random.choice((500, 502, 503)), {"message": "Service temporarily unavailable"}, headers
+            for field in ("sender", "recipient", "content"):
+                if not payload.get(field):
+                    self.counts["invalid"] += 1
+                    return 400, {"code": "missing_parameter", "message": f"{field} is missing"}, headers
+
+            self._recent_sends.append(now)
+            self.counts["accepted"] += 1
+            message_id = next(self._message_ids)
+            outcome = random.random()
+            if outcome < self.hard_bounce_rate:
+                event, reason = "hardBounces", "Invalid number"
+            elif outcome < self.hard_bounce_rate + self.soft_bounce_rate:
+                event, reason = "softBounces", "Handset unreachable"
+            else:
+                event, reason = "delivered", ""
+            heapq.heappush(self._scheduled, (now + self.event_delay, message_id, {
+                "messageId": message_id,
+                "phoneNumber": payload["recipient"],
+                "event": event,
+                "reason": reason,
+                "tag": payload.get("tag", ""),
+            }))
+        return 201, {"reference": f"mock-{message_id}", "messageId": message_id}, headers
+
+    def events(self, query):
+        """
+        List delivery events like the Brevo events API (limit, offset, startDate,
+        endDate, phoneNumber, sort).
+        Returns: (status_code, body dict, headers dict)
+        """
+        limit = int(query.get("limit", 50))
+        offset = int(query.get("offset", 0))
+        with self._lock:
+            self.counts["event_requests"] += 1
+            self._release_due()
+            start, end = 0, len(self._events)
+            if query.get("startDate") and query.get("endDate"):
+                start = bisect.bisect_left(self._event_dates, query["startDate"])
+                end_day = (date.fromisoformat(query["endDate"]) + timedelta(days=1)).isoformat()
+                end = bisect.bisect_left(self._event_dates, end_day)
+            events = self._events[start:end]
+        if query.get("phoneNumber"):
+            events = [event for event in events if event["phoneNumber"] == query["phoneNumber"]]
+        if query.get("sort") == "desc":
+            events = events[::-1]
+        return 200, {"events": events[offset:offset + limit]}, {}
+
+    def bulk(self, method, path, data):
+        """
+        Handle a broadcast endpoint (data: JSON body or query).
+        Returns: (status_code, body dict or None, headers dict), or None for other paths
+        """
+        parts = path.strip("/").split("/")[1:]  # Without the "v3" prefix
+        now = time.monotonic()
+        with self._lock:
+            if parts == ["contacts", "folders"]:
+                if method == "GET":
+                    folders = [{"id": folder_id, "name": name} for folder_id, name in self._folders.items()]
+                    offset, limit = int(data.get("offset", 0)), int(data.get("limit", 10))
+                    return 200, {"folders": folders[offset:offset + limit], "count": len(folders)}, {}
+                folder_id = next(self._object_ids)
+                self._folders[folder_id] = data.get("name", "")
+                return 201, {"id": folder_id}, {}
+            if parts == ["contacts", "lists"] and method == "POST":
+                if data.get("folderId") not in self._folders:
+                    return 400, {"code": "invalid_parameter", "message": "Folder ID does not exist"}, {}
+                list_id = next(self._object_ids)
+                self._lists[list_id] = set()
+                return 201, {"id": list_id}, {}
+            if parts == ["contacts", "import"] and method == "POST":
+                numbers = [line.strip() for line in data.get("fileBody", "").splitlines()[1:] if line.strip()]
+                for list_id in data.get("listIds", []):
+                    if list_id not in self._lists:
+                        return 404, {"code": "document_not_found", "message": "List ID does not exist"}, {}
+                    self._lists[list_id].update(numbers)
+                process_id = next(self._object_ids)
+                self._processes[process_id] = now + min(1.0, self.event_delay)
+                self.counts["imported"] += len(numbers)
+                return 202, {"processId": process_id}, {}
+            if len(parts) == 2 and parts[0] == "processes" and parts[1].isdigit() and method == "GET":
+                completes = self._processes.get(int(parts[1]))
+                if completes is None:
+                    return 404, {"code": "document_not_found", "message": "Process ID does not exist"}, {}
+                return 200, {"id": int(parts[1]), "status": "completed" if now >= completes else "in_process"}, {}
+            if parts == ["smsCampaigns"] and method == "POST":
+                for field in ("name", "sender", "content"):
+                    if not data.get(field):
+                        return 400, {"code": "missing_parameter", "message": f"{field} is missing"}, {}
+                campaign_id = next(self._object_ids)
+                self._campaigns[campaign_id] = dict(data)
+                return 201, {"id": campaign_id}, {}
+            if len(parts) >= 2 and parts[0] == "smsCampaigns" and parts[1].isdigit():
+                campaign = self._campaigns.get(int(parts[1]))
+                if campaign is None:
+                    return 404, {"code": "document_not_found", "message": "SMS Campaign ID does not exist"}, {}
+                numbers = set().union(*(self._lists.get(list_id, set())
+                                        for list_id in campaign["recipients"].get("listIds", [])))
+                if parts[2:] == ["sendNow"] and method == "POST":
+                    if "sent_at" in campaign:
+                        return 400, {"code": "invalid_parameter", "message": "Campaign already sent"}, {}
+                    campaign["sent_at"] = now
+                    self.counts["campaign_messages"] += len(numbers)
+                    return 204, None, {}
+                if not parts[2:] and method == "GET":
+                    total = len(numbers) if "sent_at" in campaign else 0
+                    done = "sent_at" in campaign and now - campaign["sent_at"] >= self.event_delay
+                    hard, soft = round(total * self.hard_bounce_rate), round(total * self.soft_bounce_rate)
+                    statistics = {"delivered": total - hard - soft if done else 0, "sent": total if done else 0,
+                                  "processing": 0 if done else total, "softBounced": soft if done else 0,
+                                  "hardBounced": hard if done else 0, "unsubscribed": 0, "answered": 0}
+                    status = "sent" if done else ("inProcess" if "sent_at" in campaign else "draft")
+                    return 200, {"id": int(parts[1]), "name": campaign["name"], "status": status,
+                                 "statistics": statistics}, {}
+        return None
+
+    def _release_due(self):
+        """Move events whose delay has passed to the listed events (lock held). Returns: them"""
+        # Events are dated when they become visible, so the list stays in date order
+        now = time.monotonic()
+        released = []
+        while self._scheduled and self._scheduled[0][0] <= now:
+            event = heapq.heappop(self._scheduled)[2]
+            event["date"] = datetime.now().astimezone().isoformat(timespec="milliseconds")
+            self._events.append(event)
+            self._event_dates.append(event["date"])
+            released.append(event)
+        return released
+
+    def _post_webhooks(self):
+        session = requests.Session()
+        while not self._stopped.wait(self.WEBHOOK_TICK):
+            with self._lock:
+                released = self._release_due()
+            for event in released:
+                try:
+                    response = session.post(self.webhook_url, json=webhook_payload(event), timeout=5)
+                    self.counts["webhooks" if response.ok else "webhook_errors"] += 1
+                except requests.RequestException:
+                    self.counts["webhook_errors"] += 1
+
+# Function to build the request handler class of a server
+def _make_handler(server):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # Keep-alive, like the real API
+
+        def _reply(self, status_code, body, headers):
+            data = json.dumps(body).encode() if body is not None else b""
+            self.send_response(status_code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _delay(self):
+            if server.latency or server.jitter:
+                time.sleep(server.latency + random.uniform(0, server.jitter))
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            try:
+                payload = json.loads(self.rfile.read(length) or b"{}")
+            except ValueError:
+                payload = None
+            self._delay()
+            path = urlparse(self.path).path
+            bulk_reply = None
+            if isinstance(payload, dict) and not path.endswith("/transactionalSMS/send"):
+                bulk_reply = server.bulk("POST", path, payload)
+            if bulk_reply is not None:
+                self._reply(*bulk_reply)
+            elif not path.endswith("/transactionalSMS/send"):
+                self._reply(404, {"code": "not_found", "message": "Not found"}, {})
+            elif not isinstance(payload, dict):
+                self._reply(400, {"code": "bad_request", "message": "Invalid JSON"}, {})
+            else:
+                self._reply(*server.send(payload))
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            self._delay()
+            query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            if url.path.endswith("/transactionalSMS/statistics/events"):
+                self._reply(*server.events(query))
+                return
+            bulk_reply = server.bulk("GET", url.path, query)
+            if bulk_reply is None:
+                self._reply(404, {"code": "not_found", "message": "Not found"}, {})
+                return
+            self._reply(*bulk_reply)
+
+        def log_message(self, format, *args):
+            pass  # Thousands of requests per second would flood the console
+
+    return Handler
+
+def add_mock_arguments(parser):
+    """Add the MockBrevoServer options to an argument parser"""
+    parser.add_argument("--latency", type=float, default=0.02, help="Seconds added to every request (default: 0.02)")
+    parser.add_argument("--jitter", type=float, default=0.01, help="Up to this many extra seconds at random (default: 0.01)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of sends answered with a 5xx (default: 0)")
+    parser.add_argument("--rate-limit", type=int, default=0, help="Sends per second before answering 429 (default: unlimited)")
+    parser.add_argument("--burst-every", type=float, default=0.0, help="Answer every send with 429 for --burst-seconds this often (default: never)")
+    parser.add_argument("--burst-seconds", type=float, default=1.0, help="Length of a 429 burst (default: 1)")
+    parser.add_argument("--event-delay", type=float, default=2.0, help="Seconds before a delivery event is listed (default: 2)")
+    parser.add_argument("--soft-bounce-rate", type=float, default=0.0, help="Share of messages that bounce softly (default: 0)")
+    parser.add_argument("--hard-bounce-rate", type=float, default=0.0, help="Share of messages that bounce hard (default: 0)")
+
+def mock_options(args):
+    """MockBrevoServer keyword arguments from add_mock_arguments() options"""
+    return {name: getattr(args, name) for name in ("latency", "jitter", "error_rate", "rate_limit", "burst_every",
+                                                   "burst_seconds", "event_delay", "soft_bounce_rate",
+                                                   "hard_bounce_rate")}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="brevo-sms-mock", description="Local stand-in for the Brevo SMS API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8025)
+    parser.add_argument("--webhook-url", help="Also POST each delivery event to this webhook receiver once it is due")
+    add_mock_arguments(parser)
+    args = parser.parse_args(argv)
+    server = MockBrevoServer(args.host, args.port, webhook_url=args.webhook_url, **mock_options(args)).start()
+    print(f"Mock Brevo API on {server.url} (use --base-url {server.url}); Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(10)
+            print(json.dumps(server.stats()))
+    except KeyboardInterrupt:
+        server.stop()
+
+if __name__ == "__main__":
+    main()
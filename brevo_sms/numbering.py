@@ -0,0 +1,79 @@
+"""Per-number destination detection from E.164 calling codes."""
+import pandas as pd
+
+# Numbering plan of calling codes, compiled once into a digit trie
+class PrefixTrie:
+    """
+    Digit trie of the calling codes in `countries` (a COUNTRIES-style dict,
+    with an optional "lengths" list per destination), each leaf holding the
+    destination and its valid national number lengths.
+    match() walks one number; detect_column() resolves a whole Series with one
+    dictionary lookup per calling-code length present in the plan.
+    """
+    def __init__(self, countries):
+        self.countries = countries
+        self._root = {}
+        self._levels = {}  # Calling-code length -> {code: (country key, valid national lengths)}
+        plan = []
+        for key, country in self.countries.items():
+            lengths = frozenset(country.get("lengths", (country["length"],)))
+            plan.append((key, country["code"], tuple(sorted(lengths))))
+            node = self._root
+            for digit in country["code"]:
+                node = node.setdefault(digit, {})
+            node[None] = (key, lengths)
+            self._levels.setdefault(len(country["code"]), {})[country["code"]] = (key, lengths)
+        self.signature = tuple(sorted(plan))  # Identifies the plan in cache keys
+
+    def match(self, digits):
+        """
+        Destination of a full international number (digits only, no + or 00).
+        Returns: country key, or None if no calling code matches with a valid length
+        """
+        node = self._root
+        found = None
+        for position, digit in enumerate(digits):
+            node = node.get(digit)
+            if node is None:
+                break
+            leaf = node.get(None)
+            if leaf is not None and len(digits) - position - 1 in leaf[1]:
+                found = leaf[0]  # Keep walking: the longest valid calling code wins
+        return found
+
+    def detect_column(self, digits):
+        """Vectorized match(): Series of country keys (None where nothing matches)"""
+        countries = pd.Series(None, index=digits.index, dtype=object)
+        lengths = digits.str.len()
+        for code_length in sorted(self._levels):
+            codes = self._levels[code_length]
+            candidates = digits.str[:code_length].map({code: key for code, (key, _) in codes.items()})
+            valid = pd.Series(False, index=digits.index, dtype=bool)
+            for code, (key, national_lengths) in codes.items():
+                valid |= (candidates == key) & (lengths - code_length).isin(national_lengths)
+            countries = countries.where(~valid, candidates)
+        return countries
+
+# Function to validate numbers of any supported destination at once
+def normalize_international_column(phones, trie, country_code=None, expected_length=None):
+    """
+    Mixed-destination version of normalize_phone_column(): numbers written with
+    + or 00 are looked up in the trie; other numbers of expected_length digits
+    are national numbers of country_code (if given), the rest are looked up too.
+    Returns: (normalized: Series of E.164 digits, countries: Series of keys, invalid_mask: Series)
+    """
+    text = phones.astype(str).str.strip()
+    digits = text.str.replace(r'\D', '', regex=True)
+    international = text.str.startswith('+') | text.str.startswith('00')
+    digits = digits.where(~text.str.startswith('00'), digits.str[2:])
+
+    countries = trie.detect_column(digits)
+    normalized = digits
+    if country_code is not None:
+        national = ~international & (digits.str.len() == expected_length)
+        default = next((key for key, country in trie.countries.items()
+                        if country["code"] == country_code and country["length"] == expected_length), None)
+        countries = countries.where(~national, default)
+        normalized = digits.where(~national, country_code + digits)
+    invalid_mask = countries.isna()
+    return normalized.where(~invalid_mask), countries.where(~invalid_mask), invalid_mask
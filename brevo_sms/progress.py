@@ -0,0 +1,62 @@
+"""Running campaign progress for live displays."""
+import time
+from collections import Counter, deque
+
+from .results import results_frame
+
+# Rows kept for the live table, and the shortest time between two redraws
+RECENT_ROWS = 20
+UI_UPDATE_INTERVAL = 0.25
+
+# Summary categories, see Status.category
+CATEGORIES = ("success", "rejected", "blocked", "failed", "other")
+
+# Running counters and a bounded window of recent rows
+class CampaignProgress:
+    """
+    Campaign progress that costs the same to draw at row 10 and row 100,000:
+    counts per Status and per summary category are updated as events arrive,
+    only the most recent rows are kept for display, and due() limits redraws
+    to a few per second whatever the send rate.
+    """
+    def __init__(self, total, recent_rows=RECENT_ROWS, min_interval=UI_UPDATE_INTERVAL):
+        self.total = total
+        self.processed = 0
+        self.status_counts = Counter()
+        self.category_counts = Counter()
+        self.recent = deque(maxlen=recent_rows)
+        self.min_interval = min_interval
+        self._last_draw = None
+
+    def add(self, result):
+        """Count a newly processed SendResult"""
+        self.processed += 1
+        self.status_counts[result.status] += 1
+        self.category_counts[result.status.category] += 1
+        self.recent.append(result)
+
+    def update(self, result, previous_status):
+        """Move a result whose status changed from previous_status to its new status"""
+        self.status_counts[previous_status] -= 1
+        self.category_counts[previous_status.category] -= 1
+        self.status_counts[result.status] += 1
+        self.category_counts[result.status.category] += 1
+
+    def summary(self):
+        """Returns: dict of category -> count (see Status.category)"""
+        return {category: self.category_counts[category] for category in CATEGORIES}
+
+    def fraction(self):
+        return min(1.0, self.processed / self.total) if self.total else 1.0
+
+    def recent_frame(self):
+        """The recent rows as a DataFrame, newest last"""
+        return results_frame(self.recent, drop_message=True)
+
+    def due(self, force=False):
+        """True if enough time has passed since the last redraw (which it then records)"""
+        now = time.monotonic()
+        if force or self._last_draw is None or now - self._last_draw >= self.min_interval:
+            self._last_draw = now
+            return True
+        return False
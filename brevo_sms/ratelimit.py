@@ -0,0 +1,163 @@
+"""Token-bucket rate limiting shared by send workers."""
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+# Token bucket shared by all send workers
+class TokenBucket:
+    """
+    Thread-safe token bucket that paces callers to `rate` acquisitions per second.
+    Allows bursts of up to `capacity` after an idle period.
+    """
+    def __init__(self, rate, capacity=1):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = float(capacity)
+        self._last = time.monotonic()
+        self._pauses = 0  # Bumped by pause(), so sleeping workers know to queue again
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available, then consume it"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now > self._last:
+                    self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                    self._last = now
+                # Reserve the token now and sleep off any debt outside the lock,
+                # so waiting workers queue up in order instead of spinning.
+                # During a pause _last is in the future, so the wait runs past it
+                self._tokens -= 1
+                wait_time = (self._last - now) + (-self._tokens / self.rate if self._tokens < 0 else 0)
+                pauses = self._pauses
+            if wait_time > 0:
+                time.sleep(wait_time)
+            with self._lock:
+                if self._pauses == pauses:
+                    return
+            # A pause started while this worker slept; its reservation was dropped
+
+    def set_rate(self, rate):
+        """Change the refill rate; tokens earned so far are kept"""
+        with self._lock:
+            now = time.monotonic()
+            if now > self._last:
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+            self.rate = float(rate)
+
+    def pause(self, seconds):
+        """Hand out no tokens for `seconds`; workers already waiting queue up again behind the pause"""
+        with self._lock:
+            until = time.monotonic() + seconds
+            if until > self._last:
+                self._last = until
+                self._tokens = self.capacity
+                self._pauses += 1
+
+# Adaptive rate control from Brevo's throttling signals
+AIMD_INCREASE = 0.5  # SMS/s added per second of clean responses
+AIMD_DECREASE = 0.5  # Rate multiplier on a 429
+DECREASE_COOLDOWN = 1.0  # 429s within this many seconds of a cut count as one
+INCREASE_MAX_GAP = 1.0  # Longest gap between clean responses that earns an increase (seconds)
+MIN_RATE = 0.1
+
+class AdaptiveRateController:
+    """
+    AIMD controller that steers a TokenBucket from API responses.
+    A 429 halves the rate (once per cooldown, since in-flight requests fail
+    together) and pauses the bucket for Retry-After. Clean responses add back
+    AIMD_INCREASE SMS/s per second since the previous increase (counting at
+    most INCREASE_MAX_GAP), whatever the rate, up to max_rate. Brevo's
+    x-sib-ratelimit-remaining/-reset headers cap the rate so the remaining
+    quota lasts until the window resets. Register on_response with
+    BrevoClient.add_response_observer().
+    """
+    def __init__(self, bucket, max_rate, path="transactionalSMS/send", min_rate=MIN_RATE,
+                 increase=AIMD_INCREASE, decrease=AIMD_DECREASE, cooldown=DECREASE_COOLDOWN):
+        self.bucket = bucket
+        self.max_rate = float(max_rate)
+        self.min_rate = min(float(min_rate), self.max_rate)
+        self.path = path
+        self.increase = increase
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self.throttled = 0  # Number of 429 responses seen
+        self._last_cut = None
+        self._last_increase = None
+        self._lock = threading.Lock()
+
+    @property
+    def rate(self):
+        return self.bucket.rate
+
+    def set_max_rate(self, max_rate):
+        """Move the ceiling (e.g. from a WindowPacer); a rate above it is cut at once, below it ramps up"""
+        with self._lock:
+            self.max_rate = float(max_rate)
+            self.min_rate = min(self.min_rate, self.max_rate)
+            if self.bucket.rate > self.max_rate:
+                self.bucket.set_rate(self.max_rate)
+
+    def on_response(self, path, response):
+        """Adjust the rate after a response (called from worker threads)"""
+        if path != self.path:
+            return
+        headers = response.headers
+        with self._lock:
+            rate = self.bucket.rate
+            now = time.monotonic()
+            if response.status_code == 429:
+                self.throttled += 1
+                if self._last_cut is None or now - self._last_cut >= self.cooldown:
+                    rate = max(self.min_rate, rate * self.decrease)
+                    self._last_cut = now
+                    self._last_increase = now  # Ramping starts again from the cut
+                wait = parse_retry_after(headers.get("Retry-After"))
+                if wait is None:
+                    wait = _header_float(headers, "x-sib-ratelimit-reset")
+                if wait:
+                    self.bucket.pause(wait)
+            elif response.status_code < 500:
+                # A constant step per second: one clean response at a low rate must not undo a cut
+                if self._last_increase is not None:
+                    rate = min(self.max_rate, rate + self.increase * min(now - self._last_increase, INCREASE_MAX_GAP))
+                self._last_increase = now
+
+            # Spread the remaining quota over the rest of the window
+            remaining = _header_float(headers, "x-sib-ratelimit-remaining")
+            reset = _header_float(headers, "x-sib-ratelimit-reset")
+            if remaining is not None and reset:
+                if remaining <= 0:
+                    self.bucket.pause(reset)
+                else:
+                    rate = min(rate, max(self.min_rate, remaining / reset))
+
+            if rate != self.bucket.rate:
+                self.bucket.set_rate(rate)
+
+# Function to read a Retry-After header
+def parse_retry_after(value):
+    """
+    Seconds to wait from a Retry-After header (delay in seconds or an HTTP date).
+    Returns: float or None
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+def _header_float(headers, name):
+    try:
+        return float(headers.get(name))
+    except (TypeError, ValueError):
+        return None
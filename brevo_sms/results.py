@@ -0,0 +1,247 @@
+"""Compact send result records and writing them to disk."""
+import gzip
+import json
+import os
+import sqlite3
+import tempfile
+import weakref
+from datetime import datetime
+
+import pandas as pd
+
+from .status import parse_status_label, status_label
+from .storage import data_path
+
+# Columns of a result row in tables, exports and the JSON lines output
+RESULT_COLUMNS = ["Name", "Original Number", "Formatted Number", "Message Preview", "Full Message", "API Status",
+                  "Message ID", "Status Code", "Error", "Can Retry", "Timestamp", "Attempts"]
+PREVIEW_LENGTH = 50
+SPOOL_CHUNK_ROWS = 10000
+
+# Outcome of one message, kept for every contact of a campaign
+class SendResult:
+    """
+    One result row as a slotted object: no per-row dict, the message is stored
+    once (the preview is derived) and the status is a Status member rather
+    than a label. row() gives the familiar table row. `position` is the row's
+    place in a ResultSpool, not part of the result.
+    """
+    FIELDS = ("name", "original", "formatted", "message", "status", "message_id", "status_code", "error",
+              "can_retry", "timestamp", "attempts")
+    __slots__ = FIELDS + ("position",)
+
+    def __init__(self, name, original, formatted, message, status, message_id=None, status_code=None, error="",
+                 can_retry=False, timestamp=None, attempts=1):
+        self.name = name
+        self.original = original
+        self.formatted = formatted
+        self.message = message
+        self.status = status
+        self.message_id = message_id
+        self.status_code = status_code
+        self.error = error
+        self.can_retry = can_retry
+        self.timestamp = timestamp or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self.attempts = attempts
+        self.position = None
+
+    @property
+    def label(self):
+        return status_label(self.status, self.status_code)
+
+    @property
+    def preview(self):
+        return self.message[:PREVIEW_LENGTH] + "..." if len(self.message) > PREVIEW_LENGTH else self.message
+
+    def replace_with(self, other):
+        """Take over every field of a newer result for the same message (e.g. a re-send)"""
+        for field in self.FIELDS:
+            setattr(self, field, getattr(other, field))
+
+    def row(self):
+        """Returns: dict with the RESULT_COLUMNS"""
+        return {
+            "Name": self.name,
+            "Original Number": self.original,
+            "Formatted Number": self.formatted,
+            "Message Preview": self.preview,
+            "Full Message": self.message,
+            "API Status": self.label,
+            "Message ID": self.message_id if self.message_id is not None else "N/A",
+            "Status Code": self.status_code,
+            "Error": self.error or "",
+            "Can Retry": self.can_retry,
+            "Timestamp": self.timestamp,
+            "Attempts": self.attempts
+        }
+
+    @classmethod
+    def from_row(cls, row):
+        """Rebuild a result from a row() dict (journal entries, JSON lines output, or a results file's text)"""
+        message_id = row.get("Message ID")
+        status_code = row.get("Status Code")
+        if isinstance(status_code, str):  # Read back from a CSV or Parquet file, where every column is text
+            status_code = int(status_code) if status_code.isdigit() else None
+        can_retry = row.get("Can Retry")
+        return cls(row.get("Name"), row.get("Original Number"), row.get("Formatted Number"),
+                   row.get("Full Message") or "", parse_status_label(row.get("API Status")),
+                   message_id=None if message_id in (None, "", "N/A") else message_id,
+                   status_code=status_code, error=row.get("Error") or "",
+                   can_retry=can_retry == "True" if isinstance(can_retry, str) else bool(can_retry),
+                   timestamp=row.get("Timestamp"), attempts=int(row.get("Attempts") or 1))
+
+# Function to build a DataFrame of results
+def results_frame(results, drop_message=False):
+    """Table of SendResult objects (without the Full Message column if drop_message)"""
+    frame = pd.DataFrame([result.row() for result in results], columns=RESULT_COLUMNS)
+    return frame.drop(columns=["Full Message"]) if drop_message else frame
+
+# One results file written a chunk at a time
+class ResultWriter:
+    """
+    Appends chunks of SendResult objects to `path`: .parquet (needs pyarrow),
+    .csv.gz or .csv, chosen by extension. close() finishes the file (with just
+    the header if nothing was written).
+    """
+    def __init__(self, path, drop_message=True):
+        self.path = path
+        self.drop_message = drop_message
+        self.count = 0
+        self._output = None  # Open text file, or ParquetWriter
+
+    def write(self, results):
+        frame = results_frame(results, self.drop_message)
+        if self.path.endswith(".parquet"):
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            # Columns are strings so every chunk has the same schema
+            table = pa.Table.from_pandas(frame.astype(str), preserve_index=False)
+            if self._output is None:
+                self._output = pq.ParquetWriter(self.path, table.schema)
+            self._output.write_table(table)
+        else:
+            header = self._output is None
+            if header:
+                opener = gzip.open if self.path.endswith(".gz") else open
+                self._output = opener(self.path, "wt", encoding="utf-8", newline="")
+            frame.to_csv(self._output, index=False, header=header)
+        self.count += len(frame)
+
+    def close(self):
+        if self._output is None:
+            self.write([])
+        self._output.close()
+
+# Function to write results to disk a chunk at a time
+def write_results(results, path, drop_message=True, chunk_rows=SPOOL_CHUNK_ROWS):
+    """
+    Write SendResult objects (any iterable, consumed as it goes) to `path`
+    without building the whole table in memory: .parquet (needs pyarrow),
+    .csv.gz or .csv, chosen by extension.
+    Returns: number of rows written
+    """
+    writer = ResultWriter(path, drop_message)
+    try:
+        chunk = []
+        for result in results:
+            chunk.append(result)
+            if len(chunk) >= chunk_rows:
+                writer.write(chunk)
+                chunk = []
+        if chunk:
+            writer.write(chunk)
+    finally:
+        writer.close()
+    return writer.count
+
+# Results of a running campaign, kept on disk instead of in memory
+class ResultSpool:
+    """
+    add() appends each result to a .csv.gz spool file next to `path`, a chunk of
+    chunk_rows at a time in the order they arrive. A result that changes after
+    it was spooled (delivery event, re-send) is passed to update(), which keeps
+    its latest row in a temporary SQLite table. finish() merges those rows in
+    with one pass over the spool file, writes `path` (if given) and yields the
+    final results, e.g. for CampaignHistory.add_campaign().
+    """
+    def __init__(self, path=None, drop_message=True, chunk_rows=SPOOL_CHUNK_ROWS):
+        self.path = path
+        self.drop_message = drop_message
+        self.chunk_rows = chunk_rows
+        self.count = 0
+        directory = os.path.dirname(os.path.abspath(path or data_path("results")))
+        descriptor, spool_path = tempfile.mkstemp(prefix=".results-", suffix=".csv.gz", dir=directory)
+        os.close(descriptor)
+        weakref.finalize(self, _remove_file, spool_path)
+        self._spool = ResultWriter(spool_path, drop_message=False)  # Full messages, for the history
+        self._buffer = []
+        self._updates = sqlite3.connect("")  # Private database on disk, removed when closed
+        self._updates.execute("CREATE TABLE updates (position INTEGER PRIMARY KEY, row TEXT NOT NULL)")
+
+    def add(self, result):
+        result.position = self.count
+        self.count += 1
+        self._buffer.append(result)
+        if len(self._buffer) >= self.chunk_rows:
+            self._flush()
+
+    def update(self, result):
+        """Record a result that changed; one still waiting in the buffer is written as it is then"""
+        if result.position is None or result.position >= self.count - len(self._buffer):
+            return
+        self._updates.execute("INSERT OR REPLACE INTO updates (position, row) VALUES (?, ?)",
+                              (result.position, json.dumps(result.row(), default=str)))
+
+    def _flush(self):
+        if self._buffer:
+            self._spool.write(self._buffer)
+            self._buffer = []
+
+    def finish(self):
+        """
+        Merge the updates into the spooled results and write `path`.
+        Yields: the final results (SendResult), in the order they were added
+        """
+        self._flush()
+        self._spool.close()
+        writer = ResultWriter(self.path, self.drop_message) if self.path else None
+        try:
+            position = 0
+            for frame in pd.read_csv(self._spool.path, dtype=object, keep_default_na=False, chunksize=self.chunk_rows):
+                updates = dict(self._updates.execute(
+                    "SELECT position, row FROM updates WHERE position >= ? AND position < ?",
+                    (position, position + len(frame))
+                ))
+                results = [SendResult.from_row(json.loads(updates[position + offset])
+                                               if position + offset in updates else row)
+                           for offset, row in enumerate(frame.to_dict("records"))]
+                if writer is not None:
+                    writer.write(results)
+                position += len(frame)
+                yield from results
+        finally:
+            if writer is not None:
+                writer.close()
+            self._updates.close()
+            _remove_file(self._spool.path)
+
+    def close(self):
+        """Finish without using the results. Returns: number of results"""
+        for _ in self.finish():
+            pass
+        return self.count
+
+# Function to delete a file that may already be gone
+def _remove_file(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+# Function to read results written by write_results()
+def read_results(path):
+    """Returns: DataFrame of a results file (.parquet, .csv.gz or .csv)"""
+    if path.endswith(".parquet"):
+        return pd.read_parquet(path)
+    return pd.read_csv(path, dtype=str, keep_default_na=False)
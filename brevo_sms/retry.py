@@ -0,0 +1,34 @@
+"""Automatic retries: exponential backoff with jitter and an attempt limit."""
+import random
+
+# Attempts per message (the first send included) and the backoff bounds in seconds
+MAX_ATTEMPTS = 3
+RETRY_BASE_DELAY = 2.0
+RETRY_MAX_DELAY = 60.0
+
+# Function to compute a backoff delay
+def backoff_delay(attempt, base_delay=RETRY_BASE_DELAY, max_delay=RETRY_MAX_DELAY):
+    """
+    Seconds to wait after failed attempt number `attempt` (1-based): doubles
+    each time up to max_delay, with half of it randomized so retries of a
+    burst of failures do not all fire at the same moment.
+    """
+    delay = min(max_delay, base_delay * 2 ** (attempt - 1))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+# When and how often failed sends are tried again
+class RetryPolicy:
+    """
+    Decides whether a failed attempt is re-queued and after how long.
+    Rows that are still retryable after max_attempts become dead letters.
+    """
+    def __init__(self, max_attempts=MAX_ATTEMPTS, base_delay=RETRY_BASE_DELAY, max_delay=RETRY_MAX_DELAY):
+        self.max_attempts = max(1, int(max_attempts))
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def next_delay(self, attempt):
+        """Delay before the next attempt, or None if `attempt` was the last one"""
+        if attempt >= self.max_attempts:
+            return None
+        return backoff_delay(attempt, self.base_delay, self.max_delay)
@@ -0,0 +1,202 @@
+"""Sending windows in recipients' time zones, and pacing a campaign into them."""
+import queue
+import threading
+from datetime import datetime, time, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+from .ratelimit import MIN_RATE
+
+# Re-plan the rate this often while a window is open, so it follows actual progress
+REPLAN_SECONDS = 60.0
+# Share of the open time a plan fills, leaving the rest for retries and re-sends
+WINDOW_HEADROOM = 0.9
+# How far ahead to look for the next opening
+LOOKAHEAD_DAYS = 8
+
+WEEKDAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+
+# Daily sending hours, in the recipients' local time
+class SendWindow:
+    """
+    Open from `start` to `end` (datetime.time, wrapping past midnight when
+    end <= start) on `weekdays` (0 = Monday) in every one of `timezones` at
+    once, so a country spanning several zones is only messaged while the
+    window is open in all of them.
+    """
+    def __init__(self, start, end, timezones=("UTC",), weekdays=range(7)):
+        self.start = start
+        self.end = end
+        self.timezones = tuple(timezones)
+        self.weekdays = frozenset(weekdays)
+        self._zones = [ZoneInfo(name) for name in self.timezones]
+
+    def __repr__(self):
+        return f"SendWindow({self.start:%H:%M}-{self.end:%H:%M}, {', '.join(self.timezones)})"
+
+    def _zone_intervals(self, zone, since, until):
+        day = since.astimezone(zone).date() - timedelta(days=1)  # An overnight window may have opened yesterday
+        last_day = until.astimezone(zone).date()
+        while day <= last_day:
+            if day.weekday() in self.weekdays:
+                opens = datetime.combine(day, self.start, tzinfo=zone)
+                closes = datetime.combine(day + timedelta(days=1) if self.end <= self.start else day, self.end,
+                                          tzinfo=zone)
+                yield opens.astimezone(timezone.utc), closes.astimezone(timezone.utc)
+            day += timedelta(days=1)
+
+    def intervals(self, since, until):
+        """
+        When the window is open between two aware datetimes.
+        Returns: list of (opens, closes) UTC datetimes, in order, clipped to since..until
+        """
+        open_intervals = [(since.astimezone(timezone.utc), until.astimezone(timezone.utc))]
+        for zone in self._zones:
+            open_intervals = _intersect(open_intervals, list(self._zone_intervals(zone, since, until)))
+        return open_intervals
+
+    def open_seconds(self, since, until):
+        """Seconds the window is open between two aware datetimes"""
+        return sum((closes - opens).total_seconds() for opens, closes in self.intervals(since, until))
+
+# Function to intersect two sorted lists of intervals
+def _intersect(first, second):
+    intersection = []
+    i = j = 0
+    while i < len(first) and j < len(second):
+        opens = max(first[i][0], second[j][0])
+        closes = min(first[i][1], second[j][1])
+        if opens < closes:
+            intersection.append((opens, closes))  # Back-to-back days of a 24-hour window stay separate openings
+        if first[i][1] < second[j][1]:
+            i += 1
+        else:
+            j += 1
+    return intersection
+
+# Function to read a window like "09:00-21:00"
+def parse_window(text):
+    """Returns: (start, end) datetime.time"""
+    try:
+        start, end = (time.fromisoformat(part.strip()) for part in text.split("-"))
+    except ValueError:
+        raise ValueError(f"expected HH:MM-HH:MM, got {text!r}")
+    return start, end
+
+# Function to read weekdays like "mon-fri" or "mon,wed,sat"
+def parse_weekdays(text):
+    """Returns: set of weekday numbers (0 = Monday)"""
+    weekdays = set()
+    for part in text.lower().split(","):
+        first, _, last = part.strip().partition("-")
+        if first not in WEEKDAYS or (last and last not in WEEKDAYS):
+            raise ValueError(f"expected days like mon-fri or sat,sun, got {text!r}")
+        start, end = WEEKDAYS.index(first), WEEKDAYS.index(last or first)
+        weekdays.update(day % 7 for day in range(start, end + 1 if end >= start else end + 8))
+    return weekdays
+
+# Paces one rate limiter into a send window
+class WindowPacer:
+    """
+    Steers a TokenBucket from a background thread. While the window is open,
+    the rate spreads the messages still to send (total minus record()ed ones)
+    over the open time left before `deadline`, never above max_rate; without a
+    deadline the campaign is fitted into the current (or next) opening. When
+    the window closes the bucket is paused until it opens again. With an
+    AdaptiveRateController on the bucket, the plan becomes its ceiling instead.
+    With no total, or nothing left but retries, sends go at max_rate, still
+    only while the window is open.
+    """
+    def __init__(self, bucket, window, total, max_rate, deadline=None, controller=None):
+        self.bucket = bucket
+        self.window = window
+        self.total = total
+        self.max_rate = float(max_rate)
+        self.deadline = deadline
+        self.controller = controller
+        self.sent = 0
+        self.state = None  # Latest plan()
+        self._changes = queue.Queue()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def record(self, count=1):
+        """Count messages done (sent, failed for good or skipped)"""
+        with self._lock:
+            self.sent += count
+
+    def plan(self, now=None):
+        """
+        Returns: dict with open (bool), rate (SMS per second while open), opens_at and closes_at
+        (the current or next opening, None if there is none within LOOKAHEAD_DAYS), open_seconds
+        (open time left before the deadline) and remaining (messages still to send)
+        """
+        now = now or datetime.now(timezone.utc)
+        horizon = now + timedelta(days=LOOKAHEAD_DAYS)
+        if self.deadline is not None and self.deadline > horizon:
+            horizon = self.deadline
+        upcoming = self.window.intervals(now, horizon)
+        if not upcoming:
+            return {"open": False, "rate": self.max_rate, "opens_at": None, "closes_at": None,
+                    "open_seconds": 0.0, "remaining": self._remaining()}
+        opens_at, closes_at = upcoming[0]
+        deadline = self.deadline or closes_at
+        open_seconds = sum(max(0.0, (min(closes, deadline) - max(opens, now)).total_seconds())
+                           for opens, closes in upcoming if opens < deadline)
+        remaining = self._remaining()
+        rate = self.max_rate
+        if remaining and open_seconds > 0:
+            rate = min(self.max_rate, max(MIN_RATE, remaining / (open_seconds * WINDOW_HEADROOM)))
+        return {"open": opens_at <= now, "rate": rate, "opens_at": opens_at, "closes_at": closes_at,
+                "open_seconds": open_seconds, "remaining": remaining}
+
+    def _remaining(self):
+        if self.total is None:
+            return None
+        with self._lock:
+            return max(0, self.total - self.sent)
+
+    def apply(self, now=None):
+        """Set the bucket from a fresh plan. Returns: seconds until the plan should be made again"""
+        now = now or datetime.now(timezone.utc)
+        state = self.plan(now)
+        if state["open"]:
+            if self.controller is not None:
+                self.controller.set_max_rate(state["rate"])
+            else:
+                self.bucket.set_rate(state["rate"])
+            wake = min(REPLAN_SECONDS, (state["closes_at"] - now).total_seconds())
+        elif state["opens_at"] is not None:
+            wake = (state["opens_at"] - now).total_seconds()
+            self.bucket.pause(wake)
+        else:
+            wake = REPLAN_SECONDS
+            self.bucket.pause(wake)
+
+        previous = self.state
+        self.state = state
+        if previous is None or previous["open"] != state["open"] or round(previous["rate"], 1) != round(state["rate"], 1):
+            self._changes.put(state)
+        return max(0.01, wake)
+
+    def changes(self):
+        """Plans that opened or closed the window or changed the rate since the last call"""
+        changes = []
+        while True:
+            try:
+                changes.append(self._changes.get_nowait())
+            except queue.Empty:
+                return changes
+
+    def start(self):
+        # The first plan is applied before any send can take a token
+        self._wake = self.apply()
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self._wake):
+            self._wake = self.apply()
@@ -0,0 +1,93 @@
+"""GSM-7/UCS-2 encoding detection, SMS part counting and transliteration."""
+import math
+import re
+import unicodedata
+
+# GSM 03.38 character sets. Extended characters take two units (escape + char)
+GSM7_BASIC_CHARS = (
+    "@£$¥èéùìòÇ\nØø\rÅåΔ_ΦΓΛΩΠΨΣΘΞÆæßÉ !\"#¤%&'()*+,-./0123456789:;<=>?"
+    "¡ABCDEFGHIJKLMNOPQRSTUVWXYZÄÖÑÜ§¿abcdefghijklmnopqrstuvwxyzäöñüà"
+)
+GSM7_EXTENDED_CHARS = "^{}\\[~]|€\f"
+
+# Characters per SMS part: (single message, each part of a concatenated message)
+SEGMENT_LIMITS = {
+    "GSM-7": (160, 153),
+    "UCS-2": (70, 67),
+}
+
+def _char_class(chars, negate=False):
+    """Regex character class for `chars`, written so both re and RE2 (pyarrow) accept it"""
+    escaped = "".join(
+        {"\n": "\\n", "\r": "\\r", "\f": "\\f"}.get(c, "\\" + c if c in "\\]^-[" else c)
+        for c in chars
+    )
+    return f"[{'^' if negate else ''}{escaped}]"
+
+NON_GSM7_PATTERN = _char_class(GSM7_BASIC_CHARS + GSM7_EXTENDED_CHARS, negate=True)
+GSM7_EXTENDED_PATTERN = _char_class(GSM7_EXTENDED_CHARS)
+ASTRAL_PATTERN = "[\U00010000-\U0010FFFF]"  # Emoji etc. take two UCS-2 units
+_NON_GSM7_RE = re.compile(NON_GSM7_PATTERN)
+_GSM7_EXTENDED_RE = re.compile(GSM7_EXTENDED_PATTERN)
+_ASTRAL_RE = re.compile(ASTRAL_PATTERN)
+
+def _build_transliteration_table():
+    """Map common non-GSM characters to GSM-7 look-alikes"""
+    table = {
+        "‘": "'", "’": "'", "‚": "'", "‛": "'", "′": "'", "`": "'", "´": "'",
+        "“": '"', "”": '"', "„": '"', "″": '"', "«": '"', "»": '"',
+        "–": "-", "—": "-", "‐": "-", "‑": "-", "−": "-",
+        "…": "...", "•": "*", "·": ".",
+        "\u00a0": " ", "\u2009": " ", "\u200b": "", "\t": " ",
+        "₹": "Rs.", "™": "TM", "©": "(C)", "®": "(R)",
+    }
+    # Accented Latin letters that are not in GSM-7 lose their accent (ê -> e)
+    for code_point in range(0x00C0, 0x0250):
+        char = chr(code_point)
+        if char in GSM7_BASIC_CHARS or char in table:
+            continue
+        base = unicodedata.normalize("NFKD", char).encode("ascii", "ignore").decode("ascii")
+        if base:
+            table[char] = base
+    return str.maketrans(table)
+
+TRANSLITERATION_TABLE = _build_transliteration_table()
+
+# Function to count SMS parts for one message
+def count_sms_segments(text):
+    """
+    Work out the encoding and number of SMS parts for a single message.
+    Returns: (encoding: str, segments: int)
+    """
+    if _NON_GSM7_RE.search(text):
+        encoding = "UCS-2"
+        units = len(text) + len(_ASTRAL_RE.findall(text))
+    else:
+        encoding = "GSM-7"
+        units = len(text) + len(_GSM7_EXTENDED_RE.findall(text))
+    single, multi = SEGMENT_LIMITS[encoding]
+    if units == 0:
+        return encoding, 0
+    return encoding, 1 if units <= single else math.ceil(units / multi)
+
+# Function to count SMS parts for a whole column of messages
+def count_sms_segments_column(messages):
+    """
+    Vectorized count_sms_segments() for a Series of rendered messages.
+    Returns: (is_unicode: bool Series, segments: int Series)
+    """
+    messages = messages.astype(str)
+    lengths = messages.str.len()
+    is_unicode = messages.str.contains(NON_GSM7_PATTERN, regex=True)
+    units = (lengths + messages.str.count(GSM7_EXTENDED_PATTERN)).where(
+        ~is_unicode, lengths + messages.str.count(ASTRAL_PATTERN)
+    )
+    single = is_unicode.map({False: SEGMENT_LIMITS["GSM-7"][0], True: SEGMENT_LIMITS["UCS-2"][0]})
+    multi = is_unicode.map({False: SEGMENT_LIMITS["GSM-7"][1], True: SEGMENT_LIMITS["UCS-2"][1]})
+    segments = (-(-units // multi)).where(units > single, 1).where(units > 0, 0)
+    return is_unicode.astype(bool), segments.astype(int)
+
+# Function to replace characters that force UCS-2
+def transliterate_gsm7(messages):
+    """Replace smart quotes, dashes, accents etc. with GSM-7 equivalents in a Series"""
+    return messages.astype(str).str.translate(TRANSLITERATION_TABLE)
@@ -0,0 +1,50 @@
+"""Splitting a campaign into shards by recipient, and merging shard results back into one report."""
+import json
+import zlib
+
+import pandas as pd
+
+# Keys that describe a progress event rather than the result row itself
+EVENT_FIELDS = ("type", "index", "previous", "delay")
+
+# Function to pick the shard of a phone number
+def shard_of(number, shard_count):
+    """Stable shard index (0-based) of a formatted number, the same on every process and machine"""
+    return zlib.crc32(str(number).encode()) % shard_count
+
+# Function to select the numbers of one shard
+def shard_mask(numbers, shard_index, shard_count):
+    """Boolean Series: which of `numbers` belong to shard_index of shard_count"""
+    return pd.Series([shard_of(number, shard_count) == shard_index for number in numbers.tolist()],
+                     index=numbers.index, dtype=bool)
+
+# Function to read a shard argument
+def parse_shard(value):
+    """
+    Parse 'I/N' (1-based, e.g. '2/4') into a 0-based (shard_index, shard_count).
+    Raises ValueError for anything else.
+    """
+    index, _, count = str(value).partition("/")
+    shard_index, shard_count = int(index) - 1, int(count)
+    if shard_count < 1 or not 0 <= shard_index < shard_count:
+        raise ValueError(f"shard must be I/N with 1 <= I <= N, got {value!r}")
+    return shard_index, shard_count
+
+# Function to merge shard outputs into one report
+def merge_results(paths):
+    """
+    Merge JSON-lines output of 'send' runs (one per shard or node) into one table.
+    Later records of the same recipient and message (status updates, re-sends)
+    replace earlier ones.
+    Returns: DataFrame with one row per recipient and message
+    """
+    rows = {}
+    for path in paths:
+        with open(path, encoding="utf-8") as results_file:
+            for line in results_file:
+                record = json.loads(line)
+                if "Formatted Number" not in record:
+                    continue  # campaign/rate/done events
+                row = {key: value for key, value in record.items() if key not in EVENT_FIELDS}
+                rows[(str(row["Formatted Number"]), row.get("Full Message"))] = row
+    return pd.DataFrame(list(rows.values()))
@@ -0,0 +1,132 @@
+"""Mapping of Brevo delivery events and HTTP errors to result statuses."""
+from enum import Enum
+
+# HTTP statuses of a failed send worth trying again: timeouts, throttling,
+# server errors, and 0 for network failures. Everything else is fatal
+RETRYABLE_HTTP_STATUSES = {0, 408, 425, 429, 500, 502, 503, 504}
+
+# Events after which a message's status will not change any more
+FINAL_EVENTS = {"delivered", "hardBounces", "softBounces", "blocked", "rejected", "unsubscribed"}
+
+# Events after which a number is never sent to again
+SUPPRESSION_EVENTS = {"hardBounces", "blocked", "unsubscribed"}
+
+# Function to get delivery status description
+def get_delivery_status(event_type):
+    """
+    Convert event type to user-friendly status
+    """
+    status_map = {
+        "sent": "📤 Sent to carrier",
+        "delivered": "✅ Delivered",
+        "hardBounces": "❌ Hard Bounce",
+        "softBounces": "⚠️ Soft Bounce",
+        "blocked": "🚫 Blocked",
+        "rejected": "❌ Rejected",
+        "accepted": "✓ Accepted",
+        "unsubscribed": "🚫 Unsubscribed"
+    }
+    return status_map.get(event_type, f"❓ {event_type}")
+
+# Result statuses: (label shown in tables, summary category)
+class Status(Enum):
+    """
+    Structured status of a result row. The label is what tables and exports
+    show; the category ("success", "rejected", "blocked", "failed", "other")
+    drives the summary counters without parsing labels.
+    """
+    ACCEPTED = ("✅ Accepted (queued)", "success")
+    ACCEPTED_FOR_DELIVERY = ("✅ Accepted for Delivery", "success")
+    SENT_TO_CARRIER = ("📤 Sent to Carrier", "success")
+    DELIVERED = ("✅ Delivered", "success")
+    REJECTED = ("❌ Rejected by Brevo", "rejected")
+    BLOCKED = ("🚫 Blocked by Carrier", "blocked")
+    HARD_BOUNCE = ("❌ Hard Bounce", "failed")
+    BAD_REQUEST = ("❌ Bad Request", "failed")
+    UNAUTHORIZED = ("❌ Unauthorized (Check API Key)", "failed")
+    INSUFFICIENT_CREDITS = ("❌ Insufficient Credits", "failed")
+    FORBIDDEN = ("❌ Forbidden", "failed")
+    NOT_FOUND = ("❌ Not Found", "failed")
+    FAILED = ("❌ Failed", "failed")  # Shown with its HTTP status, see status_label()
+    SOFT_BOUNCE = ("⚠️ Soft Bounce", "other")
+    RATE_LIMITED = ("⚠️ Rate Limited", "other")
+    UNSUBSCRIBED = ("🚫 Unsubscribed", "other")
+    UNCONFIRMED = ("❓ Unconfirmed (not re-sent)", "other")
+    PROCESSING = ("⏳ Processing", "other")
+
+    def __init__(self, label, category):
+        self.label = label
+        self.category = category
+
+# Delivery events -> (status, retryable, default error text)
+EVENT_STATUSES = {
+    "rejected": (Status.REJECTED, True, "Rejected by Brevo"),
+    "blocked": (Status.BLOCKED, False, "Blocked by carrier"),
+    "hardBounces": (Status.HARD_BOUNCE, False, "Invalid number"),
+    "softBounces": (Status.SOFT_BOUNCE, True, "Temporary failure"),
+    "unsubscribed": (Status.UNSUBSCRIBED, False, "Recipient unsubscribed"),
+    "sent": (Status.SENT_TO_CARRIER, False, ""),
+    "accepted": (Status.ACCEPTED_FOR_DELIVERY, False, ""),
+    "delivered": (Status.DELIVERED, False, ""),
+}
+
+# HTTP statuses of a failed send with their own status
+HTTP_STATUSES = {
+    400: Status.BAD_REQUEST,
+    401: Status.UNAUTHORIZED,
+    402: Status.INSUFFICIENT_CREDITS,
+    403: Status.FORBIDDEN,
+    404: Status.NOT_FOUND,
+    429: Status.RATE_LIMITED,
+}
+
+_STATUSES_BY_LABEL = {status.label: status for status in Status}
+
+# Function to map a delivery event to a structured status
+def event_status(event_type, event_reason=""):
+    """
+    Status of a result row after a Brevo delivery event.
+    Returns: (status: Status, can_retry: bool, error: str)
+    """
+    status, can_retry, default_error = EVENT_STATUSES.get(event_type, (Status.PROCESSING, False, ""))
+    return status, can_retry, (event_reason or default_error) if default_error else ""
+
+# Function to map a failed send to a structured status
+def http_status(status_code):
+    """Status of a send that failed with this HTTP status"""
+    return HTTP_STATUSES.get(status_code, Status.FAILED)
+
+# Function to get the table label of a status
+def status_label(status, status_code=None):
+    """Label shown for a status; generic failures include their HTTP status"""
+    if status is Status.FAILED:
+        return f"❌ Failed (HTTP {status_code})"
+    return status.label
+
+# Function to read a status back from its label
+def parse_status_label(label):
+    """Status of a label written by status_label() (e.g. a journaled or exported row)"""
+    if str(label).startswith("❌ Failed (HTTP"):
+        return Status.FAILED
+    return _STATUSES_BY_LABEL.get(label, Status.PROCESSING)
+
+# Function to map a delivery event to a result row status
+def map_event_status(event_type, event_reason=""):
+    """
+    Convert a Brevo event into the result table's status fields.
+    Returns: (api_status: str, can_retry: bool, error: str)
+    """
+    status, can_retry, error = event_status(event_type, event_reason)
+    return status.label, can_retry, error
+
+# Function to map a failed send to a result row status
+def map_http_status(status_code):
+    """
+    Convert the HTTP status of a failed send into the result table's status label.
+    """
+    return status_label(http_status(status_code), status_code)
+
+# Function to classify a failed send
+def is_retryable_http(status_code):
+    """True if a send that failed with this HTTP status may succeed when sent again"""
+    return status_code in RETRYABLE_HTTP_STATUSES or (status_code or 0) >= 500
@@ -0,0 +1,10 @@
+"""Location of the local data files (event store, journals, history)."""
+import os
+
+# Local storage for app data
+DATA_DIR = os.environ.get("BREVO_SMS_DATA_DIR", ".brevo_data")
+
+def data_path(file_name):
+    """Path of a file inside DATA_DIR, creating the directory if needed"""
+    os.makedirs(DATA_DIR, exist_ok=True)
+    return os.path.join(DATA_DIR, file_name)
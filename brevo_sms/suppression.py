@@ -0,0 +1,33 @@
+"""Pre-send suppression of numbers Brevo reported as hard-bounced, blocked or unsubscribed."""
+import pandas as pd
+
+# In-memory index of suppressed numbers
+class SuppressionIndex:
+    """
+    Hash index of numbers never to send to, loaded from the suppressions the
+    EventStore keeps up to date from delivery events (the exact backing store).
+    mask() checks a whole chunk of numbers in one vectorized lookup; the hash
+    table is built once, not per chunk.
+    """
+    def __init__(self, numbers=()):
+        self._index = pd.Index(pd.unique(pd.Series(list(numbers), dtype=object)), dtype=object)
+
+    @classmethod
+    def from_event_stores(cls, *event_stores):
+        """Union of the suppression lists of one or more EventStores"""
+        numbers = []
+        for event_store in event_stores:
+            numbers.extend(event_store.suppressed_numbers())
+        return cls(numbers)
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, number):
+        return number in self._index
+
+    def mask(self, numbers):
+        """Boolean Series: which of `numbers` (normalized, digits only) are suppressed"""
+        if not len(self._index):
+            return pd.Series(False, index=numbers.index, dtype=bool)
+        return pd.Series(self._index.get_indexer(numbers.astype(object)) >= 0, index=numbers.index, dtype=bool)
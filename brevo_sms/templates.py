@@ -0,0 +1,67 @@
+"""Compiled {column} message templates."""
+import re
+
+import pandas as pd
+
+# Matches {column_name} placeholders in message templates
+PLACEHOLDER_PATTERN = re.compile(r"\{([^{}]+)\}")
+
+# Compiled message template
+class MessageTemplate:
+    """
+    Message template parsed once into literal text and {column_name} fields.
+    Rendering only looks up the fields the template actually uses, so wide
+    files cost the same as narrow ones. Unknown fields are left as typed.
+    """
+    def __init__(self, template):
+        self.template = template
+        self.parts = []  # (is_field, text) in template order
+        position = 0
+        for match in PLACEHOLDER_PATTERN.finditer(template):
+            self.parts.append((False, template[position:match.start()]))
+            self.parts.append((True, match.group(1)))
+            position = match.end()
+        self.parts.append((False, template[position:]))
+        self.fields = list(dict.fromkeys(text for is_field, text in self.parts if is_field))
+
+    def missing_fields(self, columns):
+        """Fields used in the template that are not among `columns`"""
+        available = {str(col) for col in columns}
+        return [field for field in self.fields if field not in available]
+
+    def render(self, row_data):
+        """Render the message for one row (dict of column -> value)"""
+        values = {str(key): value for key, value in row_data.items()}
+        pieces = []
+        for is_field, text in self.parts:
+            if not is_field:
+                pieces.append(text)
+            elif text in values:
+                pieces.append(str(values[text]))
+            else:
+                pieces.append(f"{{{text}}}")
+        return "".join(pieces)
+
+    def render_column(self, frame):
+        """Render the message for every row of a DataFrame at once. Returns a Series"""
+        columns = {str(col): col for col in frame.columns}
+        messages = pd.Series("", index=frame.index, dtype=object)
+        for is_field, text in self.parts:
+            if not is_field:
+                messages = messages + text
+            elif text in columns:
+                values = frame[columns[text]]
+                # Same text as str(value) gives for missing values in render()
+                # (as object, since pandas can't add an empty object Series to an empty str one)
+                messages = messages + values.astype(str).where(values.notna(), "nan").astype(object)
+            else:
+                messages = messages + f"{{{text}}}"
+        return messages
+
+# Function to personalize message
+def personalize_message(template, row_data):
+    """
+    Replace variables in template with actual values from row data.
+    Variables format: {column_name}
+    """
+    return MessageTemplate(template).render(row_data)
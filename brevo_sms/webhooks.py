@@ -0,0 +1,286 @@
+"""Receiver for Brevo transactional SMS webhooks, and a replayer of recorded payloads.
+
+    python -m brevo_sms.webhooks serve --port 8030 --token SECRET
+    python -m brevo_sms.webhooks replay sample_sms_webhooks.jsonl --url http://127.0.0.1:8030/brevo/sms?token=SECRET
+"""
+import argparse
+import hmac
+import ipaddress
+import json
+import os
+import queue
+import re
+import sys
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import requests
+
+from .events import SOURCE_WEBHOOK, EventStore
+from .metrics import WEBHOOK_EVENTS
+
+# Webhook msg_status values (lowercase, letters only) -> event names of the events API
+WEBHOOK_EVENT_NAMES = {
+    "accepted": "accepted",
+    "sent": "sent",
+    "delivered": "delivered",
+    "softbounce": "softBounces",
+    "softbounces": "softBounces",
+    "hardbounce": "hardBounces",
+    "hardbounces": "hardBounces",
+    "blacklisted": "blocked",
+    "blocked": "blocked",
+    "rejected": "rejected",
+    "unsubscribe": "unsubscribed",
+    "unsubscribed": "unsubscribed",
+    "reply": "replies",
+    "replied": "replies",
+    "replies": "replies",
+    "skip": "skipped",
+    "skipped": "skipped",
+}
+
+# Event names -> the msg_status Brevo posts for them
+WEBHOOK_STATUSES = {
+    "accepted": "accepted",
+    "sent": "sent",
+    "delivered": "delivered",
+    "softBounces": "soft_bounce",
+    "hardBounces": "hard_bounce",
+    "blocked": "blacklisted",
+    "rejected": "rejected",
+    "unsubscribed": "unsubscribe",
+    "replies": "reply",
+    "skipped": "skip",
+}
+
+WEBHOOK_PATH = "/brevo/sms"
+WEBHOOK_HOST = "127.0.0.1"
+SUBSCRIBER_QUEUE_SIZE = 100000
+
+# Function to tell whether an address only accepts local connections
+def is_loopback(host):
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False  # Host names and "" (every interface) may be reachable from outside
+
+# Function to turn a webhook payload into a stored event
+def parse_webhook_event(payload):
+    """
+    Convert one Brevo SMS webhook payload (msg_status, messageId, to, date,
+    description, tag...) into the event dict EventStore stores.
+    Payloads already in the events API shape (with "event") pass through.
+    Returns: event dict, or None if the payload is not a delivery event
+    """
+    if not isinstance(payload, dict) or payload.get("messageId") in (None, ""):
+        return None
+    if "event" in payload:
+        return {key: payload.get(key, "") for key in ("messageId", "phoneNumber", "event", "reason", "date", "tag")}
+    status = re.sub(r"[^a-z]", "", str(payload.get("msg_status") or payload.get("status") or "").lower())
+    if not status:
+        return None
+    # Dated like the events API once stored (see EventStore.add_events())
+    event_date = str(payload.get("date") or datetime.now().astimezone().isoformat(timespec="milliseconds"))
+    return {
+        "messageId": str(payload["messageId"]),
+        "phoneNumber": str(payload.get("to") or payload.get("phoneNumber") or ""),
+        "event": WEBHOOK_EVENT_NAMES.get(status, status),
+        "reason": payload.get("description") or payload.get("reason") or "",
+        "date": event_date,
+        "tag": payload.get("tag") or ""
+    }
+
+# Function to build the webhook payload of an event
+def webhook_payload(event):
+    """Inverse of parse_webhook_event(): the payload Brevo would POST for an events API event"""
+    return {
+        "messageId": event["messageId"],
+        "to": event.get("phoneNumber", ""),
+        "msg_status": WEBHOOK_STATUSES.get(event["event"], event["event"]),
+        "date": event.get("date", ""),
+        "description": event.get("reason", ""),
+        "tag": event.get("tag", ""),
+        "type": "sms"
+    }
+
+# HTTP endpoint Brevo posts delivery events to
+class WebhookReceiver:
+    """
+    Serves POST {path} from a background thread. Each payload (one object or a
+    list) is stored in the EventStore as it arrives and handed to every
+    subscriber queue, so a running campaign sees delivery events without
+    polling the events API. With a token, requests must carry ?token=... or
+    an "Authorization: Bearer ..." header. Delivery events feed the suppression
+    list, so listening beyond loopback (e.g. host="0.0.0.0") requires a token.
+    """
+    def __init__(self, event_store=None, host=WEBHOOK_HOST, port=8030, path=WEBHOOK_PATH, token=None):
+        if not token and not is_loopback(host):
+            raise ValueError(f"a webhook receiver listening on {host or 'every interface'} needs a token, "
+                             "or anyone who can reach it could suppress numbers")
+        self.event_store = event_store if event_store is not None else EventStore()
+        self.path = path
+        self.token = token
+        self.received = 0
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), _make_handler(self))
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{'127.0.0.1' if host == '0.0.0.0' else host}:{port}{self.path}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def subscribe(self):
+        """Returns: a queue that receives a list of event dicts per webhook call"""
+        subscriber = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            if subscriber in self._subscribers:
+                self._subscribers.remove(subscriber)
+
+    def receive(self, payload):
+        """Store and publish the events of one webhook body. Returns: number of events"""
+        payloads = payload if isinstance(payload, list) else [payload]
+        events = [event for event in map(parse_webhook_event, payloads) if event is not None]
+        if not events:
+            return 0
+        self.event_store.add_events(events, source=SOURCE_WEBHOOK)
+        with self._lock:
+            self.received += len(events)
+            subscribers = list(self._subscribers)
+        for event in events:
+            WEBHOOK_EVENTS.inc(event=event["event"])
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(events)
+            except queue.Full:
+                pass  # A stalled view must not block Brevo; the events are stored anyway
+        return len(events)
+
+    def authorized(self, query, headers):
+        if not self.token:
+            return True
+        # Constant-time comparisons, so response times don't reveal how much of a guess was right
+        expected = self.token.encode()
+        if hmac.compare_digest(query.get("token", [""])[-1].encode(), expected):
+            return True
+        return hmac.compare_digest(headers.get("Authorization", "").encode(), b"Bearer " + expected)
+
+# Function to build the request handler class of a receiver
+def _make_handler(receiver):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True  # Headers and body go out in two writes; don't hold the body for an ACK
+
+        def _reply(self, status_code, body):
+            data = json.dumps(body).encode()
+            self.send_response(status_code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            url = urlparse(self.path)
+            length = int(self.headers.get("Content-Length", 0))
+            body = self.rfile.read(length)
+            if url.path != receiver.path:
+                self._reply(404, {"message": "Not found"})
+                return
+            if not receiver.authorized(parse_qs(url.query), self.headers):
+                self._reply(401, {"message": "Unauthorized"})
+                return
+            try:
+                payload = json.loads(body or b"{}")
+            except ValueError:
+                self._reply(400, {"message": "Invalid JSON"})
+                return
+            self._reply(200, {"received": receiver.receive(payload)})
+
+        def log_message(self, format, *args):
+            pass  # One line per delivery event would flood the console
+
+    return Handler
+
+# Function to post recorded webhook payloads to a receiver
+def replay_webhooks(url, payloads, interval=0.0, session=None):
+    """
+    POST each payload to `url`, `interval` seconds apart, like Brevo would.
+    Returns: number of payloads the receiver accepted
+    """
+    session = session or requests.Session()
+    accepted = 0
+    for payload in payloads:
+        response = session.post(url, json=payload, timeout=10)
+        if response.ok:
+            accepted += 1
+        if interval:
+            time.sleep(interval)
+    return accepted
+
+# Function to read recorded webhook payloads
+def read_payloads(path):
+    """Payloads from a JSON lines file (one payload per line) or a JSON list"""
+    with open(path, encoding="utf-8") as payload_file:
+        text = payload_file.read().strip()
+    if text.startswith("["):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="brevo-sms-webhooks", description="Receive or replay Brevo SMS webhooks.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    serve_parser = subparsers.add_parser("serve", help="Store delivery events Brevo posts to this machine")
+    serve_parser.add_argument("--host", default=WEBHOOK_HOST,
+                              help=f"Address to listen on (default: {WEBHOOK_HOST}; any other needs --token)")
+    serve_parser.add_argument("--port", type=int, default=8030)
+    serve_parser.add_argument("--path", default=WEBHOOK_PATH, help=f"URL path of the webhook (default: {WEBHOOK_PATH})")
+    serve_parser.add_argument("--token", default=os.environ.get("BREVO_WEBHOOK_TOKEN"),
+                              help="Shared secret expected as ?token= or a Bearer header (default: $BREVO_WEBHOOK_TOKEN)")
+    replay_parser = subparsers.add_parser("replay", help="POST recorded webhook payloads to a receiver")
+    replay_parser.add_argument("payloads", help="JSON lines (or JSON list) file of webhook payloads")
+    replay_parser.add_argument("--url", required=True, help="Receiver URL, including ?token= if it needs one")
+    replay_parser.add_argument("--interval", type=float, default=0.0, help="Seconds between payloads (default: 0)")
+    args = parser.parse_args(argv)
+
+    if args.command == "replay":
+        payloads = read_payloads(args.payloads)
+        accepted = replay_webhooks(args.url, payloads, interval=args.interval)
+        print(json.dumps({"type": "replay", "payloads": len(payloads), "accepted": accepted}))
+        return
+
+    try:
+        receiver = WebhookReceiver(host=args.host, port=args.port, path=args.path, token=args.token).start()
+    except ValueError as e:
+        raise SystemExit(f"error: {e}")
+    print(f"Receiving Brevo SMS webhooks on {receiver.url}; Ctrl+C to stop", file=sys.stderr)
+    try:
+        while True:
+            time.sleep(10)
+            print(json.dumps({"type": "webhooks", "received": receiver.received}))
+    except KeyboardInterrupt:
+        receiver.stop()
+
+if __name__ == "__main__":
+    main()
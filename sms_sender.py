@@ -1,9 +1,28 @@
+import os
+
 import streamlit as st
 import pandas as pd
-import requests
-import time
-from datetime import datetime
-import re
+from datetime import datetime, time, timedelta
+
+from brevo_sms import (
+    COUNTRIES, NAME_KEYWORDS, PHONE_KEYWORDS, TRANSLITERATION_TABLE, BrevoClient, CampaignJournal, CampaignProgress,
+    EventStore, MessageTemplate, RetryPolicy, auto_detect_column, campaign_fingerprint, check_delivery_status,
+    count_sms_segments, count_unsent, iter_contact_chunks, personalize_message, read_contacts_preview,
+    run_bulk_campaign, run_campaign
+)
+from brevo_sms.client import httpx
+from brevo_sms.contact_cache import ContactCache
+from brevo_sms.contacts import (CONTACT_FILE_TYPES, PREVIEW_ROWS, add_first_name_columns, contact_columns,
+                                contact_file_format)
+from brevo_sms.history import HISTORY_PAGE_SIZE, CampaignHistory
+from brevo_sms.metrics import METRICS_HOST, serve_metrics, stage
+from brevo_sms.numbering import PrefixTrie
+from brevo_sms.results import ResultSpool, SendResult, read_results, results_frame, write_results
+from brevo_sms.schedule import WEEKDAYS, SendWindow, WindowPacer
+from brevo_sms.status import Status
+from brevo_sms.storage import data_path
+from brevo_sms.suppression import SuppressionIndex
+from brevo_sms.webhooks import WEBHOOK_HOST, WebhookReceiver
 
 # Page configuration
 st.set_page_config(
@@ -15,8 +34,9 @@ st.set_page_config(
 # Initialize session state
 if 'sending_in_progress' not in st.session_state:
     st.session_state.sending_in_progress = False
-if 'results_history' not in st.session_state:
-    st.session_state.results_history = []
+if 'last_results_file' not in st.session_state:
+    st.session_state.last_results_file = None
+    st.session_state.last_results_count = 0
 
 # Title and description
 st.title("📱 Bulk SMS Sender")
@@ -62,23 +82,15 @@ sms_content = st.sidebar.text_area(
 
 # Character count (based on template)
 char_count = len(sms_content)
-sms_count = (char_count // 160) + 1 if char_count > 0 else 0
-st.sidebar.info(f"Template Characters: {char_count} | Estimated SMS Parts: {sms_count}")
+template_encoding, sms_count = count_sms_segments(sms_content)
+st.sidebar.info(f"Template Characters: {char_count} | Estimated SMS Parts: {sms_count} ({template_encoding})")
 st.sidebar.markdown("💡 **Tip**: Use `{name}` or `{username}` for personalization")
 
 # Optional parameters
 st.sidebar.header("🔧 Optional Settings")
 
 # Country code selector
-country_options = {
-    "🇺🇸 United States/Canada (+1)": {"code": "1", "length": 10},
-    "🇮🇳 India (+91)": {"code": "91", "length": 10},
-    "🇬🇧 United Kingdom (+44)": {"code": "44", "length": 10},
-    "🇦🇺 Australia (+61)": {"code": "61", "length": 9},
-    "🇸🇬 Singapore (+65)": {"code": "65", "length": 8},
-    "🇦🇪 UAE (+971)": {"code": "971", "length": 9},
-    "🇸🇦 Saudi Arabia (+966)": {"code": "966", "length": 9},
-}
+country_options = {country["label"]: country for country in COUNTRIES.values()}
 
 selected_country = st.sidebar.selectbox(
     "Select Country Code:",
@@ -90,23 +102,89 @@ selected_country = st.sidebar.selectbox(
 country_code = country_options[selected_country]["code"]
 expected_length = country_options[selected_country]["length"]
 
-st.sidebar.info(f"📱 Expected format: {expected_length} digits (without country code)")
+mixed_countries = st.sidebar.checkbox(
+    "Mixed destinations (detect country per number)",
+    value=False,
+    help="Detect each number's country from its calling code (+44..., 0044... or 44...), so one list can cover several countries. Numbers without a calling code are taken as the country selected above."
+)
+
+if mixed_countries:
+    st.sidebar.info(f"📱 Expected format: international (+code) or {expected_length} digits for {selected_country}")
+else:
+    st.sidebar.info(f"📱 Expected format: {expected_length} digits (without country code)")
+
+remove_duplicates = st.sidebar.checkbox(
+    "Remove duplicate numbers",
+    value=True,
+    help="Send only once to numbers that appear more than once in the file (after formatting)"
+)
+skip_suppressed = st.sidebar.checkbox(
+    "Skip suppressed numbers",
+    value=True,
+    help="Do not send to numbers Brevo reported as hard-bounced, blocked or unsubscribed in earlier campaigns"
+)
 
 tag = st.sidebar.text_input("Tag (Optional)", help="Tag for tracking messages")
-unicode_enabled = st.sidebar.checkbox("Unicode Enabled", value=True)
+transliterate = st.sidebar.checkbox(
+    "Transliterate to GSM-7",
+    value=False,
+    help="Replace smart quotes, dashes, accents etc. with plain equivalents. Unicode (UCS-2) messages fit only 70 characters per part instead of 160, so this can cut the number of parts. Unicode is switched on per message, only where it is still needed."
+)
+credits_per_part = st.sidebar.number_input(
+    "Credits per SMS part",
+    min_value=0.0,
+    value=1.0,
+    step=0.1,
+    help="Brevo credits charged per SMS part for your destination, used for the cost estimate"
+)
 
-# SMS sending delay control
+# SMS sending rate control
 st.sidebar.markdown("---")
 st.sidebar.markdown("**⏱️ Rate Limiting**")
-sms_delay = st.sidebar.slider(
-    "Delay between SMS (seconds):",
-    min_value=0.5,
-    max_value=60.0,
-    value=3.0,
-    step=0.5,
-    help="Time to wait between sending each SMS. Increase if you're hitting rate limits. Recommended: 3 seconds. Max: 60 seconds (1 minute)."
+sms_rate = st.sidebar.slider(
+    "Send rate (SMS per second):",
+    min_value=0.1,
+    max_value=50.0,
+    value=1.0,
+    step=0.1,
+    help="Target throughput shared by all concurrent requests. With adaptive rate on, this is the ceiling the sender ramps up to."
+)
+adaptive_rate = st.sidebar.checkbox(
+    "Adapt to Brevo rate limits",
+    value=True,
+    help="Slow down automatically when Brevo answers 429 or its rate-limit headers say the quota is running out, then speed back up while responses are clean."
+)
+max_concurrency = st.sidebar.slider(
+    "Concurrent requests:",
+    min_value=1,
+    max_value=32,
+    value=8,
+    help="How many SMS requests can be in flight at once. Network latency overlaps across requests, so the send rate is reached even on slow connections."
+)
+st.sidebar.caption(f"📊 Speed: ~{int(sms_rate * 60)} SMS per minute")
+max_attempts = st.sidebar.number_input(
+    "Max attempts per message",
+    min_value=1,
+    max_value=10,
+    value=3,
+    help="Messages that fail with a temporary error (rate limited, server error, network error, soft bounce, rejection) are retried automatically with increasing delays, up to this many attempts in total."
 )
-st.sidebar.caption(f"📊 Speed: ~{int(60/sms_delay)} SMS per minute | {round(sms_delay/60, 2)} min per SMS" if sms_delay >= 60 else f"📊 Speed: ~{int(60/sms_delay)} SMS per minute")
+
+with st.sidebar.expander("🔌 Connection Settings"):
+    request_timeout = st.number_input(
+        "Request timeout (seconds):",
+        min_value=1.0,
+        max_value=120.0,
+        value=30.0,
+        step=1.0,
+        help="Maximum time to wait for Brevo to answer a single request"
+    )
+    use_http2 = st.checkbox(
+        "Use HTTP/2",
+        value=False,
+        disabled=httpx is None,
+        help="Multiplex requests over one connection. Requires `pip install httpx[http2]`."
+    )
 
 # Option to add STOP CODE for compliance
 st.sidebar.markdown("---")
@@ -124,134 +202,127 @@ if add_stop_code:
         help="This text will be added at the end of your message for compliance"
     )
 
-# Function to validate and format phone number
-def format_phone_number(phone, country_code, expected_length):
-    """
-    Format phone number based on length and country code.
-    Returns formatted number with country code or None if invalid.
-    """
-    # Remove any non-digit characters
-    phone = re.sub(r'\D', '', str(phone))
-    
-    # Check if it already has the country code
-    if phone.startswith(country_code) and len(phone) == len(country_code) + expected_length:
-        return phone  # Already formatted correctly
-    
-    # Check if it's the expected length (without country code)
-    elif len(phone) == expected_length:
-        return country_code + phone  # Add country code
-    
-    # Check if it might be the full number with country code
-    elif len(phone) == len(country_code) + expected_length:
-        return phone  # Assume it's already complete
-    
+# One send lane per destination for mixed lists, each with its own pace and opt-out text
+lane_rates = None
+stop_texts = None
+if mixed_countries:
+    with st.sidebar.expander("🛣️ Send Lanes per Country"):
+        st.caption("Each country is sent through its own lane. A max rate of 0 uses the overall send rate; opt-out text overrides the one above for that country (only if opt-out is enabled).")
+        lanes_df = st.data_editor(
+            pd.DataFrame({
+                "Country": list(COUNTRIES),
+                "Max rate (SMS/s)": [0.0] * len(COUNTRIES),
+                "Opt-out text": [stop_text if add_stop_code else ""] * len(COUNTRIES)
+            }),
+            disabled=["Country"],
+            hide_index=True,
+            key="send_lanes"
+        )
+    lane_rates = {row["Country"]: float(row["Max rate (SMS/s)"]) or None for row in lanes_df.to_dict("records")}
+    if add_stop_code:
+        stop_texts = {row["Country"]: row["Opt-out text"] or "" for row in lanes_df.to_dict("records")}
+
+# Optional sending hours in the recipients' local time
+send_window = None
+send_deadline = None
+with st.sidebar.expander("🕘 Sending Window"):
+    use_window = st.checkbox(
+        "Only send during allowed hours",
+        value=False,
+        help="Send only while it is within these hours for the recipients (e.g. 9 AM to 9 PM for promotional SMS in India). Sending pauses when the window closes and resumes when it opens, at a pace that fits the campaign in."
+    )
+    window_start = st.time_input("From (recipients' local time)", value=time(9, 0), disabled=not use_window)
+    window_end = st.time_input("Until", value=time(21, 0), disabled=not use_window)
+    window_days = st.multiselect("Days", WEEKDAYS, default=list(WEEKDAYS), format_func=str.title, disabled=not use_window)
+    use_deadline = st.checkbox(
+        "Spread over several days until a deadline",
+        value=False,
+        disabled=not use_window,
+        help="Without a deadline the campaign is fitted into the current (or next) opening of the window."
+    )
+    deadline_date = st.date_input("Finish by", value=datetime.now().date() + timedelta(days=1),
+                                  disabled=not (use_window and use_deadline))
+    deadline_time = st.time_input("at (this computer's time)", value=time(21, 0),
+                                  disabled=not (use_window and use_deadline))
+if use_window and window_days:
+    weekdays = [WEEKDAYS.index(day) for day in window_days]
+    if mixed_countries:
+        send_window = {key: SendWindow(window_start, window_end, country["timezones"], weekdays)
+                       for key, country in COUNTRIES.items()}
     else:
-        return None  # Invalid format
+        timezones = country_options[selected_country]["timezones"]
+        send_window = SendWindow(window_start, window_end, timezones, weekdays)
+        st.sidebar.caption(f"🕘 Recipients' time zone(s): {', '.join(timezones)}")
+    if use_deadline:
+        send_deadline = datetime.combine(deadline_date, deadline_time).astimezone()
 
-# Function to send SMS via Brevo API
-def send_sms(api_key, sender, recipient, content, sms_type="marketing", tag=None, unicode_enabled=True, org_prefix=None):
-    """
-    Send SMS using Brevo API
-    Returns: (success: bool, message_id: str, error: str, status_code: int)
-    """
-    url = "https://api.brevo.com/v3/transactionalSMS/send"
-    
-    headers = {
-        "accept": "application/json",
-        "api-key": api_key,
-        "content-type": "application/json"
-    }
-    
-    payload = {
-        "sender": sender,
-        "recipient": recipient,
-        "content": content,
-        "type": sms_type,
-        "unicodeEnabled": unicode_enabled
-    }
-    
-    if tag:
-        payload["tag"] = tag
-    
-    if org_prefix:
-        payload["organisationPrefix"] = org_prefix
-    
-    try:
-        response = requests.post(url, json=payload, headers=headers)
-        
-        if response.status_code == 201:
-            data = response.json()
-            return True, data.get("messageId", "N/A"), None, 201
-        else:
-            error_msg = response.json().get("message", response.text) if response.text else f"HTTP {response.status_code}"
-            return False, None, error_msg, response.status_code
-    except Exception as e:
-        return False, None, str(e), 0
+# Shared Brevo client, kept across reruns so its connection pool stays warm
+@st.cache_resource
+def get_brevo_client(api_key, pool_size, timeout, http2):
+    return BrevoClient(api_key, pool_size=pool_size, timeout=timeout, http2=http2)
 
-# Function to check SMS delivery status
-def check_sms_status(api_key, message_id=None, phone_number=None, days=1):
-    """
-    Check SMS delivery status using Brevo events API
-    Returns: list of events or None if error
-    """
-    url = "https://api.brevo.com/v3/transactionalSMS/statistics/events"
-    
-    headers = {
-        "accept": "application/json",
-        "api-key": api_key
-    }
-    
-    params = {
-        "limit": 50,
-        "sort": "desc",
-        "days": days
-    }
-    
-    if phone_number:
-        params["phoneNumber"] = phone_number
-    
-    try:
-        response = requests.get(url, headers=headers, params=params)
-        if response.status_code == 200:
-            data = response.json()
-            events = data.get("events", [])
-            if message_id:
-                # Filter by message ID
-                events = [e for e in events if str(e.get("messageId")) == str(message_id)]
-            return events
-        else:
-            return None
-    except Exception as e:
-        return None
+brevo_client = get_brevo_client(api_key, max_concurrency, request_timeout, use_http2)
 
-# Function to get delivery status description
-def get_delivery_status(event_type):
-    """
-    Convert event type to user-friendly status
-    """
-    status_map = {
-        "sent": "📤 Sent to carrier",
-        "delivered": "✅ Delivered",
-        "hardBounces": "❌ Hard Bounce",
-        "softBounces": "⚠️ Soft Bounce",
-        "blocked": "🚫 Blocked",
-        "rejected": "❌ Rejected",
-        "accepted": "✓ Accepted",
-        "unsubscribed": "🚫 Unsubscribed"
-    }
-    return status_map.get(event_type, f"❓ {event_type}")
+# Shared local copy of delivery events
+@st.cache_resource
+def get_event_store():
+    return EventStore()
 
-# Function to personalize message
-def personalize_message(template, row_data):
-    """
-    Replace variables in template with actual values from row data.
-    Variables format: {column_name}
-    """
-    message = template
-    for key, value in row_data.items():
-        placeholder = f"{{{key}}}"
-        message = message.replace(placeholder, str(value))
-    return message
+event_store = get_event_store()
+
+# Suppression index, rebuilt only when delivery events change the suppression list
+@st.cache_resource(max_entries=1)
+def get_suppression_index(version):
+    return SuppressionIndex.from_event_stores(event_store)
+
+# Shared campaign journal, so interrupted campaigns can be resumed
+@st.cache_resource
+def get_campaign_journal():
+    return CampaignJournal()
+
+campaign_journal = get_campaign_journal()
+
+# Shared history of finished campaigns, bounded in size and age
+@st.cache_resource
+def get_campaign_history():
+    return CampaignHistory()
+
+campaign_history = get_campaign_history()
+
+# Parsed and validated contact files, so settings changes don't re-read the upload
+@st.cache_resource
+def get_contact_cache():
+    return ContactCache()
+
+contact_cache = get_contact_cache()
+
+# Calling-code trie for mixed destination lists, compiled once
+@st.cache_resource
+def get_numbering_plan():
+    return PrefixTrie(COUNTRIES)
+
+numbering_plan = get_numbering_plan()
+
+# Prometheus metrics endpoint, started once per server process when BREVO_METRICS_PORT is set
+@st.cache_resource
+def get_metrics_server(host, port):
+    return serve_metrics(port, host)
+
+if os.environ.get("BREVO_METRICS_PORT"):
+    get_metrics_server(os.environ.get("BREVO_METRICS_HOST", METRICS_HOST), int(os.environ["BREVO_METRICS_PORT"]))
+
+# Delivery webhook receiver, started once per server process when BREVO_WEBHOOK_PORT is set
+@st.cache_resource
+def get_webhook_receiver(host, port, token):
+    return WebhookReceiver(event_store, host=host, port=port, token=token).start()
+
+webhook_receiver = None
+if os.environ.get("BREVO_WEBHOOK_PORT"):
+    try:
+        webhook_receiver = get_webhook_receiver(os.environ.get("BREVO_WEBHOOK_HOST", WEBHOOK_HOST),
+                                                int(os.environ["BREVO_WEBHOOK_PORT"]), os.environ.get("BREVO_WEBHOOK_TOKEN"))
+    except ValueError as e:
+        st.sidebar.error(f"Delivery webhooks are off: {e}. Set BREVO_WEBHOOK_TOKEN.")
 
 # Main content area
 st.header("📤 Upload Contact List")
@@ -259,49 +330,36 @@ st.header("📤 Upload Contact List")
 # File upload
 uploaded_file = st.file_uploader(
     "Upload a file with contact information",
-    type=["csv", "xlsx", "xls", "txt"],
-    help="Excel/CSV should have columns for name and phone number. TXT should have one number per line."
+    type=CONTACT_FILE_TYPES,
+    help="Excel/CSV (also .csv.gz/.zip), Parquet or Feather should have columns for name and phone number. TXT should have one number per line."
 )
 
-contacts_df = None
-phone_numbers = []
+preview_df = None
+file_columns = []
+phone_column = None
+name_column = "None"
+txt_uploaded = False
 
 if uploaded_file is not None:
     try:
-        # Read file based on type
-        if uploaded_file.name.endswith('.csv'):
-            contacts_df = pd.read_csv(uploaded_file)
-        elif uploaded_file.name.endswith(('.xlsx', '.xls')):
-            contacts_df = pd.read_excel(uploaded_file)
+        # Read only a preview here; the full file is streamed in chunks later
+        if contact_file_format(uploaded_file.name)[0] != 'txt':
+            preview_df = read_contacts_preview(uploaded_file)
+            file_columns = preview_df.columns.tolist()  # Before the name variables are added below
         else:
-            # Read as text file (one number per line)
-            content = uploaded_file.read().decode('utf-8')
-            phone_numbers = [line.strip() for line in content.split('\n') if line.strip()]
-            st.write(f"**Found {len(phone_numbers)} phone numbers in the file**")
-            st.write("**Sample phone numbers:**", phone_numbers[:5])
+            # Text file (one number per line)
+            txt_uploaded = True
+            phone_column = 'phone'
+            sample_numbers = next(iter_contact_chunks(uploaded_file, chunk_size=PREVIEW_ROWS), pd.DataFrame({'phone': []}))
+            st.write("**Sample phone numbers:**", sample_numbers['phone'].tolist())
         
         # If we have a dataframe (CSV or Excel)
-        if contacts_df is not None:
+        if preview_df is not None:
             st.write("**Preview of uploaded file:**")
-            st.dataframe(contacts_df.head(), use_container_width=True)
-            
+            st.dataframe(preview_df.head(), use_container_width=True)
             # Auto-detect phone and name columns
-            def auto_detect_column(columns, keywords):
-                """Auto-detect column based on keywords (case-insensitive)"""
-                for col in columns:
-                    col_lower = str(col).lower()
-                    for keyword in keywords:
-                        if keyword in col_lower:
-                            return col
-                return None
-            
-            # Phone column keywords
-            phone_keywords = ['phone', 'mobile', 'number', 'contact', 'cell', 'tel']
-            detected_phone = auto_detect_column(contacts_df.columns, phone_keywords)
-            
-            # Name column keywords
-            name_keywords = ['name', 'customer', 'client', 'user', 'recipient', 'contact']
-            detected_name = auto_detect_column(contacts_df.columns, name_keywords)
+            detected_phone = auto_detect_column(preview_df.columns, PHONE_KEYWORDS)
+            detected_name = auto_detect_column(preview_df.columns, NAME_KEYWORDS)
             
             # Column mapping
             st.subheader("📋 Map Your Columns")
@@ -319,7 +377,7 @@ if uploaded_file is not None:
             
             with col1:
                 # Set default index for phone column
-                phone_options = contacts_df.columns.tolist()
+                phone_options = preview_df.columns.tolist()
                 default_phone_index = phone_options.index(detected_phone) if detected_phone and detected_phone in phone_options else 0
                 
                 phone_column = st.selectbox(
@@ -331,8 +389,8 @@ if uploaded_file is not None:
             
             with col2:
                 # Set default index for name column
-                name_options = ["None"] + contacts_df.columns.tolist()
-                if detected_name and detected_name in contacts_df.columns:
+                name_options = ["None"] + preview_df.columns.tolist()
+                if detected_name and detected_name in preview_df.columns:
                     default_name_index = name_options.index(detected_name)
                 else:
                     default_name_index = 0
@@ -347,27 +405,30 @@ if uploaded_file is not None:
             # Show available variables
             if name_column != "None":
                 # Extract first name only (before the first space)
-                contacts_df['name'] = contacts_df[name_column].apply(
-                    lambda x: str(x).split()[0] if pd.notna(x) and str(x).strip() and ' ' in str(x) else str(x)
-                )
-                contacts_df['username'] = contacts_df['name']
+                add_first_name_columns(preview_df, name_column)
                 
                 st.info(f"💡 Use `{{name}}` or `{{username}}` for first name only, `{{{name_column}}}` for full name")
             
             # Show all available variables
-            available_vars = [f"{{{col}}}" for col in contacts_df.columns]
+            available_vars = [f"{{{col}}}" for col in preview_df.columns]
             st.markdown(f"**Available variables:** {', '.join(available_vars)}")
             
             # Show example of first name extraction
-            if name_column != "None" and len(contacts_df) > 0:
-                sample_full_name = contacts_df.iloc[0][name_column]
-                sample_first_name = contacts_df.iloc[0]['name']
+            if name_column != "None" and len(preview_df) > 0:
+                sample_full_name = preview_df.iloc[0][name_column]
+                sample_first_name = preview_df.iloc[0]['name']
                 st.caption(f"Example: Full name `{{{name_column}}}` = \"{sample_full_name}\" → First name `{{name}}` = \"{sample_first_name}\"")
             
             # Preview personalized message
-            if sms_content and len(contacts_df) > 0:
+            if sms_content and len(preview_df) > 0:
                 st.subheader("👁️ Message Preview")
-                sample_row = contacts_df.iloc[0].to_dict()
+                
+                # Report placeholders that don't match any column before anything is sent
+                missing_fields = MessageTemplate(sms_content).missing_fields(preview_df.columns)
+                if missing_fields:
+                    st.warning(f"⚠️ Unknown variables will be sent as typed: {', '.join(f'`{{{field}}}`' for field in missing_fields)}")
+                
+                sample_row = preview_df.iloc[0].to_dict()
                 preview_message = personalize_message(sms_content, sample_row)
                 
                 # Build complete preview
@@ -377,6 +438,10 @@ if uploaded_file is not None:
                 if add_stop_code and stop_text:
                     complete_preview = f"{preview_message} {stop_text}"
                 
+                # Apply the same character replacements as the send pipeline
+                if transliterate:
+                    complete_preview = complete_preview.translate(TRANSLITERATION_TABLE)
+                
                 # Show with organization prefix if provided
                 if org_prefix:
                     complete_preview = f"{org_prefix}: {complete_preview}"
@@ -387,71 +452,123 @@ if uploaded_file is not None:
                 
                 # Show character count warning
                 char_count_preview = len(complete_preview)
-                if char_count_preview > 160:
-                    st.warning(f"⚠️ Message is {char_count_preview} characters. Will be sent as {(char_count_preview // 160) + 1} SMS parts.")
+                preview_encoding, preview_parts = count_sms_segments(complete_preview)
+                if preview_parts > 1:
+                    st.warning(f"⚠️ Message is {char_count_preview} characters ({preview_encoding}). Will be sent as {preview_parts} SMS parts.")
             
     except Exception as e:
         st.error(f"Error reading file: {str(e)}")
 
 # Process and send SMS
 # Determine if we're using dataframe (with personalization) or simple phone list
-use_personalization = contacts_df is not None and phone_column is not None
-data_available = use_personalization or len(phone_numbers) > 0
+use_personalization = preview_df is not None and phone_column is not None
+data_available = use_personalization or txt_uploaded
 
 if data_available:
     st.header("🚀 Send SMS")
     
-    # Prepare contact list
-    contact_list = []
+    # Settings shared by the validation scan and the send pipeline
+    message_options = {
+        'name_column': name_column if name_column != "None" else None,
+        'template': MessageTemplate(sms_content) if use_personalization else None,
+        'default_message': sms_content,
+        'stop_text': stop_text if add_stop_code else None,
+        'org_prefix': org_prefix or None,
+        'transliterate': transliterate,
+        'remove_duplicates': remove_duplicates,
+        'suppressed': get_suppression_index(event_store.suppression_version()) if skip_suppressed else None
+    }
+    if mixed_countries:
+        message_options['numbering'] = numbering_plan
+        message_options['stop_texts'] = stop_texts
     
-    if use_personalization:
-        # Using dataframe with personalization
-        for idx, row in contacts_df.iterrows():
-            phone = row[phone_column]
-            contact_list.append({
-                'phone': phone,
-                'data': row.to_dict()
-            })
-        total_contacts = len(contact_list)
-    else:
-        # Using simple phone number list
-        for phone in phone_numbers:
-            contact_list.append({
-                'phone': phone,
-                'data': {}
-            })
-        total_contacts = len(contact_list)
+    # Validate all numbers once per file, column mapping and country; only the
+    # messages are re-rendered when the template or other settings change
+    with st.spinner("Validating phone numbers..."):
+        validated_contacts = contact_cache.get(
+            uploaded_file,
+            phone_column,
+            country_code,
+            expected_length,
+            name_column=message_options['name_column'],
+            remove_duplicates=remove_duplicates,
+            numbering=message_options.get('numbering'),
+            # Only the mapped columns and those the message uses are read
+            columns=contact_columns(file_columns, phone_column, message_options['name_column'],
+                                    message_options['template']) if use_personalization else None
+        )
+        scan = validated_contacts.scan(**message_options)
+    total_contacts = scan['total']
+    valid_count = scan['valid']
+    invalid_count = scan['invalid']
+    duplicate_count = scan['duplicates']
+    invalid_numbers = scan['invalid_sample']
+    send_count = scan['messages']
     
-    col1, col2, col3 = st.columns(3)
+    col1, col2, col3, col4 = st.columns(4)
     with col1:
         st.metric("Total Contacts", total_contacts)
-    
-    # Validate all numbers first
-    formatted_contacts = []
-    invalid_numbers = []
-    
-    for contact in contact_list:
-        phone = contact['phone']
-        formatted = format_phone_number(phone, country_code, expected_length)
-        if formatted:
-            formatted_contacts.append({
-                'original': phone,
-                'formatted': formatted,
-                'data': contact['data']
-            })
-        else:
-            invalid_numbers.append(phone)
-    
     with col2:
-        st.metric("Valid Numbers", len(formatted_contacts))
+        st.metric("Valid Numbers", valid_count)
     with col3:
-        st.metric("Invalid Numbers", len(invalid_numbers))
+        st.metric("Invalid Numbers", invalid_count)
+    with col4:
+        st.metric("Duplicate Numbers", duplicate_count)
+    
+    # Duplicates are only sent once when removal is enabled
+    if remove_duplicates:
+        if duplicate_count > 0:
+            st.info(f"🔁 {duplicate_count} duplicate number(s) will be skipped so nobody is messaged twice.")
+    elif duplicate_count > 0:
+        st.warning(f"⚠️ {duplicate_count} duplicate number(s) will receive the message more than once.")
+    if scan['suppressed'] > 0:
+        st.info(f"🚫 {scan['suppressed']} number(s) will be skipped: Brevo reported them as hard-bounced, blocked or unsubscribed in earlier campaigns.")
+    if scan['countries']:
+        st.caption("🌍 Messages per country (one send lane each): " + " | ".join(
+            f"{COUNTRIES[country]['label']}: {count}" for country, count in sorted(scan['countries'].items())))
     
     # Show invalid numbers if any
     if invalid_numbers:
         with st.expander("⚠️ Invalid Phone Numbers", expanded=False):
+            if invalid_count > len(invalid_numbers):
+                st.caption(f"Showing the first {len(invalid_numbers)} of {invalid_count}")
             st.write(invalid_numbers)
     
+    # Cost and time forecast from the actual rendered messages
+    if sms_content and send_count > 0:
+        st.subheader("💰 Forecast")
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("Messages to Send", send_count)
+        with col2:
+            st.metric("SMS Parts", scan['segments'])
+        with col3:
+            st.metric("Estimated Credits", round(scan['segments'] * credits_per_part, 2))
+        with col4:
+            st.metric("Estimated Send Time", str(timedelta(seconds=int(send_count / sms_rate))))
+        
+        if send_window is not None:
+            # Same plan the pacer starts the campaign with
+            windows = send_window if isinstance(send_window, dict) else {None: send_window}
+            expected_counts = scan['countries'] if isinstance(send_window, dict) else {None: send_count}
+            for lane, window in windows.items():
+                if not expected_counts.get(lane):
+                    continue
+                plan = WindowPacer(None, window, expected_counts[lane], (lane_rates or {}).get(lane) or sms_rate,
+                                   deadline=send_deadline).plan()
+                label = f"{COUNTRIES[lane]['label']}: " if lane else ""
+                if plan["opens_at"] is None:
+                    st.warning(f"🕘 {label}The sending window never opens on the selected days.")
+                    continue
+                start_note = "now" if plan["open"] else f"at {plan['opens_at'].astimezone():%a %H:%M}"
+                fits = plan["rate"] < ((lane_rates or {}).get(lane) or sms_rate)
+                st.caption(f"🕘 {label}Sending starts {start_note} at ~{plan['rate']:.2f} SMS/s"
+                           + ("" if fits else " (the top rate: the campaign may need more than one opening)"))
+        if scan['unicode_messages'] > 0:
+            st.caption(f"🔤 {scan['unicode_messages']} message(s) contain characters outside GSM-7 and will be sent as Unicode (70 characters per part instead of 160).")
+        if scan['transliterable'] > 0:
+            st.info(f"💡 {scan['transliterable']} Unicode message(s) would fit in GSM-7 with **Transliterate to GSM-7** turned on in the sidebar, reducing the number of parts carriers have to handle.")
+    
     # Validation before sending
     ready_to_send = True
     error_messages = []
@@ -468,7 +585,7 @@ if data_available:
         error_messages.append("⚠️ Please enter SMS message content")
         ready_to_send = False
     
-    if len(formatted_contacts) == 0:
+    if send_count == 0:
         error_messages.append("⚠️ No valid phone numbers to send to")
         ready_to_send = False
     
@@ -477,157 +594,228 @@ if data_available:
         for msg in error_messages:
             st.error(msg)
     
+    # The same message for everyone can go out as one Brevo SMS campaign instead of one call per number
+    bulk_mode = False
+    same_message = not use_personalization or not message_options['template'].fields
+    if same_message and send_window is None and len(set((stop_texts or {}).values())) <= 1:
+        bulk_mode = st.checkbox(
+            "📦 Send as one Brevo SMS campaign",
+            value=False,
+            help="Imports the numbers as a Brevo contact list and sends a single SMS campaign to it: a handful of API calls instead of one per number, with Brevo pacing delivery. Results are per campaign (Brevo's report), not per number."
+        )
+    
+    # Look for an interrupted run of this exact campaign (same file and settings)
+    fingerprint = campaign_fingerprint(
+        uploaded_file,
+        sender=sender_name,
+        country_code=country_code,
+        tag=tag,
+        **{key: value.signature if key == 'numbering' else value
+           for key, value in message_options.items() if key not in ('template', 'suppressed')},
+        # A broadcast keeps one journal entry, not one per number: it never resumes a per-message run
+        **({'bulk': True} if bulk_mode else {})
+    )
+    unfinished = campaign_journal.find_unfinished(fingerprint)
+    if unfinished and bulk_mode:
+        st.info(f"⏯️ An interrupted broadcast of this campaign from {unfinished['created_at']} was found. Sending again resumes it and does not send it twice.")
+    elif unfinished:
+        st.info(f"⏯️ An interrupted run of this campaign from {unfinished['created_at']} was found: {unfinished['completed']} of {send_count} message(s) already sent. Sending again resumes it and skips them.")
+        if st.button("🗑️ Discard and start over", disabled=st.session_state.sending_in_progress):
+            campaign_journal.finish_campaign(unfinished['campaign_id'], status="abandoned")
+            st.rerun()
+    
     # Send button
-    send_label = "📨 Send Personalized SMS to All" if use_personalization else "📨 Send SMS to All Numbers"
+    if unfinished:
+        send_label = "▶️ Resume Campaign"
+    elif bulk_mode:
+        send_label = f"📦 Send One SMS Campaign to {send_count} Numbers"
+    else:
+        send_label = "📨 Send Personalized SMS to All" if use_personalization else "📨 Send SMS to All Numbers"
     button_disabled = not ready_to_send or st.session_state.sending_in_progress
     
     send_button = st.button(send_label, type="primary", disabled=button_disabled, use_container_width=True)
     
-    if send_button:
+    if send_button and bulk_mode:
+        st.session_state.sending_in_progress = True
+        
+        st.header("📊 Sending Progress")
+        st.info("⏳ **Important**: Keep this tab open until the campaign is handed to Brevo. Once it is sending, Brevo delivers it even if the tab is closed.")
+        
+        if unfinished:
+            campaign_id = unfinished['campaign_id']
+        else:
+            campaign_id = campaign_journal.start_campaign(fingerprint, name=uploaded_file.name, sender=sender_name)
+        
+        status_text = st.empty()
+        report_placeholder = st.empty()
+        done = None
+        
+        # Import the numbers into a contact list, create one SMS campaign for it and send it
+        for event in run_bulk_campaign(
+            brevo_client,
+            validated_contacts.iter_contacts(**message_options),
+            sender_name,
+            org_prefix=org_prefix or None,
+            name=f"{uploaded_file.name} {datetime.now():%Y-%m-%d %H:%M}",
+            journal=campaign_journal,
+            campaign_id=campaign_id
+        ):
+            if event["type"] == "list":
+                status_text.text(f"Created contact list {event['list_id']}...")
+            elif event["type"] == "import":
+                status_text.text(f"Importing {event['numbers']} number(s) into Brevo...")
+            elif event["type"] == "imported":
+                status_text.text(f"Imported {event['numbers']} number(s), creating the SMS campaign...")
+            elif event["type"] == "sms_campaign":
+                status_text.text(f"Created SMS campaign {event['sms_campaign_id']}, sending...")
+            elif event["type"] == "sending":
+                status_text.text("⏳ Brevo is sending the campaign, waiting for its report...")
+            elif event["type"] == "already_sent":
+                st.info("⏭️ The interrupted run had already handed this campaign to Brevo; it was not sent again.")
+            elif event["type"] == "report":
+                with report_placeholder.container():
+                    col1, col2, col3, col4 = st.columns(4)
+                    col1.metric("Status", event["status"] or "unknown")
+                    col2.metric("✅ Delivered", event.get("delivered", 0))
+                    col3.metric("⏳ Processing", event.get("processing", 0))
+                    col4.metric("❌ Bounced", event.get("softBounced", 0) + event.get("hardBounced", 0))
+            elif event["type"] == "error":
+                st.error(f"⚠️ The broadcast stopped at the {event['step']} step: {event['error']}")
+            elif event["type"] == "done":
+                done = event
+        
+        st.session_state.sending_in_progress = False
+        
+        if done is not None:
+            status_text.text(f"✅ Campaign sent to {done['recipients']} number(s) with {done['api_calls']} API call(s)")
+            if scan['suppressed'] > 0:
+                st.caption(f"🚫 {scan['suppressed']} suppressed number(s) were skipped before importing.")
+            st.caption("Per-number delivery results are not kept for broadcasts; see the campaign's report in Brevo.")
+    
+    elif send_button:
         # Set flag to prevent interruptions
         st.session_state.sending_in_progress = True
         
         st.header("📊 Sending Progress")
-        st.info("⏳ **Important**: Do not refresh the page or close this tab until sending is complete!")
+        st.info("⏳ **Important**: Keep this tab open until sending is complete. Progress is saved: if the page is refreshed, upload the same file with the same settings to resume without re-sending.")
+        
+        if unfinished:
+            campaign_id = unfinished['campaign_id']
+        else:
+            campaign_id = campaign_journal.start_campaign(fingerprint, name=uploaded_file.name, sender=sender_name)
         
         # Progress bar
         progress_bar = st.progress(0)
         status_text = st.empty()
         
-        # Results tracking
-        results = []
+        # Results tracking: rows go to disk as they arrive rather than into the session
+        results_file = data_path(f"results_{campaign_id}.csv.gz")
+        results = ResultSpool(results_file)
+        progress = CampaignProgress(send_count)
         
-        # Create a placeholder for real-time results
+        # Placeholders for running counters and the most recent results
+        counters_placeholder = st.empty()
         results_placeholder = st.empty()
         
-        # Send SMS to each contact
-        for idx, contact in enumerate(formatted_contacts):
-            original_number = contact['original']
-            formatted_number = contact['formatted']
-            contact_data = contact['data']
-            
-            # Personalize message if data available
-            if use_personalization and contact_data:
-                personalized_content = personalize_message(sms_content, contact_data)
-                # Use first name for display if available
-                if name_column != "None" and 'name' in contact_data:
-                    display_name = contact_data['name']  # This is the first name
-                else:
-                    display_name = contact_data.get(name_column, original_number) if name_column != "None" else original_number
-            else:
-                personalized_content = sms_content
-                display_name = original_number
-            
-            # Add opt-out text if enabled
-            if add_stop_code and stop_text:
-                personalized_content = f"{personalized_content} {stop_text}"
-            
-            status_text.text(f"Sending to {display_name} ({idx + 1}/{len(formatted_contacts)})...")
-            
-            success, message_id, error, status_code = send_sms(
-                api_key=api_key,
-                sender=sender_name,
-                recipient=formatted_number,
-                content=personalized_content,
-                sms_type="marketing",
-                tag=tag,
-                unicode_enabled=unicode_enabled,
-                org_prefix=org_prefix if org_prefix else None
-            )
-            
-            # Determine detailed status
-            if success:
-                # Wait a moment for Brevo to process, then check actual status
-                time.sleep(2)  # Give Brevo time to process
-                
-                # Check actual delivery status from Brevo
-                events = check_sms_status(api_key, message_id=message_id, days=1)
-                
-                if events and len(events) > 0:
-                    latest_event = events[0]
-                    event_type = latest_event.get("event", "")
-                    event_reason = latest_event.get("reason", "")
-                    
-                    # Map actual Brevo status
-                    if event_type == "rejected":
-                        api_status = "❌ Rejected by Brevo"
-                        can_retry = True
-                        error = event_reason if event_reason else "Rejected by Brevo"
-                    elif event_type == "blocked":
-                        api_status = "🚫 Blocked by Carrier"
-                        can_retry = False
-                        error = event_reason if event_reason else "Blocked by carrier"
-                    elif event_type == "hardBounces":
-                        api_status = "❌ Hard Bounce"
-                        can_retry = False
-                        error = event_reason if event_reason else "Invalid number"
-                    elif event_type == "softBounces":
-                        api_status = "⚠️ Soft Bounce"
-                        can_retry = True
-                        error = event_reason if event_reason else "Temporary failure"
-                    elif event_type == "sent":
-                        api_status = "📤 Sent to Carrier"
-                        can_retry = False
-                    elif event_type == "accepted":
-                        api_status = "✅ Accepted for Delivery"
-                        can_retry = False
-                    elif event_type == "delivered":
-                        api_status = "✅ Delivered"
-                        can_retry = False
-                    else:
-                        api_status = "⏳ Processing"
-                        can_retry = False
-                else:
-                    # No event yet, might be still processing
-                    api_status = "⏳ Queued (check status later)"
-                    can_retry = False
-            else:
-                if status_code == 400:
-                    api_status = "❌ Bad Request"
-                elif status_code == 401:
-                    api_status = "❌ Unauthorized (Check API Key)"
-                elif status_code == 402:
-                    api_status = "❌ Insufficient Credits"
-                elif status_code == 403:
-                    api_status = "❌ Forbidden"
-                elif status_code == 404:
-                    api_status = "❌ Not Found"
-                elif status_code == 429:
-                    api_status = "⚠️ Rate Limited"
-                else:
-                    api_status = f"❌ Failed (HTTP {status_code})"
-                can_retry = True
-            
-            # Record result
-            result = {
-                "Name": display_name if use_personalization else "N/A",
-                "Original Number": original_number,
-                "Formatted Number": formatted_number,
-                "Message Preview": personalized_content[:50] + "..." if len(personalized_content) > 50 else personalized_content,
-                "Full Message": personalized_content,  # Store full message for retry
-                "API Status": api_status,
-                "Message ID": message_id if success else "N/A",
-                "Status Code": status_code,
-                "Error": error if error else "",
-                "Can Retry": can_retry,
-                "Timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            }
-            results.append(result)
-            
-            # Update progress
-            progress = (idx + 1) / len(formatted_contacts)
-            progress_bar.progress(progress)
-            
-            # Display real-time results
-            results_df = pd.DataFrame(results)
-            results_placeholder.dataframe(results_df, use_container_width=True)
+        def draw_progress(message):
+            """Redraw the live view; its cost does not grow with the number of rows sent"""
+            with stage("render"):
+                status_text.text(message)
+                progress_bar.progress(progress.fraction())
+                counts = progress.summary()
+                with counters_placeholder.container():
+                    col1, col2, col3, col4 = st.columns(4)
+                    col1.metric("Processed", f"{progress.processed}/{send_count}")
+                    col2.metric("✅ Accepted/Delivered", counts["success"])
+                    col3.metric("❌ Rejected/Failed", counts["rejected"] + counts["failed"])
+                    col4.metric("🚫 Blocked", counts["blocked"])
+                    if adaptive_rate:
+                        throttle_note = f" | ⚠️ {throttled_count} throttled response(s)" if throttled_count else ""
+                        st.caption(f"⚡ Current send rate: {current_rate} SMS/s (max {sms_rate}){throttle_note}")
+                    for lane, state in window_notes.items():
+                        label = f"{COUNTRIES[lane]['label']}: " if lane else ""
+                        if state["open"]:
+                            st.caption(f"🕘 {label}Window open until {state['closes_at'].astimezone():%a %H:%M}, pacing at {state['rate']} SMS/s")
+                        elif state["opens_at"] is not None:
+                            st.caption(f"🌙 {label}Window closed, sending resumes {state['opens_at'].astimezone():%a %H:%M}")
+                    if retry_count or dead_letters:
+                        st.caption(f"🔁 {retry_count} automatic retr{'y' if retry_count == 1 else 'ies'} | ☠️ {len(dead_letters)} dead letter(s)")
+                results_placeholder.dataframe(progress.recent_frame(), use_container_width=True)
+        
+        # A resumed campaign's window pace only covers the messages still to send
+        expected_counts = (scan['countries'] if isinstance(send_window, dict) else send_count) if send_window else None
+        if send_window is not None and unfinished and unfinished['completed']:
+            unsent, unsent_countries = count_unsent(validated_contacts.iter_contacts(**message_options), campaign_id,
+                                                    campaign_journal.resume(campaign_id))
+            expected_counts = unsent_countries if isinstance(send_window, dict) else unsent
+        
+        # Stream the validated contacts into the send engine, rendering messages a chunk at a time
+        formatted_contacts = validated_contacts.iter_contacts(**message_options)
+        
+        status_message = "Starting..."
+        current_rate = sms_rate
+        window_notes = {}  # Lane -> latest window state
+        throttled_count = 0
+        retry_count = 0
+        dead_letters = []
+        
+        # Send SMS to all contacts concurrently; delivery statuses are reconciled in the background
+        for event in run_campaign(
+            brevo_client,
+            formatted_contacts,
+            sender_name,
+            sms_rate,
+            max_workers=max_concurrency,
+            tag=tag or None,
+            org_prefix=org_prefix or None,
+            event_store=event_store,
+            journal=campaign_journal,
+            campaign_id=campaign_id,
+            adaptive=adaptive_rate,
+            retry_policy=RetryPolicy(max_attempts=max_attempts),
+            # Lanes only for the countries in the file
+            lane_rates={country: lane_rates[country] for country in scan['countries']} if mixed_countries else None,
+            webhook_receiver=webhook_receiver,
+            send_window=send_window,
+            expected=expected_counts,
+            deadline=send_deadline
+        ):
+            if event["type"] in ("sent", "skipped"):
+                result = event["row"]
+                results.add(result)
+                progress.add(result)
+                action = "Sent to" if event["type"] == "sent" else "Already sent to"
+                status_message = f"{action} {result.name if use_personalization else result.original} ({event['index']}/{send_count})..."
+            elif event["type"] == "status":
+                results.update(event["row"])
+                progress.update(event["row"], event["previous"])
+            elif event["type"] == "retry":
+                retry_count += 1
+            elif event["type"] == "dead_letter":
+                dead_letters.append(event["row"])
+            elif event["type"] == "rate":
+                current_rate = event["rate"]
+                throttled_count = event["throttled"]
+            elif event["type"] == "window":
+                window_notes[event["lane"]] = event
+            elif event["type"] == "settling":
+                # Give delivery reports a short window to arrive before summarizing
+                status_message = "⏳ Waiting for delivery reports..."
+            elif event["type"] == "done":
+                skipped_count = event["skipped"]
             
-            # Delay to avoid Brevo API rate limiting (configurable)
-            time.sleep(sms_delay)
+            # Redraw a few times per second at most, however fast messages go out
+            if progress.due(force=event["type"] in ("window", "settling", "done")):
+                draw_progress(status_message)
         
         # Final status
         status_text.text("✅ All messages processed!")
-        st.session_state.results_history.extend(results)
+        if skipped_count > 0:
+            st.info(f"⏭️ {skipped_count} message(s) were already sent by the interrupted run and were not sent again.")
+        # One pass over the spooled results writes the results file and the history; downloads read the file
+        campaign_history.add_campaign(campaign_id, results.finish(), name=uploaded_file.name, sender=sender_name)
+        st.session_state.last_results_count = results.count
+        st.session_state.last_results_file = results_file
         
         # Clear sending flag
         st.session_state.sending_in_progress = False
@@ -636,10 +824,11 @@ if data_available:
         st.header("📈 Summary")
         
         # Count actual statuses
-        success_count = sum(1 for r in results if "✅" in r["API Status"] or "📤" in r["API Status"])
-        rejected_count = sum(1 for r in results if "❌ Rejected" in r["API Status"])
-        blocked_count = sum(1 for r in results if "🚫 Blocked" in r["API Status"])
-        failed_count = sum(1 for r in results if "❌" in r["API Status"] and "Rejected" not in r["API Status"])
+        status_counts = progress.summary()
+        success_count = status_counts["success"]
+        rejected_count = status_counts["rejected"]
+        blocked_count = status_counts["blocked"]
+        failed_count = status_counts["failed"]
         
         if rejected_count > 0 or blocked_count > 0:
             st.error(f"⚠️ **Campaign completed with {rejected_count + blocked_count} rejected/blocked messages!** Check details below.")
@@ -648,146 +837,67 @@ if data_available:
         
         col1, col2, col3, col4 = st.columns(4)
         with col1:
-            st.metric("Total Processed", len(results))
+            st.metric("Total Processed", results.count)
         with col2:
             st.metric("✅ Delivered/Sent", success_count, delta=None)
         with col3:
             st.metric("❌ Rejected", rejected_count, delta=None, delta_color="inverse")
         with col4:
             st.metric("🚫 Blocked/Failed", blocked_count + failed_count, delta=None, delta_color="inverse")
+        if scan['suppressed'] > 0:
+            st.caption(f"🚫 {scan['suppressed']} suppressed number(s) were skipped before sending.")
         
-        # Show retry option if there are failed/rejected messages
-        retryable_count = sum(1 for r in results if r.get("Can Retry", False))
+        # Messages that still failed after every automatic retry
+        if dead_letters:
+            st.header("☠️ Dead-Letter Queue")
+            st.warning(f"{len(dead_letters)} message(s) still failed after {max_attempts} attempt(s) (rate limited, server errors, soft bounces, rejections). Export them to investigate or re-upload later.")
+            dead_letter_df = results_frame(dead_letters, drop_message=True)
+            st.dataframe(dead_letter_df, use_container_width=True)
+            # Spooled to disk a chunk at a time like the results; the download reads the file
+            dead_letters_file = data_path(f"dead_letters_{campaign_id}.csv.gz")
+            write_results(dead_letters, dead_letters_file, drop_message=False)
+            with open(dead_letters_file, "rb") as dead_letters_data:
+                st.download_button(
+                    label="📥 Download Dead Letters as CSV (gzip)",
+                    data=dead_letters_data,
+                    file_name=f"sms_dead_letters_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv.gz",
+                    mime="application/gzip"
+                )
         
-        if retryable_count > 0:
-            st.header("🔄 Retry Failed/Rejected Messages")
-            st.info(f"Found {retryable_count} message(s) that can be retried (rejected, soft bounces, rate limited, etc.).")
-            
-            failed_results = [r for r in results if r.get("Can Retry", False)]
-            
-            if st.button("🔄 Retry All Failed Messages", type="secondary"):
-                st.session_state.sending_in_progress = True
-                
-                retry_progress_bar = st.progress(0)
-                retry_status_text = st.empty()
-                retry_results = []
-                
-                for idx, failed in enumerate(failed_results):
-                    retry_status_text.text(f"Retrying {failed['Name']} ({idx + 1}/{len(failed_results)})...")
-                    
-                    success, message_id, error, status_code = send_sms(
-                        api_key=api_key,
-                        sender=sender_name,
-                        recipient=failed['Formatted Number'],
-                        content=failed.get('Full Message', failed['Message Preview']),
-                        sms_type="marketing",
-                        tag=tag,
-                        unicode_enabled=unicode_enabled,
-                        org_prefix=org_prefix if org_prefix else None
-                    )
-                    
-                    # Check actual status after retry
-                    if success:
-                        # Wait and check actual status
-                        time.sleep(2)
-                        events = check_sms_status(api_key, message_id=message_id, days=1)
-                        
-                        if events and len(events) > 0:
-                            event_type = events[0].get("event", "")
-                            event_reason = events[0].get("reason", "")
-                            
-                            if event_type == "rejected":
-                                api_status = "❌ Rejected by Brevo"
-                                can_retry = True
-                                error = event_reason if event_reason else "Rejected by Brevo"
-                            elif event_type == "blocked":
-                                api_status = "🚫 Blocked by Carrier"
-                                can_retry = False
-                                error = event_reason if event_reason else "Blocked"
-                            elif event_type in ["sent", "accepted", "delivered"]:
-                                api_status = "✅ Sent Successfully"
-                                can_retry = False
-                            else:
-                                api_status = "⏳ Processing"
-                                can_retry = False
-                        else:
-                            api_status = "⏳ Queued"
-                            can_retry = False
-                    else:
-                        api_status = f"❌ Failed (HTTP {status_code})"
-                        can_retry = True
-                    
-                    retry_result = {
-                        "Name": failed['Name'],
-                        "Original Number": failed['Original Number'],
-                        "Formatted Number": failed['Formatted Number'],
-                        "Message Preview": failed['Message Preview'],
-                        "Full Message": failed.get('Full Message', failed['Message Preview']),
-                        "API Status": api_status,
-                        "Message ID": message_id if success else "N/A",
-                        "Status Code": status_code,
-                        "Error": error if error else "",
-                        "Can Retry": can_retry,
-                        "Timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    }
-                    retry_results.append(retry_result)
-                    
-                    retry_progress = (idx + 1) / len(failed_results)
-                    retry_progress_bar.progress(retry_progress)
-                    time.sleep(sms_delay)
-                
-                retry_status_text.text("✅ Retry completed!")
-                st.session_state.sending_in_progress = False
-                
-                # Show retry results
-                retry_success = sum(1 for r in retry_results if "✅" in r["API Status"])
-                st.success(f"Retry complete: {retry_success}/{len(retry_results)} succeeded")
-                
-                retry_df = pd.DataFrame(retry_results)
-                # Hide Full Message column
-                retry_display_df = retry_df.drop(columns=['Full Message'], errors='ignore')
-                st.dataframe(retry_display_df, use_container_width=True)
-                
-                # Update results history
-                st.session_state.results_history.extend(retry_results)
+    # Results of the last campaign, served from the compressed file written when it finished
+    if st.session_state.last_results_file:
+        st.header("💾 Download Results")
+        with open(st.session_state.last_results_file, "rb") as results_file:
+            st.download_button(
+                label="📥 Download Results as CSV (gzip)",
+                data=results_file,
+                file_name=f"sms_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv.gz",
+                mime="application/gzip"
+            )
+        
+        # The live view only shows recent rows; the whole table is drawn when asked for
+        if st.checkbox(f"📋 Show full results table ({st.session_state.last_results_count} rows)"):
+            st.dataframe(read_results(st.session_state.last_results_file), use_container_width=True)
         
-        # Check delivery status
+        # Delivery status of the last campaign; the button reruns the script, so the rows come from its results file
         st.header("📊 Check Delivery Status")
         st.info("Check actual delivery status from Brevo (delivered, bounced, blocked, etc.)")
+        if webhook_receiver is not None:
+            st.caption(f"📡 Delivery events arrive by webhook at {webhook_receiver.url} ({webhook_receiver.received} so far)")
         
         if st.button("🔍 Check Delivery Status for All Messages", type="secondary"):
             with st.spinner("Checking delivery status..."):
-                # Get all message IDs that were successfully sent
-                sent_messages = [r for r in results if r["Message ID"] != "N/A"]
+                last_results = [SendResult.from_row(row) for row in
+                                read_results(st.session_state.last_results_file).to_dict('records')]
+                # One incremental sync (none when webhooks keep the store current), then every status is a local lookup
+                status_results, synced = check_delivery_status(brevo_client, event_store, last_results,
+                                                               sync=webhook_receiver is None)
                 
-                if len(sent_messages) == 0:
+                if len(status_results) == 0:
                     st.warning("No messages were successfully sent to check status for.")
                 else:
-                    status_results = []
-                    
-                    # Check status for each message
-                    for msg in sent_messages:
-                        events = check_sms_status(api_key, message_id=msg["Message ID"], days=1)
-                        
-                        if events and len(events) > 0:
-                            # Get the latest event
-                            latest_event = events[0]
-                            delivery_status = get_delivery_status(latest_event.get("event", "unknown"))
-                            event_date = latest_event.get("date", "N/A")
-                            reason = latest_event.get("reason", "")
-                        else:
-                            delivery_status = "⏳ Pending"
-                            event_date = "N/A"
-                            reason = ""
-                        
-                        status_results.append({
-                            "Name": msg["Name"],
-                            "Phone": msg["Formatted Number"],
-                            "Message ID": msg["Message ID"],
-                            "Delivery Status": delivery_status,
-                            "Event Date": event_date,
-                            "Reason": reason
-                        })
+                    if not synced:
+                        st.warning("Could not reach Brevo to sync new events. Showing locally stored statuses.")
                     
                     st.success(f"Checked delivery status for {len(status_results)} messages")
                     status_df = pd.DataFrame(status_results)
@@ -801,19 +911,30 @@ if data_available:
                         file_name=f"delivery_status_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
                         mime="text/csv"
                     )
+
+# Past campaigns, read from disk a page at a time
+history_campaigns = campaign_history.campaigns(limit=50)
+if history_campaigns:
+    with st.expander("🗂️ Campaign History", expanded=False):
+        campaign_labels = {c['campaign_id']: f"{c['created_at']} | {c['name'] or 'Untitled'} ({c['total']} messages)"
+                           for c in history_campaigns}
+        col1, col2, col3 = st.columns([2, 2, 1])
+        with col1:
+            history_campaign = st.selectbox("Campaign", [None] + list(campaign_labels),
+                                            format_func=lambda campaign_id: "All campaigns" if campaign_id is None else campaign_labels[campaign_id])
+        with col2:
+            history_statuses = st.multiselect("Status", list(Status), format_func=lambda status: status.label)
+        with col3:
+            history_since = st.date_input("Since", value=None)
         
-        # Download results
-        st.header("💾 Download Results")
-        results_df = pd.DataFrame(results)
-        # Remove Full Message column from display (only used internally for retry)
-        display_df = results_df.drop(columns=['Full Message'], errors='ignore')
-        csv = display_df.to_csv(index=False)
-        st.download_button(
-            label="📥 Download Results as CSV",
-            data=csv,
-            file_name=f"sms_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-            mime="text/csv"
-        )
+        history_total = campaign_history.count(history_campaign, history_statuses, history_since)
+        page_count = max(1, -(-history_total // HISTORY_PAGE_SIZE))
+        history_page = st.number_input(f"Page (of {page_count})", min_value=1, max_value=page_count, value=1)
+        history_rows = campaign_history.results(history_campaign, history_statuses, history_since,
+                                                limit=HISTORY_PAGE_SIZE, offset=(history_page - 1) * HISTORY_PAGE_SIZE)
+        first_row = (history_page - 1) * HISTORY_PAGE_SIZE
+        st.caption(f"Showing {first_row + 1 if history_rows else 0}-{first_row + len(history_rows)} of {history_total} result(s)")
+        st.dataframe(results_frame(history_rows, drop_message=True), use_container_width=True)
 
 # Footer
 st.markdown("---")